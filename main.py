@@ -1,13 +1,121 @@
+import argparse
+import os
 import sys
-from PyQt6.QtWidgets import QApplication
-from ui.main_window import MainWindow
+import time
+
+# 设置该环境变量也会输出启动耗时报告
+PROFILE_STARTUP_ENV = 'PHOTO_WATERMARK_PROFILE_STARTUP'
+
+def parse_args(argv):
+    """解析命令行参数，未识别的参数留给Qt处理"""
+    parser = argparse.ArgumentParser(description='智能水印文件管理系统')
+    parser.add_argument('--watch', metavar='DIR', help='监视文件夹，自动为新图片添加水印并导出')
+    parser.add_argument('--output', metavar='DIR', help='监视模式的导出目录')
+    parser.add_argument('--template', metavar='NAME', help='监视模式使用的水印模板，默认使用上次的设置')
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'PNG', 'WEBP'], help='输出格式')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG/WebP质量')
+    parser.add_argument('--serve', action='store_true', help='以本地HTTP水印服务模式运行')
+    parser.add_argument('--host', default='127.0.0.1', help='服务模式的监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='服务模式的监听端口')
+    parser.add_argument('--workers', type=int, default=None, help='服务模式的处理线程数')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='输出启动耗时报告（各模块导入耗时和首次绘制时间）')
+    return parser.parse_known_args(argv)
+
+def load_watermark(config_manager, template_name):
+    """加载命令行模式使用的水印设置"""
+    if template_name:
+        return config_manager.load_template(template_name)
+    return config_manager.load_last_settings()
+
+def run_watch(args):
+    """以监视文件夹模式运行，不创建窗口"""
+    from utils.config_manager import ConfigManager
+    from utils.hot_folder import HotFolderWatcher
+    
+    if not args.output:
+        print('监视模式需要通过 --output 指定导出目录')
+        return 2
+    
+    watermark = load_watermark(ConfigManager(), args.template)
+    if watermark is None:
+        if args.template:
+            print(f'找不到模板: {args.template}')
+        else:
+            print('没有上次使用的水印设置，请通过 --template 指定模板')
+        return 2
+    
+    settings = {
+        'format': args.format,
+        'quality': args.quality,
+        'prefix': '',
+        'suffix': '',
+        'watermark': watermark
+    }
+    
+    def on_batch(paths, elapsed):
+        print(f'已处理 {len(paths)} 张图片，耗时 {elapsed:.2f} 秒')
+    
+    watcher = HotFolderWatcher(args.watch, args.output, settings, on_batch=on_batch)
+    try:
+        watcher.start()
+    except OSError as e:
+        print(f'无法打开导出目录: {e}')
+        return 2
+    print(f'正在监视 {args.watch}（{watcher.mode}），按 Ctrl+C 停止')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+def run_service(args):
+    """以本地HTTP水印服务模式运行，不创建窗口"""
+    from utils.watermark_service import WatermarkService
+    
+    service = WatermarkService(args.host, args.port, args.workers)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
 
 def main():
+    args, qt_args = parse_args(sys.argv[1:])
+    if args.watch:
+        sys.exit(run_watch(args))
+    if args.serve:
+        sys.exit(run_service(args))
+    
+    profiler = None
+    if args.profile_startup or os.environ.get(PROFILE_STARTUP_ENV):
+        from utils.startup_profile import StartupProfiler
+        profiler = StartupProfiler()
+        profiler.install()
+    
+    from PyQt6.QtWidgets import QApplication
+    from ui.main_window import MainWindow
+    if profiler:
+        profiler.mark('导入界面模块')
+    
     # 创建QApplication实例
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
+    if profiler:
+        profiler.mark('创建QApplication')
     
     # 创建并显示主窗口
     window = MainWindow()
+    if profiler:
+        profiler.mark('创建主窗口')
+        
+        def on_first_paint():
+            profiler.mark('首次绘制')
+            profiler.uninstall()
+            print(profiler.report())
+        
+        from utils.startup_profile import watch_first_paint
+        watch_first_paint(window, on_first_paint)
     window.show()
     
     # 运行应用程序事件循环
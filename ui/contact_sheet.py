@@ -0,0 +1,122 @@
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QListWidget, QListWidgetItem, QLabel, QListView
+from PyQt6.QtCore import Qt, QTimer, QSize
+from PyQt6.QtGui import QPixmap, QImage, QIcon
+import copy
+import os
+from ui.watermark_thumbnails import WatermarkedThumbnailRenderer
+from utils.thumbnail_cache import DEFAULT_THUMBNAIL_EDGE
+
+class ContactSheetDialog(QDialog):
+    """联系表预览：以缩略图分辨率显示所有图片加上当前水印后的效果
+
+    缩略图来自共用的低分辨率解码缓存，水印按比例缩小后在后台线程池中合成。
+    水印设置变化时只重新合成水印，旧设置下尚未开始的任务会被取消，已完成的结果会被丢弃。
+    """
+
+    # 设置变化后等待的毫秒数，连续拖动滑块时只渲染最后一次
+    RERENDER_DELAY_MS = 100
+
+    def __init__(self, image_paths: list, settings: dict, parent=None,
+                 max_edge: int = DEFAULT_THUMBNAIL_EDGE):
+        """初始化联系表
+
+        Args:
+            image_paths: 图片路径列表
+            settings: 当前水印设置
+            parent: 父窗口
+            max_edge: 缩略图最长边像素
+        """
+        super().__init__(parent)
+        self.image_paths = list(image_paths)
+        self.settings = copy.deepcopy(settings)
+        self.max_edge = max_edge
+        self.generation = 0
+        self.pending = 0
+        self.failures = 0
+        self._items = {}  # 图片路径 -> 列表项
+
+        self.renderer = WatermarkedThumbnailRenderer(max_edge, self)
+        self.renderer.rendered.connect(self.on_rendered)
+        self.renderer.failed.connect(self.on_failed)
+
+        self.rerender_timer = QTimer(self)
+        self.rerender_timer.setSingleShot(True)
+        self.rerender_timer.setInterval(self.RERENDER_DELAY_MS)
+        self.rerender_timer.timeout.connect(self.render_all)
+
+        self.setWindowTitle('联系表预览')
+        self.setModal(False)
+        self.resize(1000, 700)
+
+        self.setup_ui()
+        self.render_all()
+
+    def setup_ui(self):
+        """设置用户界面"""
+        layout = QVBoxLayout(self)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.sheet = QListWidget()
+        self.sheet.setViewMode(QListView.ViewMode.IconMode)
+        self.sheet.setResizeMode(QListView.ResizeMode.Adjust)
+        self.sheet.setMovement(QListView.Movement.Static)
+        self.sheet.setUniformItemSizes(True)
+        self.sheet.setIconSize(QSize(self.max_edge, self.max_edge))
+        self.sheet.setSpacing(8)
+        layout.addWidget(self.sheet)
+
+        for path in self.image_paths:
+            item = QListWidgetItem(os.path.basename(path))
+            item.setData(Qt.ItemDataRole.UserRole, path)
+            item.setSizeHint(QSize(self.max_edge + 16, self.max_edge + 32))
+            self.sheet.addItem(item)
+            self._items[path] = item
+
+    def setWatermarkSettings(self, settings: dict):
+        """水印设置变化时延迟重新渲染，已关闭（不可见）时不渲染"""
+        if not self.isVisible():
+            return
+        self.settings = copy.deepcopy(settings)
+        self.rerender_timer.start()
+
+    def render_all(self):
+        """取消旧任务，用当前设置重新渲染所有缩略图"""
+        self.pending = len(self.image_paths)
+        self.failures = 0
+        self.update_status()
+        self.generation = self.renderer.render(self.image_paths, self.settings)
+
+    def on_rendered(self, image_path: str, generation: int, image: QImage):
+        """更新一张渲染完成的缩略图"""
+        if generation != self.generation:
+            return
+        item = self._items.get(image_path)
+        if item is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
+        self.pending -= 1
+        self.update_status()
+
+    def on_failed(self, image_path: str, generation: int):
+        """一张缩略图渲染失败，同样计入进度"""
+        if generation != self.generation:
+            return
+        self.pending -= 1
+        self.failures += 1
+        self.update_status()
+
+    def update_status(self):
+        """更新渲染进度和失败数量"""
+        total = len(self.image_paths)
+        failed = f'，{self.failures} 张失败' if self.failures else ''
+        if self.pending > 0:
+            self.status_label.setText(f'共 {total} 张图片，正在渲染 {total - self.pending}/{total}{failed}')
+        else:
+            self.status_label.setText(f'共 {total} 张图片{failed}')
+
+    def closeEvent(self, event):
+        """关闭时取消所有渲染任务"""
+        self.rerender_timer.stop()
+        self.renderer.cancel()
+        super().closeEvent(event)
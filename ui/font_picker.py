@@ -0,0 +1,85 @@
+from PyQt6.QtWidgets import QComboBox
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtGui import QFont, QFontDatabase
+import threading
+from utils.font_index import FontIndex
+
+class LazyFontComboBox(QComboBox):
+    """延迟加载的字体选择框
+
+    QFontComboBox在创建时枚举并用各自的字体绘制所有已安装字体，字体很多时会拖慢窗口启动。
+    这里创建时只显示当前字体，后台线程读取缓存的字体索引，第一次展开下拉列表时才填充完整列表。
+    接口与QFontComboBox常用部分一致：currentFont、setCurrentFont和currentFontChanged信号。
+    """
+
+    currentFontChanged = pyqtSignal(QFont)
+
+    def __init__(self, family: str = 'Arial', parent=None, font_index: FontIndex = None):
+        """初始化字体选择框
+
+        Args:
+            family: 初始显示的字体
+            parent: 父控件
+            font_index: 字体索引，默认使用配置目录中的缓存
+        """
+        super().__init__(parent)
+        self.font_index = font_index or FontIndex()
+        self.populated = False
+        self._cached_families = None
+
+        self.addItem(family)
+        self.currentIndexChanged.connect(self._emit_font_changed)
+
+        # 后台读取缓存的字体索引（只读文件，不调用Qt）
+        self._loader = threading.Thread(target=self._load_cached, name='FontIndex', daemon=True)
+        self._loader.start()
+
+    def _load_cached(self):
+        """后台线程：读取字体索引缓存"""
+        self._cached_families = self.font_index.load()
+
+    def currentFont(self) -> QFont:
+        """当前选中的字体"""
+        return QFont(self.currentText())
+
+    def setCurrentFont(self, font: QFont):
+        """选中指定字体，字体列表尚未填充时临时加入该字体"""
+        family = font.family()
+        index = self.findText(family)
+        if index < 0:
+            self.addItem(family)
+            index = self.count() - 1
+        self.setCurrentIndex(index)
+
+    def showPopup(self):
+        """第一次展开时填充完整的字体列表"""
+        if not self.populated:
+            self.populate()
+        super().showPopup()
+
+    def populate(self):
+        """用完整的字体列表替换当前的临时列表，保持当前选中的字体"""
+        self._loader.join()
+        families = self._cached_families
+        if families is None:
+            # 缓存不存在或已过期，枚举一次并写入缓存
+            families = self.font_index.families(QFontDatabase.families)
+
+        current = self.currentText()
+        self.blockSignals(True)
+        try:
+            self.clear()
+            self.addItems(families)
+            index = self.findText(current)
+            if index < 0:
+                self.addItem(current)
+                index = self.count() - 1
+            self.setCurrentIndex(index)
+        finally:
+            self.blockSignals(False)
+        self.populated = True
+
+    def _emit_font_changed(self, index: int):
+        """选中项变化时发出currentFontChanged信号"""
+        if index >= 0:
+            self.currentFontChanged.emit(self.currentFont())
@@ -1,20 +1,85 @@
 from PyQt6.QtWidgets import QListWidget, QListWidgetItem
-from PyQt6.QtCore import Qt, QSize
-from PyQt6.QtGui import QDropEvent, QDragEnterEvent, QPixmap, QIcon
+from PyQt6.QtCore import Qt, QSize, QTimer, pyqtSignal
+from PyQt6.QtGui import QDropEvent, QDragEnterEvent, QPixmap, QIcon, QImage, QColor
 from pathlib import Path
-from utils.image_processor import ImageProcessor
+from utils.duplicate_finder import ContentDeduplicator
+import os
+
+# 列表缩略图的最长边像素
+LIST_ICON_EDGE = 100
+
+# 排序方式：(排序键, 显示名称)
+SORT_OPTIONS = (
+    ('order', '添加顺序'),
+    ('name', '名称'),
+    ('size', '文件大小'),
+    ('dimensions', '尺寸'),
+    ('date', '拍摄日期'),
+    ('format', '格式')
+)
+
+# 按元数据排序时在元数据索引中使用的排序键
+METADATA_SORT_FIELDS = {'size': 'file_size', 'dimensions': 'pixels', 'date': 'date', 'format': 'format'}
+
+# 筛选文字中 "字段:值" 形式可用的字段名
+FILTER_FIELDS = {'format': 'format', 'fmt': 'format', '格式': 'format', 'camera': 'camera', '相机': 'camera'}
 
 class ImageListWidget(QListWidget):
+    # 列表项的顺序变化（排序），水印文字中的 {index} 字段随之变化
+    orderChanged = pyqtSignal()
+    
+    # 水印设置变化后合并渲染请求的毫秒数
+    RERENDER_DELAY_MS = 30
+    # 后台读入元数据后合并刷新排序和筛选的毫秒数
+    REFRESH_DELAY_MS = 500
+    
     def __init__(self):
         super().__init__()
         self.setAcceptDrops(True)  # 启用拖放
-        self.setIconSize(QSize(100, 100))  # 设置缩略图大小
+        self.setIconSize(QSize(LIST_ICON_EDGE, LIST_ICON_EDGE))  # 设置缩略图大小
         self.setViewMode(QListWidget.ViewMode.IconMode)  # 使用图标模式显示
         self.setSpacing(10)  # 设置项目间距
         self.setMovement(QListWidget.Movement.Static)  # 禁止项目移动
         
-        self.image_processor = ImageProcessor()
-        self.image_paths = []  # 存储图片路径
+        self.image_paths = []  # 存储图片路径（添加顺序）
+        self._path_index = {}  # 规范化路径 -> 列表项，用于O(1)去重
+        self._items = {}  # 图片路径 -> 列表项
+        self.detect_content_duplicates = False  # 是否按文件内容检测重复
+        self._deduplicator = ContentDeduplicator()
+        
+        # 带水印的缩略图：原始缩略图保留在_base_icons中，关闭时恢复
+        self.show_watermark = False
+        self.watermark_settings = {}
+        self._base_icons = {}  # 图片路径 -> 原始缩略图
+        self._watermark_generation = 0
+        self._watermark_renderer = None  # 首次开启时创建
+        self._rerender_timer = QTimer(self)
+        self._rerender_timer.setSingleShot(True)
+        self._rerender_timer.setInterval(self.RERENDER_DELAY_MS)
+        self._rerender_timer.timeout.connect(self._render_watermarks)
+        
+        # 恢复会话时先显示占位图标，缩略图在后台从缓存读取
+        self._thumbnail_loader = None  # 首次恢复会话时创建
+        self._restore_generation = 0
+        self._placeholder_icon = None
+        
+        # 图片的元数据（拍摄时间、相机等）在后台读入元数据索引，由主窗口设置共用的索引
+        self.metadata_index = None
+        self._metadata_loader = None  # 首次添加图片时创建
+        
+        # 排序和筛选：只使用添加时计算的名称键和元数据索引，不访问文件、不重建缩略图
+        self.sort_key = 'order'
+        self.sort_descending = False
+        self._name_keys = {}  # 图片路径 -> 小写文件名
+        self._display_order = []  # 图片路径，按当前显示顺序
+        self._filter_terms = []  # [(字段或None, 小写文字)]
+        self._matched_paths = None  # 符合筛选的路径，没有筛选时为None
+        self._hidden = set()  # 被筛选隐藏的路径
+        # 新图片加入或元数据读入后，合并刷新排序和筛选
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.setInterval(self.REFRESH_DELAY_MS)
+        self._refresh_timer.timeout.connect(self._refresh_view)
     
     def dragEnterEvent(self, event: QDragEnterEvent):
         """处理拖拽进入事件"""
@@ -27,27 +92,423 @@ class ImageListWidget(QListWidget):
     
     def dropEvent(self, event: QDropEvent):
         """处理拖放事件"""
-        for url in event.mimeData().urls():
-            file_path = url.toLocalFile()
-            if self._is_valid_image(file_path):
-                self.add_image(file_path)
+        self.add_images([url.toLocalFile() for url in event.mimeData().urls()])
     
-    def add_image(self, image_path: str):
-        """添加图片到列表"""
-        if not self._is_valid_image(image_path):
+    def add_images(self, image_paths: list) -> int:
+        """批量添加图片，已在列表中的图片会被跳过
+        
+        Args:
+            image_paths: 图片路径列表
+            
+        Returns:
+            int: 实际添加的图片数量
+        """
+        added = []
+        for image_path in image_paths:
+            if self.add_image(image_path):
+                added.append(image_path)
+        
+        if added and self.show_watermark:
+            self._watermark_renderer.extend(added)
+        if added:
+            self._index_metadata(added)
+            if self.sort_key != 'order' or self._filter_terms:
+                self._refresh_timer.start()
+        return len(added)
+    
+    def keyPressEvent(self, event):
+        """Delete键移除选中的图片"""
+        if event.key() == Qt.Key.Key_Delete:
+            self.remove_images([item.data(Qt.ItemDataRole.UserRole) for item in self.selectedItems()])
             return
+        super().keyPressEvent(event)
+    
+    def remove_images(self, image_paths: list) -> int:
+        """从列表中移除图片，同时取消重复检测的登记
+        
+        Args:
+            image_paths: 图片路径列表
+            
+        Returns:
+            int: 实际移除的图片数量
+        """
+        removed = set()
+        for image_path in image_paths:
+            item = self._items.pop(image_path, None)
+            if item is None:
+                continue
+            self.takeItem(self.row(item))
+            self._path_index.pop(self._normalize_path(image_path), None)
+            self._name_keys.pop(image_path, None)
+            self._base_icons.pop(image_path, None)
+            self._hidden.discard(image_path)
+            self._deduplicator.unregister(image_path)
+            removed.add(image_path)
         
-        # 生成缩略图
-        thumbnail = self.image_processor.create_thumbnail(image_path)
+        if removed:
+            self.image_paths = [p for p in self.image_paths if p not in removed]
+            self._display_order = [p for p in self._display_order if p not in removed]
+            if self._matched_paths is not None:
+                self._matched_paths = [p for p in self._matched_paths if p not in removed]
+            self._order_changed()
+        return len(removed)
+    
+    def add_image(self, image_path: str) -> bool:
+        """添加图片到列表
+        
+        Returns:
+            bool: 是否添加成功，格式不支持或重复时返回False
+        """
+        if not self._is_valid_image(image_path):
+            return False
+        
+        # 同一路径只添加一次
+        key = self._normalize_path(image_path)
+        if key in self._path_index:
+            return False
+        
+        # 内容相同的文件只添加一次
+        if self.detect_content_duplicates:
+            try:
+                duplicate = self._deduplicator.find(image_path)
+            except OSError as e:
+                print(f"检测重复图片失败 {image_path}: {e}")
+                return False
+            if duplicate is not None:
+                print(f"跳过重复图片: {image_path}（与 {duplicate} 相同）")
+                return False
+        
+        # 生成缩略图（磁盘缓存在后台写入，保存会话时记录其位置）
+        thumbnail = self._create_thumbnail(image_path)
         if thumbnail:
             # 创建列表项
-            item = QListWidgetItem()
-            item.setIcon(QIcon(QPixmap.fromImage(thumbnail)))
-            item.setText(Path(image_path).name)
-            item.setData(Qt.ItemDataRole.UserRole, image_path)  # 存储完整路径
+            item = self._append_item(image_path, key)
+            icon = QIcon(QPixmap.fromImage(thumbnail))
+            item.setIcon(icon)
+            self._base_icons[image_path] = icon
+            # 添加成功后才登记，无论是否开启重复检测，之后开启时也能发现与它重复的图片
+            self._deduplicator.register(image_path)
+            return True
+        return False
+    
+    def restore_images(self, records: list) -> int:
+        """用会话中保存的图片记录替换当前列表
+        
+        只根据记录创建列表项，不访问原图；缩略图在后台从缩略图缓存读取，可见行优先。
+        
+        Args:
+            records: 按列表顺序的图片记录，包含path、mtime_ns、error和thumbnail（缩略图缓存文件路径）；
+                     有error的记录不使用缓存的缩略图，重新读取原图
             
-            self.addItem(item)
-            self.image_paths.append(image_path)
+        Returns:
+            int: 恢复的图片数量
+        """
+        if self._thumbnail_loader is not None:
+            self._thumbnail_loader.cancel()
+        if self._watermark_renderer is not None:
+            self._watermark_renderer.cancel()
+        if self._metadata_loader is not None:
+            self._metadata_loader.cancel()
+        self.clear()
+        self.image_paths = []
+        self._path_index = {}
+        self._items = {}
+        self._name_keys = {}
+        self._display_order = []
+        self._hidden = set()
+        self._matched_paths = None
+        self._base_icons = {}
+        self._deduplicator = ContentDeduplicator()
+        
+        restored = []
+        placeholder = self._get_placeholder_icon()
+        self.setUpdatesEnabled(False)
+        try:
+            for record in records:
+                image_path = record['path']
+                key = self._normalize_path(image_path)
+                if key in self._path_index:
+                    continue
+                item = self._append_item(image_path, key)
+                item.setIcon(placeholder)
+                self._deduplicator.register(image_path, record.get('file_size') or None)
+                restored.append(record)
+        finally:
+            self.setUpdatesEnabled(True)
+        
+        if restored:
+            if self._thumbnail_loader is None:
+                from ui.thumbnail_loader import CachedThumbnailLoader
+                self._thumbnail_loader = CachedThumbnailLoader(LIST_ICON_EDGE, self)
+                self._thumbnail_loader.loaded.connect(self._on_thumbnail_loaded)
+            self._restore_generation = self._thumbnail_loader.load(restored, self.visible_image_paths())
+            if self.show_watermark:
+                self._render_watermarks()
+            # 旧版会话没有拍摄时间和相机，保存时读取失败的图片重新读取文件头，都在后台进行
+            self._index_metadata([r['path'] for r in restored
+                                  if r.get('captured') is None or r.get('error') is not None])
+            if self.sort_key != 'order' or self._filter_terms:
+                self._refresh_view()
+        return len(restored)
+    
+    def _index_metadata(self, image_paths: list):
+        """在后台把图片的元数据读入元数据索引"""
+        if self.metadata_index is None or not image_paths:
+            return
+        if self._metadata_loader is None:
+            from ui.metadata_loader import MetadataLoader
+            self._metadata_loader = MetadataLoader(self.metadata_index, self)
+            self._metadata_loader.indexed.connect(self._on_metadata_indexed)
+        self._metadata_loader.load(image_paths)
+    
+    def _on_metadata_indexed(self, generation: int, image_paths: list):
+        """元数据读入后，依赖元数据的排序或筛选需要刷新"""
+        if not self._metadata_loader.is_current(generation):
+            return
+        if self.sort_key in METADATA_SORT_FIELDS or any(field for field, _ in self._filter_terms):
+            self._refresh_timer.start()
+    
+    def sort_by(self, key: str, descending: bool = False):
+        """按名称、文件大小、尺寸、拍摄日期或格式排序，只移动列表项，不重建缩略图
+        
+        Args:
+            key: SORT_OPTIONS中的排序键，'order'为添加顺序
+            descending: 是否降序；没有对应信息的图片总是排在最后
+        """
+        self.sort_key = key
+        self.sort_descending = descending
+        self._apply_order(self._sorted_paths())
+    
+    def _sorted_paths(self) -> list:
+        """按当前排序方式得到的全部图片路径"""
+        if self.sort_key == 'name':
+            return sorted(self.image_paths, key=self._name_keys.__getitem__, reverse=self.sort_descending)
+        field = METADATA_SORT_FIELDS.get(self.sort_key)
+        if field is None or self.metadata_index is None:
+            return list(reversed(self.image_paths)) if self.sort_descending else list(self.image_paths)
+        return self.metadata_index.sort_paths(self.image_paths, field, self.sort_descending)
+    
+    def _apply_order(self, ordered: list):
+        """按给定顺序重新排列已有的列表项，保留图标、选中状态和筛选状态"""
+        if ordered == self._display_order:
+            return
+        selected = [item.data(Qt.ItemDataRole.UserRole) for item in self.selectedItems()]
+        current = self.currentItem()
+        
+        # 列表项只是被取出再放回，图标不变；暂停选中信号，避免重新加载预览
+        self.blockSignals(True)
+        self.setUpdatesEnabled(False)
+        try:
+            for row in range(self.count() - 1, -1, -1):
+                self.takeItem(row)
+            for path in ordered:
+                self.addItem(self._items[path])
+            # 取出列表项会清除隐藏状态，重新应用
+            for path in self._hidden:
+                self._items[path].setHidden(True)
+            if current is not None:
+                self.setCurrentItem(current)
+            for path in selected:
+                self._items[path].setSelected(True)
+        finally:
+            self.setUpdatesEnabled(True)
+            self.blockSignals(False)
+        self._display_order = list(ordered)
+        self._order_changed()
+    
+    def _order_changed(self):
+        """列表顺序变化：序号按列表顺序计算（与导出一致），含字段的水印需要重新合成"""
+        if self.show_watermark and self.watermark_settings:
+            from utils.watermark_fields import has_fields
+            if has_fields(self.watermark_settings.get('text', '')):
+                self._rerender_timer.start()
+        self.orderChanged.emit()
+    
+    def set_filter_text(self, text: str):
+        """按输入的文字筛选图片，边输入边筛选
+        
+        空格分隔的每一项都需要满足：普通文字匹配文件名，"format:tiff"、"camera:canon"
+        匹配元数据索引中的格式和相机。新的筛选条件比上一次更严格时（如继续输入），
+        只在上一次的结果中查找。
+        
+        Args:
+            text: 筛选文字，为空时显示全部图片
+        """
+        terms = self._parse_filter(text)
+        narrowing = self._is_narrowing(self._filter_terms, terms) and self._matched_paths is not None
+        self._filter_terms = terms
+        self._apply_filter(self._matched_paths if narrowing else self.image_paths)
+    
+    def _parse_filter(self, text: str) -> list:
+        """把筛选文字拆分为[(字段或None, 小写文字)]"""
+        terms = []
+        for token in text.replace('：', ':').casefold().split():
+            field, sep, value = token.partition(':')
+            if sep and value and field in FILTER_FIELDS:
+                terms.append((FILTER_FIELDS[field], value))
+            else:
+                terms.append((None, token))
+        return terms
+    
+    def _is_narrowing(self, old_terms: list, new_terms: list) -> bool:
+        """新条件是否只会缩小旧条件的结果：逐项字段相同且文字包含旧文字"""
+        if not old_terms or len(new_terms) < len(old_terms):
+            return False
+        return all(old_field == new_field and old_value in new_value
+                   for (old_field, old_value), (new_field, new_value) in zip(old_terms, new_terms))
+    
+    def _apply_filter(self, candidates: list):
+        """在候选图片中应用当前筛选条件，只修改隐藏状态发生变化的列表项"""
+        if not self._filter_terms:
+            self._matched_paths = None
+            hidden = set()
+        else:
+            matched = candidates
+            for field, needle in self._filter_terms:
+                matched = self._match_term(matched, field, needle)
+            self._matched_paths = matched
+            hidden = set(self.image_paths).difference(matched)
+        
+        if hidden == self._hidden:
+            return
+        self.setUpdatesEnabled(False)
+        try:
+            for path in hidden - self._hidden:
+                self._items[path].setHidden(True)
+            for path in self._hidden - hidden:
+                self._items[path].setHidden(False)
+        finally:
+            self.setUpdatesEnabled(True)
+        self._hidden = hidden
+    
+    def _match_term(self, paths: list, field: str, needle: str) -> list:
+        """筛选出满足一项条件的图片，保持顺序
+        
+        文件名逐个匹配预先计算的小写文件名；格式和相机在元数据索引中按不同的取值匹配，
+        尚未读入元数据的图片按扩展名匹配格式。
+        """
+        names = map(self._name_keys.__getitem__, paths)
+        if field is None:
+            return [p for p, name in zip(paths, names) if needle in name]
+        
+        found = set()
+        if self.metadata_index is not None:
+            found = self.metadata_index.find_paths(field, lambda value: needle in value.casefold())
+        if field != 'format':
+            return [p for p in paths if p in found]
+        return [p for p, name in zip(paths, names) if p in found or needle in name.rpartition('.')[2]]
+    
+    def _refresh_view(self):
+        """新图片加入或元数据读入后，重新应用当前的排序和筛选"""
+        self._apply_filter(self.image_paths)
+        self._apply_order(self._sorted_paths())
+    
+    def _append_item(self, image_path: str, key: str) -> QListWidgetItem:
+        """在列表末尾添加一项并登记路径"""
+        item = QListWidgetItem()
+        item.setText(Path(image_path).name)
+        item.setData(Qt.ItemDataRole.UserRole, image_path)  # 存储完整路径
+        self.addItem(item)
+        self.image_paths.append(image_path)
+        self._path_index[key] = item
+        self._items[image_path] = item
+        self._name_keys[image_path] = Path(image_path).name.casefold()
+        self._display_order.append(image_path)
+        return item
+    
+    def _create_thumbnail(self, image_path: str) -> QImage:
+        """从共用的缩略图缓存获取列表缩略图，失败时返回None"""
+        from PIL.ImageQt import ImageQt
+        from utils.thumbnail_cache import get_shared_thumbnail_cache
+        
+        item = get_shared_thumbnail_cache().get(image_path, LIST_ICON_EDGE)
+        if item is None:
+            return None
+        return ImageQt(item[0]).copy()
+    
+    def _get_placeholder_icon(self) -> QIcon:
+        """缩略图加载完成前显示的占位图标，保证列表布局不随加载变化"""
+        if self._placeholder_icon is None:
+            pixmap = QPixmap(LIST_ICON_EDGE, LIST_ICON_EDGE)
+            pixmap.fill(QColor(0, 0, 0, 0))
+            self._placeholder_icon = QIcon(pixmap)
+        return self._placeholder_icon
+    
+    def _on_thumbnail_loaded(self, image_path: str, generation: int, image: QImage):
+        """恢复会话后更新一张缩略图，开启水印显示时只保存为原始缩略图"""
+        if generation != self._restore_generation:
+            return
+        item = self._path_index.get(self._normalize_path(image_path))
+        if item is None:
+            return
+        icon = QIcon(QPixmap.fromImage(image))
+        self._base_icons[image_path] = icon
+        if not self.show_watermark:
+            item.setIcon(icon)
+    
+    def set_watermark_preview(self, enabled: bool):
+        """设置列表缩略图是否显示水印效果"""
+        self.show_watermark = enabled
+        if enabled:
+            if self._watermark_renderer is None:
+                from ui.watermark_thumbnails import WatermarkedThumbnailRenderer
+                self._watermark_renderer = WatermarkedThumbnailRenderer(LIST_ICON_EDGE, self)
+                self._watermark_renderer.rendered.connect(self._on_watermark_rendered)
+            self._render_watermarks()
+            return
+        
+        self._rerender_timer.stop()
+        if self._watermark_renderer is not None:
+            self._watermark_renderer.cancel()
+        for i in range(self.count()):
+            item = self.item(i)
+            icon = self._base_icons.get(item.data(Qt.ItemDataRole.UserRole))
+            if icon is not None:
+                item.setIcon(icon)
+    
+    def setWatermarkSettings(self, settings: dict):
+        """水印设置变化时重新合成缩略图上的水印"""
+        self.watermark_settings = settings
+        if self.show_watermark:
+            self._rerender_timer.start()
+    
+    def visible_image_paths(self) -> list:
+        """获取当前可见行的图片路径"""
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft()).row()
+        if first < 0:
+            first = 0
+        
+        paths = []
+        for i in range(first, self.count()):
+            item = self.item(i)
+            rect = self.visualItemRect(item)
+            if rect.top() > viewport.bottom():
+                break
+            if rect.intersects(viewport):
+                paths.append(item.data(Qt.ItemDataRole.UserRole))
+        return paths
+    
+    def _render_watermarks(self):
+        """用当前设置重新合成所有缩略图的水印，可见行优先；{index} 按列表顺序编号，与导出一致"""
+        self._watermark_generation = self._watermark_renderer.render(
+            self._display_order, self.watermark_settings, self.visible_image_paths())
+    
+    def _on_watermark_rendered(self, image_path: str, generation: int, image: QImage):
+        """更新一张带水印的缩略图，丢弃旧设置的结果"""
+        if not self.show_watermark or generation != self._watermark_generation:
+            return
+        item = self._path_index.get(self._normalize_path(image_path))
+        if item is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(image)))
+    
+    def contains(self, image_path: str) -> bool:
+        """检查图片是否已在列表中"""
+        return self._normalize_path(image_path) in self._path_index
+    
+    def _normalize_path(self, file_path: str) -> str:
+        """规范化路径，使同一文件的不同写法得到相同的键"""
+        return os.path.normcase(os.path.abspath(file_path))
     
     def _is_valid_image(self, file_path: str) -> bool:
         """检查文件是否为有效的图片格式"""
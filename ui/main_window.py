@@ -1,17 +1,36 @@
 from PyQt6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, 
-    QSpinBox, QLineEdit, QPushButton, QFileDialog, QSplitter,  QMessageBox, QInputDialog
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, 
+    QSpinBox, QLineEdit, QPushButton, QFileDialog, QSplitter,  QMessageBox, QInputDialog,
+    QCheckBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from PyQt6.QtGui import QAction
-from ui.image_list_widget import ImageListWidget
+import copy
+import os
+from ui.image_list_widget import ImageListWidget, LIST_ICON_EDGE, SORT_OPTIONS
 from ui.watermark_settings import WatermarkSettings
 from ui.watermark_preview import WatermarkPreview
-from ui.template_manager import TemplateManagerDialog
-from utils.image_processor import ImageProcessor
 from utils.config_manager import ConfigManager
+from utils.autosave import DebouncedSaver
+from utils.metadata_index import MetadataIndex
+from utils.export_scheduler import default_memory_budget
+from utils.export_journal import ExportJournal
+
+# Pillow、图片处理器、模板对话框等较重的模块在首次使用时才导入，加快启动
+
+# 未打开高级导出选项时使用的编码档位
+DEFAULT_EXPORT_PROFILE = 'balanced'
+
+# 关闭程序时自动保存、下次启动时恢复的会话文件名（位于配置目录）
+LAST_SESSION_NAME = 'last_session.pwsession'
+
+# 保存会话时最多等待缩略图缓存写入的秒数，未写完的缩略图在恢复时重新生成
+SESSION_FLUSH_TIMEOUT = 1.0
 
 class MainWindow(QMainWindow):
+    # 监视文件夹处理完一批图片（数量, 耗时秒数），从后台线程发出
+    hotFolderBatchDone = pyqtSignal(int, float)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle('智能水印文件管理系统')
@@ -20,6 +39,16 @@ class MainWindow(QMainWindow):
         # 初始化配置管理器
         self.config_manager = ConfigManager()
         
+        # 监视文件夹
+        self.hot_folder_watcher = None
+        
+        # 联系表预览窗口（首次打开时创建）
+        self.contact_sheet = None
+        self.hotFolderBatchDone.connect(self.on_hot_folder_batch)
+        
+        # 最后设置的防抖自动保存（后台写入）
+        self.settings_saver = DebouncedSaver(self.config_manager.save_last_settings)
+        
         # 创建菜单栏
         self.create_menu_bar()
         
@@ -35,6 +64,24 @@ class MainWindow(QMainWindow):
         # 创建图片列表
         self.image_list = ImageListWidget()
         self.image_list.itemSelectionChanged.connect(self.on_image_selected)
+        self.image_list.orderChanged.connect(self.on_image_order_changed)
+        
+        # 图片列表的筛选和排序
+        list_tools_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText('筛选文件名，或 format:tiff camera:canon')
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.image_list.set_filter_text)
+        self.sort_combo = QComboBox()
+        for key, label in SORT_OPTIONS:
+            self.sort_combo.addItem(label, key)
+        self.sort_combo.currentIndexChanged.connect(self.on_sort_changed)
+        self.sort_descending_check = QCheckBox('降序')
+        self.sort_descending_check.toggled.connect(self.on_sort_changed)
+        list_tools_layout.addWidget(self.filter_edit)
+        list_tools_layout.addWidget(self.sort_combo)
+        list_tools_layout.addWidget(self.sort_descending_check)
+        left_layout.addLayout(list_tools_layout)
         left_layout.addWidget(self.image_list)
         
         # 创建控制面板
@@ -45,7 +92,7 @@ class MainWindow(QMainWindow):
         format_layout = QHBoxLayout()
         format_label = QLabel('输出格式：')
         self.format_combo = QComboBox()
-        self.format_combo.addItems(['JPEG', 'PNG'])
+        self.format_combo.addItems(['JPEG', 'PNG', 'WEBP'])
         format_layout.addWidget(format_label)
         format_layout.addWidget(self.format_combo)
         control_layout.addLayout(format_layout)
@@ -60,6 +107,14 @@ class MainWindow(QMainWindow):
         quality_layout.addWidget(self.quality_spin)
         control_layout.addLayout(quality_layout)
         
+        # 高级导出选项（编码档位、并行数、输出规格），首次展开时才创建
+        self.control_layout = control_layout
+        self.advanced_panel = None
+        self.advanced_button = QPushButton('高级导出选项')
+        self.advanced_button.setCheckable(True)
+        self.advanced_button.toggled.connect(self.toggle_advanced_panel)
+        control_layout.addWidget(self.advanced_button)
+        
         # 文件命名规则
         naming_layout = QVBoxLayout()
         prefix_layout = QHBoxLayout()
@@ -119,6 +174,9 @@ class MainWindow(QMainWindow):
         # 创建水印设置面板
         self.watermark_settings = WatermarkSettings()
         self.watermark_settings.settingsChanged.connect(self.preview.setWatermarkSettings)
+        self.watermark_settings.settingsChanged.connect(self.settings_saver.schedule)
+        self.watermark_settings.settingsChanged.connect(self.image_list.setWatermarkSettings)
+        self.preview.positionChanged.connect(self.watermark_settings.setCustomPosition)
         right_panel.addWidget(self.watermark_settings)
         
         # 设置分割器比例
@@ -133,11 +191,105 @@ class MainWindow(QMainWindow):
         main_splitter.setStretchFactor(1, 2)  # 右侧面板占2
         main_layout.addWidget(main_splitter)
         
-        # 初始化图片处理器
-        self.image_processor = ImageProcessor()
+        # 会话内的图片元数据索引；导出预检扫描器和图片处理器在首次使用时创建
+        self.metadata_index = MetadataIndex()
+        self.image_list.metadata_index = self.metadata_index
+        self._preflight_scanner = None
+        self._image_processor = None
         
         # 加载上次的设置
         self.load_last_settings()
+        
+        # 窗口显示后再恢复上次关闭时的图片列表，不拖慢启动
+        self.last_session_file = os.path.join(self.config_manager.config_dir, LAST_SESSION_NAME)
+        QTimer.singleShot(0, self.restore_last_session)
+    
+    def toggle_advanced_panel(self, visible: bool):
+        """显示或隐藏高级导出选项"""
+        if self.advanced_panel is None:
+            if not visible:
+                return
+            self.build_advanced_panel()
+        self.advanced_panel.setVisible(visible)
+    
+    def build_advanced_panel(self):
+        """创建高级导出选项面板，插入到展开按钮下方"""
+        self.advanced_panel = QWidget()
+        advanced_layout = QVBoxLayout(self.advanced_panel)
+        advanced_layout.setContentsMargins(0, 0, 0, 0)
+        
+        # 编码器档位
+        profile_layout = QHBoxLayout()
+        profile_label = QLabel('编码档位：')
+        self.profile_combo = QComboBox()
+        for key, text in (('fast', '快速'), ('balanced', '均衡'), ('smallest', '最小体积')):
+            self.profile_combo.addItem(text, key)
+        self.profile_combo.setCurrentIndex(1)
+        profile_layout.addWidget(profile_label)
+        profile_layout.addWidget(self.profile_combo)
+        advanced_layout.addLayout(profile_layout)
+        
+        # 并行导出设置
+        workers_layout = QHBoxLayout()
+        workers_label = QLabel('并行数：')
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        memory_label = QLabel('内存上限：')
+        self.memory_spin = QSpinBox()
+        self.memory_spin.setRange(1, 1024)
+        self.memory_spin.setSuffix(' GB')
+        self.memory_spin.setValue(max(1, default_memory_budget() // 1024 ** 3))
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.workers_spin)
+        workers_layout.addWidget(memory_label)
+        workers_layout.addWidget(self.memory_spin)
+        advanced_layout.addLayout(workers_layout)
+        
+        # 输出规格（一次解码生成多个尺寸）
+        rendition_layout = QHBoxLayout()
+        rendition_label = QLabel('输出规格：')
+        rendition_layout.addWidget(rendition_label)
+        self.rendition_checks = {}
+        for key, text in (('full', '原图'), ('web', '网页 2048px'), ('thumbnail', '缩略图 400px')):
+            check = QCheckBox(text)
+            check.setChecked(key == 'full')
+            rendition_layout.addWidget(check)
+            self.rendition_checks[key] = check
+        advanced_layout.addLayout(rendition_layout)
+        
+        # 几何变换：按EXIF方向转正、缩小到目标尺寸（0表示不限制）
+        transform_layout = QHBoxLayout()
+        self.auto_orient_check = QCheckBox('按拍摄方向旋转')
+        self.auto_orient_check.setChecked(True)
+        transform_layout.addWidget(self.auto_orient_check)
+        transform_layout.addWidget(QLabel('目标尺寸：'))
+        self.target_width_spin = QSpinBox()
+        self.target_height_spin = QSpinBox()
+        for spin in (self.target_width_spin, self.target_height_spin):
+            spin.setRange(0, 20000)
+            spin.setSpecialValueText('不限')
+            transform_layout.addWidget(spin)
+        advanced_layout.addLayout(transform_layout)
+        
+        index = self.control_layout.indexOf(self.advanced_button)
+        self.control_layout.insertWidget(index + 1, self.advanced_panel)
+    
+    @property
+    def image_processor(self):
+        """图片处理器，首次使用时创建（会导入Pillow）"""
+        if self._image_processor is None:
+            from utils.image_processor import ImageProcessor
+            self._image_processor = ImageProcessor(self.metadata_index)
+        return self._image_processor
+    
+    @property
+    def preflight_scanner(self):
+        """导出预检扫描器，首次使用时创建"""
+        if self._preflight_scanner is None:
+            from utils.preflight import PreflightScanner
+            self._preflight_scanner = PreflightScanner(self.metadata_index)
+        return self._preflight_scanner
     
     def import_images(self):
         """导入图片"""
@@ -147,9 +299,108 @@ class MainWindow(QMainWindow):
         
         if file_dialog.exec():
             filenames = file_dialog.selectedFiles()
-            for filename in filenames:
-                if self.image_processor.is_supported_format(filename):
-                    self.image_list.add_image(filename)
+            self.image_list.add_images(
+                [f for f in filenames if self.image_processor.is_supported_format(f)]
+            )
+    
+    def save_session(self):
+        """保存当前图片列表和水印设置为会话文件"""
+        from utils.session_store import SESSION_EXTENSION
+        
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, '保存会话', '', f'会话文件 (*{SESSION_EXTENSION})'
+        )
+        if not file_path:
+            return
+        if not file_path.endswith(SESSION_EXTENSION):
+            file_path += SESSION_EXTENSION
+        
+        if self.save_session_file(file_path, self.watermark_settings.current_settings):
+            self.statusBar().showMessage(f'会话已保存: {file_path}')
+        else:
+            QMessageBox.warning(self, '错误', '保存会话失败')
+    
+    def open_session(self):
+        """打开会话文件，恢复图片列表和水印设置"""
+        from utils.session_store import SESSION_EXTENSION
+        
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, '打开会话', '', f'会话文件 (*{SESSION_EXTENSION})'
+        )
+        if not file_path:
+            return
+        
+        count = self.open_session_file(file_path, restore_watermark=True)
+        if count is None:
+            QMessageBox.warning(self, '错误', '无法读取会话文件')
+        else:
+            self.statusBar().showMessage(f'已恢复会话：{count} 张图片')
+    
+    def save_session_file(self, file_path: str, watermark: dict = None) -> bool:
+        """保存会话文件
+        
+        文件头信息直接使用元数据索引中的记录（不重新读取文件），只有索引中没有的图片
+        （尚未读入或读取失败）才读取文件头；原图修改过的记录在恢复后使用时按修改时间失效。
+        缩略图只记录其在缩略图缓存中的位置。
+        
+        Args:
+            file_path: 会话文件路径
+            watermark: 要一并保存的水印设置，为None时不保存
+            
+        Returns:
+            bool: 保存是否成功
+        """
+        from utils.session_store import SessionStore
+        from utils.thumbnail_cache import get_shared_thumbnail_cache
+        
+        cache = get_shared_thumbnail_cache()
+        # 缩略图在后台写入磁盘缓存，有限地等待写完再记录缓存文件的位置
+        cache.flush(SESSION_FLUSH_TIMEOUT)
+        image_paths = self.collect_image_paths()
+        known = {record['path']: record for record in self.metadata_index.records(image_paths)}
+        missing = [path for path in image_paths if path not in known]
+        if missing:
+            for record in self.preflight_scanner.scan(missing):
+                known[record['path']] = record
+        records = []
+        for path in image_paths:
+            record = dict(known[path])
+            if record['error'] is None:
+                record['thumbnail'] = cache.disk_path((record['path'], record['mtime_ns'], LIST_ICON_EDGE))
+            records.append(record)
+        return SessionStore(file_path).save(records, watermark, LIST_ICON_EDGE)
+    
+    def open_session_file(self, file_path: str, restore_watermark: bool = False):
+        """读取会话文件并恢复图片列表，不访问原图
+        
+        Args:
+            file_path: 会话文件路径
+            restore_watermark: 是否同时恢复会话中保存的水印设置
+            
+        Returns:
+            int: 恢复的图片数量，读取失败时返回None
+        """
+        from utils.session_store import SessionStore
+        
+        session = SessionStore(file_path).load()
+        if session is None:
+            return None
+        
+        # 文件头信息直接放入元数据索引，原图修改过的记录会在使用时按修改时间失效；
+        # 保存时读取失败的记录不放入，恢复列表后重新读取
+        for record in session['images']:
+            if record['error'] is None:
+                self.metadata_index.put(record)
+        count = self.image_list.restore_images(session['images'])
+        
+        if restore_watermark and session['watermark']:
+            self.watermark_settings.load_settings(session['watermark'])
+        return count
+    
+    def restore_last_session(self):
+        """恢复上次关闭时的图片列表"""
+        if os.path.exists(self.last_session_file) and not self.image_list.has_images():
+            self.open_session_file(self.last_session_file)
     
     def export_images(self):
         """导出图片"""
@@ -161,30 +412,372 @@ class MainWindow(QMainWindow):
         if not export_dir:
             return
         
-        # 收集所有图片路径
+        image_paths = self.confirm_preflight(self.collect_image_paths())
+        if not image_paths:
+            return
+        
+        settings = self.collect_export_settings()
+        settings['resume'] = self.ask_resume(export_dir)
+        
+        # 执行导出
+        self.image_processor.export_images(image_paths, export_dir, settings)
+    
+    def ask_resume(self, export_dir: str) -> bool:
+        """导出目录中有未完成的导出时，询问是否继续
+        
+        Returns:
+            bool: 是否跳过已完成的图片继续导出
+        """
+        if not ExportJournal.exists(export_dir):
+            return False
+        reply = QMessageBox.question(
+            self, '继续导出',
+            '该目录中有未完成的导出，是否继续并跳过已完成的图片？\n选择"否"将重新导出全部图片。',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        return reply == QMessageBox.StandardButton.Yes
+    
+    def export_to_archive(self):
+        """导出图片并直接写入ZIP/TAR归档"""
+        if not self.image_list.count():
+            return
+        
+        archive_path, _ = QFileDialog.getSaveFileName(
+            self, '选择归档文件', 'export.zip', 'ZIP 归档 (*.zip);;TAR 归档 (*.tar)'
+        )
+        if not archive_path:
+            return
+        
+        image_paths = self.confirm_preflight(self.collect_image_paths())
+        if not image_paths:
+            return
+        
+        settings = self.collect_export_settings()
+        settings['archive'] = archive_path
+        self.image_processor.export_images(image_paths, os.path.dirname(archive_path), settings)
+    
+    def export_with_templates(self):
+        """按多个模板批量导出，每张图片只解码一次"""
+        if not self.image_list.count():
+            return
+        
+        from ui.template_manager import TemplateSelectDialog
+        
+        dialog = TemplateSelectDialog(self)
+        if not dialog.exec():
+            return
+        names = dialog.selected_names()
+        if not names:
+            QMessageBox.warning(self, '提示', '请至少选择一个模板')
+            return
+        
+        # 选择导出目录
+        export_dir = QFileDialog.getExistingDirectory(self, '选择导出目录')
+        if not export_dir:
+            return
+        
+        image_paths = self.confirm_preflight(self.collect_image_paths())
+        if not image_paths:
+            return
+        
+        settings = self.collect_export_settings()
+        settings['resume'] = self.ask_resume(export_dir)
+        
+        templates = self.config_manager.load_export_templates(names)
+        self.image_processor.export_images(image_paths, export_dir, settings, templates)
+    
+    def confirm_preflight(self, image_paths: list) -> list:
+        """导出前扫描文件头，显示批次信息并确认是否继续
+        
+        Args:
+            image_paths: 图片路径列表
+            
+        Returns:
+            list: 确认导出时返回可读取的图片路径列表，取消时返回空列表
+        """
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            from utils.watermark_renderer import get_shared_renderer
+            
+            records = self.preflight_scanner.scan(image_paths)
+            renderer = get_shared_renderer()
+            summary = self.preflight_scanner.summarize(
+                records, self.collect_export_settings()['max_workers'],
+                renderer.is_tiled(self.watermark_settings.current_settings), renderer.max_overlay_bytes)
+        finally:
+            QApplication.restoreOverrideCursor()
+        
+        message = (
+            f"图片数量: {summary['valid_count']} / {summary['count']}\n"
+            f"总像素: {summary['total_megapixels']:.1f} MP\n"
+            f"原图总大小: {summary['total_file_size'] / 1024 / 1024:.1f} MB\n"
+            f"预计耗时: {summary['estimated_seconds']:.0f} 秒\n"
+            f"预计峰值内存: {summary['peak_memory_bytes'] / 1024 / 1024:.0f} MB"
+        )
+        if summary['errors']:
+            problems = '\n'.join(f"{path}: {error}" for path, error in summary['errors'][:10])
+            if len(summary['errors']) > 10:
+                problems += f"\n... 共 {len(summary['errors'])} 个文件"
+            message += f"\n\n以下文件无法读取，将被跳过:\n{problems}"
+        message += "\n\n是否开始导出？"
+        
+        reply = QMessageBox.question(
+            self, '导出预检', message,
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.Yes
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return []
+        return [r['path'] for r in records if r['error'] is None]
+    
+    def on_sort_changed(self):
+        """按选择的方式重新排列图片列表"""
+        self.image_list.sort_by(self.sort_combo.currentData(), self.sort_descending_check.isChecked())
+    
+    def collect_image_paths(self) -> list:
+        """收集列表中所有图片路径"""
         image_paths = []
         for i in range(self.image_list.count()):
             item = self.image_list.item(i)
             image_paths.append(item.data(Qt.ItemDataRole.UserRole))
-        
-        # 导出设置
+        return image_paths
+    
+    def collect_export_settings(self) -> dict:
+        """收集当前的导出设置，未打开高级导出选项时使用默认值"""
         settings = {
             'format': self.format_combo.currentText(),
             'quality': self.quality_spin.value(),
+            'encoder_profile': DEFAULT_EXPORT_PROFILE,
             'prefix': self.prefix_edit.text(),
             'suffix': self.suffix_edit.text(),
-            'watermark': self.watermark_settings.current_settings
+            'watermark': self.watermark_settings.current_settings,
+            'renditions': [],
+            'max_workers': os.cpu_count() or 1,
+            'memory_budget': default_memory_budget(),
+            'transform': {'auto_orient': True}
         }
+        if self.advanced_panel is not None:
+            settings.update({
+                'encoder_profile': self.profile_combo.currentData(),
+                'renditions': self.collect_renditions(),
+                'max_workers': self.workers_spin.value(),
+                'memory_budget': self.memory_spin.value() * 1024 ** 3,
+                'transform': self.collect_transform()
+            })
+        return settings
+    
+    def collect_transform(self) -> dict:
+        """收集几何变换设置，目标宽高中只设置一个时另一边不限制"""
+        transform = {'auto_orient': self.auto_orient_check.isChecked()}
+        width = self.target_width_spin.value()
+        height = self.target_height_spin.value()
+        if width or height:
+            transform['size'] = (width or float('inf'), height or float('inf'))
+        return transform
+    
+    def collect_renditions(self) -> list:
+        """收集勾选的输出规格，只勾选原图时返回空列表（直接输出到导出目录）"""
+        from utils.image_processor import RENDITION_PRESETS
+        
+        selected = [key for key, check in self.rendition_checks.items() if check.isChecked()]
+        if not selected or selected == ['full']:
+            return []
+        return [dict(RENDITION_PRESETS[key]) for key in selected]
+    
+    def benchmark_encoders(self):
+        """用当前选中的图片测试各编码档位的耗时和体积"""
+        selected_items = self.image_list.selectedItems()
+        if selected_items:
+            image_path = selected_items[0].data(Qt.ItemDataRole.UserRole)
+        elif self.image_list.count():
+            image_path = self.image_list.item(0).data(Qt.ItemDataRole.UserRole)
+        else:
+            return
         
-        # 执行导出
-        self.image_processor.export_images(image_paths, export_dir, settings)
+        from PIL import Image
+        
+        try:
+            with Image.open(image_path) as img:
+                img.load()
+                results = self.image_processor.benchmark_encoders(img, quality=self.quality_spin.value())
+        except Exception as e:
+            QMessageBox.warning(self, '错误', f'编码测试失败: {e}')
+            return
+        
+        lines = [
+            f"{r['format']:<5} {r['profile']:<9} {r['seconds'] * 1000:8.1f} ms {r['bytes'] / 1024:10.1f} KB"
+            for r in results
+        ]
+        QMessageBox.information(self, '编码档位测试', '\n'.join(lines))
+    
+    def estimate_export(self):
+        """导出试运行：抽样处理一部分图片，推算按当前设置导出全部图片的体积和耗时"""
+        image_paths = self.collect_image_paths()
+        if not image_paths:
+            return
+        
+        from utils.export_estimator import ExportEstimator
+        
+        settings = self.collect_export_settings()
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            estimator = ExportEstimator(self.image_processor, self.preflight_scanner)
+            result = estimator.estimate(image_paths, settings)
+        finally:
+            QApplication.restoreOverrideCursor()
+        
+        mb = 1024 * 1024
+        lines = [
+            f"图片数量: {result['count']}，试运行样本: {result['sample_count']}",
+            f"预计输出: {result['total_bytes'] / mb:.1f} MB"
+            f"（95%区间 {result['bytes_low'] / mb:.1f} ~ {result['bytes_high'] / mb:.1f} MB）",
+            f"预计耗时: {result['wall_seconds']:.0f} 秒"
+            f"（95%区间 {result['wall_low']:.0f} ~ {result['wall_high']:.0f} 秒，并行数 {result['parallelism']:.0f}）",
+            '',
+            '每张图片各阶段平均耗时:'
+        ]
+        lines += [f"  {stage:<10} {seconds * 1000:8.1f} ms" for stage, seconds in result['stages'].items()]
+        lines += ['', '分层（格式 / 像素区间）:']
+        lines += [
+            f"  {s['format']:<5} {s['bucket']:<8} {s['count']:6d} 张  样本 {s['samples']:3d}  "
+            f"{s['bytes_per_image'] / 1024:8.1f} KB/张  {s['seconds_per_image'] * 1000:7.1f} ms/张"
+            for s in result['strata']
+        ]
+        if result['errors']:
+            lines += ['', f"无法处理的图片: {len(result['errors'])} 张"]
+        QMessageBox.information(self, '导出预估', '\n'.join(lines))
+    
+    def toggle_hot_folder(self, enabled: bool):
+        """开启或关闭监视文件夹模式"""
+        if not enabled:
+            if self.hot_folder_watcher:
+                self.hot_folder_watcher.stop()
+                self.hot_folder_watcher = None
+                self.statusBar().showMessage('已停止监视文件夹')
+            return
+        
+        watcher = self.create_hot_folder_watcher()
+        if watcher is None:
+            # 用户取消，恢复菜单勾选状态
+            self.watch_action.blockSignals(True)
+            self.watch_action.setChecked(False)
+            self.watch_action.blockSignals(False)
+            return
+        
+        try:
+            watcher.start()
+        except OSError as e:
+            QMessageBox.warning(self, '错误', f'无法打开导出目录: {e}')
+            self.watch_action.blockSignals(True)
+            self.watch_action.setChecked(False)
+            self.watch_action.blockSignals(False)
+            return
+        self.hot_folder_watcher = watcher
+        self.statusBar().showMessage(f'正在监视 {watcher.input_dir}（{watcher.mode}）')
+    
+    def create_hot_folder_watcher(self):
+        """选择监视目录、导出目录和模板，创建监视器
+        
+        Returns:
+            HotFolderWatcher，用户取消时返回None
+        """
+        input_dir = QFileDialog.getExistingDirectory(self, '选择监视目录')
+        if not input_dir:
+            return None
+        export_dir = QFileDialog.getExistingDirectory(self, '选择导出目录')
+        if not export_dir:
+            return None
+        
+        # 选择水印模板
+        current_text = '当前设置'
+        names = [current_text] + [t['name'] for t in self.config_manager.get_template_list()]
+        name, ok = QInputDialog.getItem(self, '选择模板', '监视模式使用的水印模板:', names, 0, False)
+        if not ok:
+            return None
+        
+        settings = self.collect_export_settings()
+        if name != current_text:
+            settings['watermark'] = self.config_manager.load_template(name)
+            if settings['watermark'] is None:
+                QMessageBox.warning(self, '错误', f'无法加载模板: {name}')
+                return None
+        else:
+            # 复制一份，监视期间修改界面设置不影响后台处理
+            settings['watermark'] = copy.deepcopy(settings['watermark'])
+        
+        from utils.hot_folder import HotFolderWatcher
+        
+        try:
+            return HotFolderWatcher(
+                input_dir, export_dir, settings, self.image_processor,
+                on_batch=lambda paths, elapsed: self.hotFolderBatchDone.emit(len(paths), elapsed)
+            )
+        except ValueError as e:
+            QMessageBox.warning(self, '错误', str(e))
+            return None
+    
+    def on_hot_folder_batch(self, count: int, elapsed: float):
+        """监视文件夹处理完一批图片"""
+        self.statusBar().showMessage(f'监视文件夹：已处理 {count} 张图片，耗时 {elapsed:.2f} 秒')
+    
+    def show_contact_sheet(self):
+        """显示所有图片加上当前水印后的联系表"""
+        image_paths = self.collect_image_paths()
+        if not image_paths:
+            QMessageBox.warning(self, '警告', '没有可预览的图片')
+            return
+        
+        from ui.contact_sheet import ContactSheetDialog
+        
+        if self.contact_sheet is not None:
+            # 关闭时通过finished信号断开连接并释放
+            self.contact_sheet.close()
+        
+        sheet = ContactSheetDialog(image_paths, self.watermark_settings.current_settings, self)
+        sheet.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        sheet.finished.connect(lambda result: self.on_contact_sheet_closed(sheet))
+        self.watermark_settings.settingsChanged.connect(sheet.setWatermarkSettings)
+        self.contact_sheet = sheet
+        sheet.show()
+    
+    def on_contact_sheet_closed(self, sheet):
+        """联系表关闭后不再接收水印设置变化，并释放对话框"""
+        try:
+            self.watermark_settings.settingsChanged.disconnect(sheet.setWatermarkSettings)
+        except TypeError:
+            pass
+        if self.contact_sheet is sheet:
+            self.contact_sheet = None
+    
+    def set_list_watermark_preview(self, enabled: bool):
+        """设置图片列表的缩略图是否显示当前水印"""
+        self.image_list.set_watermark_preview(enabled)
+    
+    def clear_thumbnail_cache(self):
+        """清空缩略图的内存和磁盘缓存（列表中已显示的缩略图不受影响）"""
+        from utils.thumbnail_cache import get_shared_thumbnail_cache
+        
+        freed = get_shared_thumbnail_cache().clear()
+        QMessageBox.information(self, '清除缩略图缓存', f'已释放 {freed / 1024 / 1024:.1f} MB')
+    
+    def set_content_dedupe(self, enabled: bool):
+        """设置导入时是否按文件内容检测重复图片"""
+        self.image_list.detect_content_duplicates = enabled
     
     def on_image_selected(self):
         """处理图片选择变化"""
         selected_items = self.image_list.selectedItems()
         if selected_items:
             image_path = selected_items[0].data(Qt.ItemDataRole.UserRole)
-            self.preview.setImage(image_path)
+            # 序号与导出时的顺序（列表行号）一致
+            self.preview.setImage(image_path, self.image_list.row(selected_items[0]) + 1)
+            
+    def on_image_order_changed(self):
+        """列表重新排序后，更新预览中 {index} 字段的序号"""
+        selected_items = self.image_list.selectedItems()
+        if selected_items:
+            self.preview.setImageIndex(self.image_list.row(selected_items[0]) + 1)
             
     def create_menu_bar(self):
         """创建菜单栏"""
@@ -197,10 +790,61 @@ class MainWindow(QMainWindow):
         import_action.triggered.connect(self.import_images)
         file_menu.addAction(import_action)
         
+        open_session_action = QAction('打开会话', self)
+        open_session_action.triggered.connect(self.open_session)
+        file_menu.addAction(open_session_action)
+        
+        save_session_action = QAction('保存会话', self)
+        save_session_action.triggered.connect(self.save_session)
+        file_menu.addAction(save_session_action)
+        
+        file_menu.addSeparator()
+        
         export_action = QAction('导出图片', self)
         export_action.triggered.connect(self.export_images)
         file_menu.addAction(export_action)
         
+        export_archive_action = QAction('导出为归档', self)
+        export_archive_action.triggered.connect(self.export_to_archive)
+        file_menu.addAction(export_archive_action)
+        
+        export_templates_action = QAction('按模板批量导出', self)
+        export_templates_action.triggered.connect(self.export_with_templates)
+        file_menu.addAction(export_templates_action)
+        
+        estimate_action = QAction('导出预估（试运行）', self)
+        estimate_action.triggered.connect(self.estimate_export)
+        file_menu.addAction(estimate_action)
+        
+        benchmark_action = QAction('编码档位测试', self)
+        benchmark_action.triggered.connect(self.benchmark_encoders)
+        file_menu.addAction(benchmark_action)
+        
+        contact_sheet_action = QAction('联系表预览', self)
+        contact_sheet_action.triggered.connect(self.show_contact_sheet)
+        file_menu.addAction(contact_sheet_action)
+        
+        list_watermark_action = QAction('列表缩略图显示水印', self)
+        list_watermark_action.setCheckable(True)
+        list_watermark_action.toggled.connect(self.set_list_watermark_preview)
+        file_menu.addAction(list_watermark_action)
+        
+        file_menu.addSeparator()
+        
+        self.watch_action = QAction('监视文件夹', self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.toggled.connect(self.toggle_hot_folder)
+        file_menu.addAction(self.watch_action)
+        
+        dedupe_action = QAction('导入时检测重复内容', self)
+        dedupe_action.setCheckable(True)
+        dedupe_action.toggled.connect(self.set_content_dedupe)
+        file_menu.addAction(dedupe_action)
+        
+        clear_cache_action = QAction('清除缩略图缓存', self)
+        clear_cache_action.triggered.connect(self.clear_thumbnail_cache)
+        file_menu.addAction(clear_cache_action)
+        
         file_menu.addSeparator()
         
         exit_action = QAction('退出', self)
@@ -246,6 +890,8 @@ class MainWindow(QMainWindow):
                 
     def show_template_manager(self):
         """显示模板管理对话框"""
+        from ui.template_manager import TemplateManagerDialog
+        
         dialog = TemplateManagerDialog(self)
         dialog.template_selected.connect(self.load_template_settings)
         dialog.exec()
@@ -278,7 +924,13 @@ class MainWindow(QMainWindow):
             self.watermark_settings.load_settings(default_settings)
             
     def closeEvent(self, event):
-        """程序关闭时保存当前设置"""
+        """程序关闭时保存当前设置和图片列表"""
+        if self.hot_folder_watcher:
+            self.hot_folder_watcher.stop()
+        
+        self.save_session_file(self.last_session_file)
+        
         settings = self.watermark_settings.current_settings
-        self.config_manager.save_last_settings(settings)
+        self.settings_saver.schedule(settings)
+        self.settings_saver.close()
         event.accept()
\ No newline at end of file
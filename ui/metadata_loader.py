@@ -0,0 +1,74 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from utils.metadata_index import MetadataIndex
+from utils.preflight import PreflightScanner
+
+# 每个后台任务读取的图片数量，每读完一批通知一次
+METADATA_CHUNK = 256
+
+class _MetadataTask(QRunnable):
+    """后台读取一批图片的文件头和EXIF/XMP"""
+
+    def __init__(self, owner: 'MetadataLoader', paths: list, generation: int):
+        super().__init__()
+        self.owner = owner
+        self.paths = paths
+        self.generation = generation
+
+    def run(self):
+        if not self.owner.is_current(self.generation):
+            return
+        try:
+            # 已有有效记录的图片不会重复读取
+            self.owner.scanner.scan(self.paths, complete=True)
+        except Exception as e:
+            print(f"读取图片元数据失败: {e}")
+            return
+        if self.owner.is_current(self.generation):
+            self.owner.indexed.emit(self.generation, self.paths)
+
+class MetadataLoader(QObject):
+    """在后台把图片的元数据（尺寸、格式、拍摄时间、相机等）读入元数据索引
+
+    只解析文件头，不解码像素；每个文件在修改之前只读取一次。
+    按批次提交，读完一批即可用于排序和筛选。
+    """
+
+    # 加载代数, 本批图片路径（从后台线程发出）
+    indexed = pyqtSignal(int, list)
+
+    def __init__(self, index: MetadataIndex, parent=None):
+        """初始化加载器
+
+        Args:
+            index: 要写入的元数据索引
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.scanner = PreflightScanner(index)
+        self.generation = 0
+        self.pool = QThreadPool(self)
+        # 扫描器内部已经并行读取，批次之间依次执行
+        self.pool.setMaxThreadCount(1)
+
+    def is_current(self, generation: int) -> bool:
+        """加载结果是否属于当前批次（可在后台线程中调用）"""
+        return generation == self.generation
+
+    def load(self, image_paths: list) -> int:
+        """追加读取一批图片的元数据，不取消已提交的任务
+
+        Args:
+            image_paths: 图片路径列表
+
+        Returns:
+            int: 当前的加载代数
+        """
+        for start in range(0, len(image_paths), METADATA_CHUNK):
+            chunk = list(image_paths[start:start + METADATA_CHUNK])
+            self.pool.start(_MetadataTask(self, chunk, self.generation))
+        return self.generation
+
+    def cancel(self):
+        """作废所有旧任务"""
+        self.generation += 1
+        self.pool.clear()
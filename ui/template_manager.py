@@ -186,6 +186,8 @@ class TemplateManagerDialog(QDialog):
     def get_position_text(self, settings: Dict[str, Any]) -> str:
         """获取位置描述文本"""
         if settings.get('position_custom', False):
+            if 'custom_rel_x' in settings:
+                return f"自定义 ({settings['custom_rel_x']:.0%}, {settings.get('custom_rel_y', 0.5):.0%})"
             return f"自定义 ({settings.get('custom_x', 0)}, {settings.get('custom_y', 0)})"
         else:
             position_map = {
@@ -258,4 +260,49 @@ class TemplateManagerDialog(QDialog):
                 self.rename_button.setEnabled(False)
                 self.delete_button.setEnabled(False)
             else:
-                QMessageBox.warning(self, "错误", "删除模板失败")
\ No newline at end of file
+                QMessageBox.warning(self, "错误", "删除模板失败")
+
+
+class TemplateSelectDialog(QDialog):
+    """多模板选择对话框，用于按多个模板批量导出"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.config_manager = ConfigManager()
+        
+        self.setWindowTitle("选择导出模板")
+        self.setModal(True)
+        self.resize(360, 400)
+        
+        layout = QVBoxLayout(self)
+        
+        hint_label = QLabel("勾选要使用的模板，每个模板输出到独立的子目录:")
+        hint_label.setWordWrap(True)
+        layout.addWidget(hint_label)
+        
+        self.template_list = QListWidget()
+        for template in self.config_manager.get_template_list():
+            item = QListWidgetItem(template['name'])
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            self.template_list.addItem(item)
+        layout.addWidget(self.template_list)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        ok_button = QPushButton("导出")
+        ok_button.clicked.connect(self.accept)
+        cancel_button = QPushButton("取消")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+        
+    def selected_names(self) -> list:
+        """获取勾选的模板名称列表"""
+        names = []
+        for i in range(self.template_list.count()):
+            item = self.template_list.item(i)
+            if item.checkState() == Qt.CheckState.Checked:
+                names.append(item.text())
+        return names
@@ -0,0 +1,85 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+from PIL.ImageQt import ImageQt
+from utils.thumbnail_cache import get_shared_thumbnail_cache, DEFAULT_THUMBNAIL_EDGE
+from ui.watermark_thumbnails import HIGH_PRIORITY, NORMAL_PRIORITY
+
+class _CachedThumbnailTask(QRunnable):
+    """后台读取一张已缓存的缩略图"""
+
+    def __init__(self, owner: 'CachedThumbnailLoader', record: dict, generation: int):
+        super().__init__()
+        self.owner = owner
+        self.record = record
+        self.generation = generation
+
+    def run(self):
+        if not self.owner.is_current(self.generation):
+            return
+        path = self.record['path']
+        cache = get_shared_thumbnail_cache()
+        item = None
+        if self.record.get('error') is None:
+            item = cache.peek(path, self.record.get('mtime_ns') or 0, self.owner.max_edge,
+                              self.record.get('thumbnail'))
+        if item is None:
+            # 缓存已被清理、原图已修改或上次读取失败，只有这时才读取原图
+            item = cache.get(path, self.owner.max_edge)
+        if item is None or not self.owner.is_current(self.generation):
+            return
+        try:
+            image = ImageQt(item[0]).copy()
+        except Exception as e:
+            print(f"读取缩略图失败 {path}: {e}")
+            return
+        self.owner.loaded.emit(path, self.generation, image)
+
+class CachedThumbnailLoader(QObject):
+    """在后台线程池中从缩略图缓存读取缩略图
+
+    用于恢复会话：记录中带有原图的修改时间和缩略图缓存文件路径，直接读取缓存，
+    不访问原图；缓存缺失时才退回到解码原图。
+    """
+
+    # 图片路径, 加载代数, 缩略图（从后台线程发出）
+    loaded = pyqtSignal(str, int, QImage)
+
+    def __init__(self, max_edge: int = DEFAULT_THUMBNAIL_EDGE, parent=None):
+        """初始化加载器
+
+        Args:
+            max_edge: 缩略图最长边像素
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.max_edge = max_edge
+        self.generation = 0
+        self.pool = QThreadPool(self)
+
+    def is_current(self, generation: int) -> bool:
+        """加载结果是否属于当前批次（可在后台线程中调用）"""
+        return generation == self.generation
+
+    def load(self, records: list, priority_paths=()) -> int:
+        """取消旧任务，加载一批缩略图
+
+        Args:
+            records: 图片记录列表，包含path、mtime_ns和可选的thumbnail
+            priority_paths: 优先加载的图片路径（如当前可见的行）
+
+        Returns:
+            int: 本批次的代数
+        """
+        self.cancel()
+        priority = set(priority_paths)
+        ordered = [r for r in records if r['path'] in priority] + \
+                  [r for r in records if r['path'] not in priority]
+        for record in ordered:
+            task = _CachedThumbnailTask(self, record, self.generation)
+            self.pool.start(task, HIGH_PRIORITY if record['path'] in priority else NORMAL_PRIORITY)
+        return self.generation
+
+    def cancel(self):
+        """作废所有旧任务"""
+        self.generation += 1
+        self.pool.clear()
@@ -1,10 +1,23 @@
 from PyQt6.QtWidgets import QLabel
-from PyQt6.QtCore import Qt, QPoint, QRect
-from PyQt6.QtGui import QPixmap, QPainter, QFont, QColor, QImage, QCursor, QPen
-from PIL import Image, ImageQt
+from PyQt6.QtCore import Qt, QPoint, QRect, pyqtSignal
+from PyQt6.QtGui import QPixmap, QPainter, QColor, QCursor, QPen
 import os
 
+# Pillow、渲染器和金字塔在第一次显示图片时才导入，不拖慢启动
+
+# 缩放范围（相对于适应窗口的比例）
+MIN_ZOOM = 1.0
+MAX_ZOOM = 32.0
+
+# 每格滚轮的缩放倍数
+ZOOM_STEP = 1.25
+
 class WatermarkPreview(QLabel):
+    # 金字塔有新层生成（从后台线程发出）
+    levelReady = pyqtSignal()
+    # 拖动结束后水印中心的位置（相对原图宽、高的比例）
+    positionChanged = pyqtSignal(float, float)
+    
     def __init__(self):
         super().__init__()
         self.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -13,59 +26,86 @@ class WatermarkPreview(QLabel):
         
         # 初始化变量
         self.image_path = None
-        self.original_image = None
+        self.image_index = 1  # 当前图片在列表中的序号
+        self.pyramid = None  # 原图的多分辨率金字塔
+        self.image_size = None  # 原图尺寸 (width, height)
         self.watermark_settings = None
         self.dragging = False
         self.drag_start = QPoint()
-        self.watermark_pos = QPoint()
-        self.scale_factor = 1.0
+        self.watermark_pos = QPoint()  # 水印中心在预览图中的位置
+        self.scale_factor = 1.0  # 预览像素与原图像素之比
+        self.zoom = 1.0  # 相对于适应窗口的缩放倍数
+        self.view_origin = (0.0, 0.0)  # 预览左上角在原图中的坐标
+        self.panning = False
+        self.pan_start = QPoint()
+        self.base_key = None  # 当前底图对应的(层号, 原点, 比例, 尺寸)
+        self.base_pixmap = None  # 当前视口的底图
         self.updating_preview = False  # 防止重复更新的标志
         self.watermark_bounds = QRect()  # 水印边界
         self.hover_watermark = False  # 鼠标是否悬停在水印上
         self.drag_offset = QPoint()  # 拖拽偏移量
+        self._renderer = None  # 与导出共用的水印渲染器，首次使用时获取
+        self.tile_overlay = None  # 当前平铺图层（PIL），用于判断是否需要重新转换
+        self.tile_pixmap = None  # 平铺图层对应的QPixmap
+        self.sprite = None  # 当前水印贴图（PIL），用于判断是否需要重新转换
+        self.sprite_pixmap = None  # 水印贴图对应的QPixmap
+        self.field_key = None  # 当前字段值对应的(图片路径, 序号, 水印文字, CSV路径)
+        self.field_values = None  # 水印文字中的字段在当前图片上的值
+        
+        self.levelReady.connect(self.updatePreview)
         
         # 启用鼠标跟踪
         self.setMouseTracking(True)
     
-    def setImage(self, image_path):
+    @property
+    def renderer(self):
+        """与导出共用的水印渲染器"""
+        if self._renderer is None:
+            from utils.watermark_renderer import get_shared_renderer
+            self._renderer = get_shared_renderer()
+        return self._renderer
+    
+    def setImage(self, image_path, index: int = 1):
         """设置预览图片
         
         Args:
             image_path: 图片路径
+            index: 图片在列表中的序号（从1开始），用于水印文字中的 {index} 字段，与导出一致
         """
         if not os.path.exists(image_path):
             return
         
-        self.image_path = image_path
-        self.original_image = QPixmap(image_path)
-        
-        # 计算缩放比例以适应预览区域
-        preview_size = self.size()
-        scaled_size = self.original_image.size()
+        from utils.image_pyramid import ImagePyramid
         
-        if scaled_size.width() > preview_size.width() or scaled_size.height() > preview_size.height():
-            scaled_pixmap = self.original_image.scaled(
-                preview_size,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            self.scale_factor = scaled_pixmap.width() / self.original_image.width()
-        else:
-            scaled_pixmap = self.original_image
-            self.scale_factor = 1.0
+        # 先关闭旧图片的金字塔，尚未开始的解码不再进行
+        if self.pyramid:
+            self.pyramid.close()
+            self.pyramid = None
         
-        self.setPixmap(scaled_pixmap)
+        try:
+            # 先按适应窗口的比例缩小解码，尽快显示
+            pyramid = ImagePyramid(image_path, on_level_ready=self.levelReady.emit,
+                                   view_size=(self.width(), self.height()))
+        except Exception as e:
+            print(f"加载预览图片失败: {e}")
+            return
         
-        # 如果已有水印设置，重新计算位置
-        if self.watermark_settings:
-            if not self.watermark_settings.get('position_custom'):
-                self.watermark_pos = self.getPresetPosition(self.watermark_settings.get('position', '中心'))
-            elif self.watermark_pos == QPoint():
-                self.watermark_pos = self.getPresetPosition('中心')
-
+        self.image_path = image_path
+        self.image_index = index
+        self.pyramid = pyramid
+        self.image_size = pyramid.size
+        self.zoom = 1.0
+        self.view_origin = (0.0, 0.0)
+        self.base_key = None
         
         self.updatePreview()
     
+    def setImageIndex(self, index: int):
+        """当前图片在列表中的序号变化（如列表重新排序）"""
+        if index != self.image_index:
+            self.image_index = index
+            self.updatePreview()
+    
     def setWatermarkSettings(self, settings):
         """更新水印设置
         
@@ -73,109 +113,210 @@ class WatermarkPreview(QLabel):
             settings: 水印设置字典
         """
         self.watermark_settings = settings
-        if not settings.get('position_custom'):
-            # 如果不是自定义位置，使用预设位置
-            self.watermark_pos = self.getPresetPosition(settings.get('position', '中心'))
-        else:
-            # 如果是自定义位置但watermark_pos还是默认值，设置为中心
-            if self.watermark_pos == QPoint():
-                self.watermark_pos = self.getPresetPosition('中心')
         self.updatePreview()
     
+    def renderSettings(self):
+        """实际绘制使用的水印设置：文字中的字段替换为当前图片的值，与导出结果一致"""
+        settings = self.watermark_settings
+        if not self.image_path or settings.get('type') != '文本水印':
+            return settings
+        
+        from utils.watermark_fields import FieldResolver, has_fields
+        
+        text = settings.get('text', '')
+        if not has_fields(text):
+            return settings
+        key = (self.image_path, self.image_index, text, settings.get('field_csv'))
+        if key != self.field_key:
+            self.field_key = key
+            resolver = FieldResolver([text], settings.get('field_csv'), [self.image_path], self.image_index)
+            self.field_values = resolver.fields(self.image_path)
+        return self.renderer.resolve_fields(settings, self.field_values)
+    
+    def updateWatermarkPos(self):
+        """根据预设位置或自定义位置计算水印在预览图中的位置，与导出使用同一套计算"""
+        if not self.watermark_settings or not self.image_size:
+            return
+        x, y = self.renderer.placement(self.watermark_settings, self.image_size)
+        self.watermark_pos = self.imageToView(x, y)
+    
+    def setCustomPosition(self, pos):
+        """将水印中心移到预览图中的指定位置，按相对原图尺寸的比例保存，导出时使用同一位置
+        
+        Args:
+            pos: QPoint 预览图坐标
+        """
+        x, y = self.viewToImage(pos)
+        self.watermark_pos = pos
+        self.watermark_settings['position_custom'] = True
+        self.watermark_settings['custom_rel_x'] = x / self.image_size[0]
+        self.watermark_settings['custom_rel_y'] = y / self.image_size[1]
+    
+    def imageToView(self, x, y):
+        """原图坐标转换为预览图坐标"""
+        return QPoint(int((x - self.view_origin[0]) * self.scale_factor),
+                      int((y - self.view_origin[1]) * self.scale_factor))
+    
+    def viewToImage(self, point):
+        """预览图坐标转换为原图坐标"""
+        return (point.x() / self.scale_factor + self.view_origin[0],
+                point.y() / self.scale_factor + self.view_origin[1])
+    
+    def fitScale(self):
+        """适应窗口时的显示比例"""
+        width, height = self.image_size
+        return min(self.width() / width, self.height() / height)
+    
+    def renderBase(self):
+        """从金字塔中最接近的层绘制当前视口的底图
+        
+        Returns:
+            QPixmap，还没有可用的层时返回None
+        """
+        if not self.pyramid:
+            return None
+        
+        from PIL import Image, ImageQt
+        
+        width, height = self.image_size
+        self.scale_factor = self.fitScale() * self.zoom
+        
+        # 视口尺寸不超过窗口，也不超过缩放后的图片
+        view_w = max(1, min(self.width(), int(width * self.scale_factor)))
+        view_h = max(1, min(self.height(), int(height * self.scale_factor)))
+        
+        # 限制视口原点，不平移出图片范围
+        max_x = max(0.0, width - view_w / self.scale_factor)
+        max_y = max(0.0, height - view_h / self.scale_factor)
+        self.view_origin = (min(max(self.view_origin[0], 0.0), max_x),
+                            min(max(self.view_origin[1], 0.0), max_y))
+        
+        found = self.pyramid.get(self.scale_factor)
+        if found is None:
+            return None
+        level, level_image = found
+        
+        key = (level, id(level_image), self.view_origin, self.scale_factor, view_w, view_h)
+        if key == self.base_key:
+            return self.base_pixmap
+        
+        # 原图坐标换算到该层的坐标，裁剪和缩放合并为一次resize
+        level_scale_x = level_image.width / width
+        level_scale_y = level_image.height / height
+        box = (
+            self.view_origin[0] * level_scale_x,
+            self.view_origin[1] * level_scale_y,
+            min(level_image.width, (self.view_origin[0] + view_w / self.scale_factor) * level_scale_x),
+            min(level_image.height, (self.view_origin[1] + view_h / self.scale_factor) * level_scale_y)
+        )
+        frame = level_image.resize((view_w, view_h), Image.Resampling.BILINEAR, box=box)
+        
+        self.base_pixmap = QPixmap.fromImage(ImageQt.ImageQt(frame))
+        self.base_key = key
+        return self.base_pixmap
+    
     def updatePreview(self):
         """更新预览显示"""
-        if not self.original_image or not self.watermark_settings or self.updating_preview:
+        if not self.pyramid or self.updating_preview:
             return
         
         # 设置更新标志，防止重复调用
         self.updating_preview = True
         
         try:
-            # 获取当前显示的缩放图片尺寸
-            current_size = self.size()
-            
-            # 重新缩放原始图片
-            scaled_image = self.original_image.scaled(
-                current_size,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            
-            # 更新缩放比例
-            self.scale_factor = scaled_image.width() / self.original_image.width()
-            
-            # 创建工作画布，使用缩放后的图片尺寸
-            preview = QPixmap(scaled_image.size())
-            preview.fill(Qt.GlobalColor.transparent)
-            
-            # 绘制原图
-            painter = QPainter(preview)
-            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
-            painter.drawPixmap(0, 0, scaled_image)
-            
-            # 绘制水印
-            if self.watermark_settings.get('type') == '文本水印':
-                self.drawTextWatermark(painter)
-            else:
-                self.drawImageWatermark(painter)
-            
-            # 如果正在拖拽或悬停，绘制水印边界
-            if self.dragging or self.hover_watermark:
-                self.drawWatermarkBounds(painter)
+            base = self.renderBase()
+            if base is None:
+                return
             
-            painter.end()
-            self.setPixmap(preview)
+            if not self.watermark_settings:
+                self.setPixmap(base)
+                return
             
-            # 计算水印边界
-            self.calculateWatermarkBounds()
+            self.updateWatermarkPos()
+            self.composePreview(base, self.dragging or self.hover_watermark)
         finally:
             # 重置更新标志
             self.updating_preview = False
     
     def updateDragPreview(self):
-        """拖动时的轻量级预览更新"""
-        if not self.original_image or not self.watermark_settings:
+        """拖动时的轻量级预览更新，底图直接使用缓存"""
+        if not self.pyramid or not self.watermark_settings:
             return
         
-        # 获取当前显示的缩放图片尺寸
-        current_size = self.size()
-        
-        # 重新缩放原始图片
-        scaled_image = self.original_image.scaled(
-            current_size,
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
-        
-        # 更新缩放比例
-        self.scale_factor = scaled_image.width() / self.original_image.width()
+        base = self.renderBase()
+        if base is None:
+            return
+        self.composePreview(base, True)
+    
+    def composePreview(self, base, show_bounds):
+        """在底图上绘制水印并显示
         
-        # 创建透明画布
-        preview = QPixmap(scaled_image.size())
+        Args:
+            base: 当前视口的底图
+            show_bounds: 是否绘制水印边界框
+        """
+        # 创建工作画布，使用底图尺寸
+        preview = QPixmap(base.size())
         preview.fill(Qt.GlobalColor.transparent)
         
         # 绘制原图
         painter = QPainter(preview)
         painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
-        painter.drawPixmap(0, 0, scaled_image)
+        painter.drawPixmap(0, 0, base)
         
-        # 绘制当前位置的水印
-        if self.watermark_settings.get('type') == '文本水印':
-            self.drawTextWatermark(painter)
-        else:
-            self.drawImageWatermark(painter)
+        # 绘制水印
+        self.drawWatermark(painter, base.size())
         
-        # 绘制拖动边界
-        self.drawWatermarkBounds(painter)
+        # 如果正在拖拽或悬停，绘制水印边界
+        if show_bounds:
+            self.drawWatermarkBounds(painter)
         
         painter.end()
-        
-        # 更新显示
         self.setPixmap(preview)
         
-        # 更新水印边界
+        # 计算水印边界
         self.calculateWatermarkBounds()
     
+    def resizeEvent(self, event):
+        """窗口大小变化时重新绘制"""
+        super().resizeEvent(event)
+        self.updatePreview()
+    
+    def wheelEvent(self, event):
+        """滚轮缩放，以鼠标位置为中心"""
+        if not self.pyramid:
+            return
+        
+        steps = event.angleDelta().y() / 120
+        if not steps:
+            return
+        new_zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom * ZOOM_STEP ** steps))
+        if new_zoom == self.zoom:
+            return
+        
+        # 保持鼠标下的原图位置不变
+        point = self.mapToPixmap(event.position().toPoint())
+        anchor_x, anchor_y = self.viewToImage(point)
+        self.zoom = new_zoom
+        new_scale = self.fitScale() * self.zoom
+        self.view_origin = (anchor_x - point.x() / new_scale, anchor_y - point.y() / new_scale)
+        self.updatePreview()
+    
+    def mouseDoubleClickEvent(self, event):
+        """双击恢复为适应窗口"""
+        if event.button() == Qt.MouseButton.RightButton or event.button() == Qt.MouseButton.MiddleButton:
+            self.zoom = 1.0
+            self.view_origin = (0.0, 0.0)
+            self.updatePreview()
+    
+    def mapToPixmap(self, pos):
+        """控件坐标转换为居中显示的预览图坐标"""
+        if not self.pixmap():
+            return pos
+        offset_x = (self.width() - self.pixmap().width()) // 2
+        offset_y = (self.height() - self.pixmap().height()) // 2
+        return QPoint(pos.x() - offset_x, pos.y() - offset_y)
+    
     def paintEvent(self, event):
         """重写paintEvent以处理拖拽时的实时绘制"""
         # 始终使用默认的paintEvent，避免无限循环
@@ -186,58 +327,22 @@ class WatermarkPreview(QLabel):
         if not self.watermark_settings:
             return
         
-
+        # 平铺水印覆盖整张图片，不显示单个水印的边界
+        if self.renderer.is_tiled(self.watermark_settings) or self.sprite_pixmap is None:
+            self.watermark_bounds = QRect()
+            return
         
-        if self.watermark_settings.get('type') == '文本水印':
-            text = self.watermark_settings.get('text', '')
-            if not text:
-                return
-            
-            # 创建临时画笔计算文本尺寸
-            temp_pixmap = QPixmap(1, 1)
-            temp_painter = QPainter(temp_pixmap)
-            
-            # 设置字体
-            font = QFont()
-            font_settings = self.watermark_settings.get('font', {})
-            font_size = max(1, int(font_settings.get('size', 40) * self.scale_factor))
-            font.setPointSize(font_size)
-            temp_painter.setFont(font)
-            
-            # 计算文本尺寸
-            fm = temp_painter.fontMetrics()
-            text_width = fm.horizontalAdvance(text)
-            text_height = fm.height()
-            
-            temp_painter.end()
-            
-            # 设置边界（考虑旋转）
-            padding = 10
-            self.watermark_bounds = QRect(
-                self.watermark_pos.x() - text_width//2 - padding,
-                self.watermark_pos.y() - text_height//2 - padding,
-                text_width + 2*padding,
-                text_height + 2*padding
-            )
-
-        else:
-            # 图片水印边界计算
-            image_path = self.watermark_settings.get('image_path')
-            if image_path and os.path.exists(image_path):
-                watermark = QPixmap(image_path)
-                scale = self.watermark_settings.get('scale', 100) / 100 * self.scale_factor
-                scaled_width = int(watermark.width() * scale)
-                scaled_height = int(watermark.height() * scale)
-                
-                padding = 10
-                self.watermark_bounds = QRect(
-                    self.watermark_pos.x() - scaled_width//2 - padding,
-                    self.watermark_pos.y() - scaled_height//2 - padding,
-                    scaled_width + 2*padding,
-                    scaled_height + 2*padding
-                )
+        # 按旋转后的贴图尺寸计算
+        padding = 10
+        width = self.sprite_pixmap.width()
+        height = self.sprite_pixmap.height()
+        self.watermark_bounds = QRect(
+            self.watermark_pos.x() - width//2 - padding,
+            self.watermark_pos.y() - height//2 - padding,
+            width + 2*padding,
+            height + 2*padding
+        )
 
-    
     def drawWatermarkBounds(self, painter):
         """绘制水印边界框"""
         if self.watermark_bounds.isEmpty():
@@ -279,158 +384,68 @@ class WatermarkPreview(QLabel):
         # 恢复状态
         painter.restore()
      
-    def drawTextWatermark(self, painter):
-        """绘制文本水印
+    def drawWatermark(self, painter, size):
+        """根据水印模式绘制水印
         
         Args:
             painter: QPainter对象
+            size: 预览图片尺寸
         """
-        try:
-            text = self.watermark_settings.get('text', '')
-            if not text:
-                return
-        except Exception as e:
-            return
-        
-        try:
-            # 设置字体
-            font = QFont()
-            font_settings = self.watermark_settings.get('font', {})
-            font_family = font_settings.get('family', 'Arial')
-            
-            # 检查字体是否存在
-            font_path = os.path.join(os.environ['WINDIR'], 'Fonts', f'{font_family}.ttf')
-            if not os.path.exists(font_path):
-                font_path = os.path.join(os.environ['WINDIR'], 'Fonts', f'{font_family}.TTF')
-            
-            if not os.path.exists(font_path):
-                # 如果找不到指定字体，使用微软雅黑
-                font.setFamily('Microsoft YaHei')
-            else:
-                font.setFamily(font_family)
-            
-            # 设置字体大小
-            font_size = max(1, int(font_settings.get('size', 40) * self.scale_factor))
-            font.setPointSize(font_size)
-            
-            # 设置字体样式
-            font.setBold(font_settings.get('bold', False))
-            font.setItalic(font_settings.get('italic', False))
-            painter.setFont(font)
-        except Exception as e:
-            # 使用安全的默认值
-            default_font = QFont('Microsoft YaHei', 40)
-            painter.setFont(default_font)
-        
-        try:
-            # 设置颜色和透明度
-            color = self.watermark_settings.get('color', '#000000')
-            opacity = self.watermark_settings.get('opacity', 100)
-            
-            if isinstance(color, str):
-                color = QColor(color)
-            color.setAlpha(int(255 * opacity / 100))
-            painter.setPen(color)
-            
-            # 计算文本尺寸
-            fm = painter.fontMetrics()
-            text_width = fm.horizontalAdvance(text)
-            text_height = fm.height()
-            
-            # 保存当前状态
-            painter.save()
-            
-            # 移动到绘制位置并旋转
-            painter.translate(self.watermark_pos)
-            rotation = self.watermark_settings.get('rotation', 0)
-            if rotation:
-                painter.rotate(rotation)
-            
-            # 绘制文本（考虑中心点偏移）
-            draw_x = int(-text_width/2)
-            draw_y = int(text_height/2)
-            painter.drawText(draw_x, draw_y, text)
-            
-            # 恢复状态
-            painter.restore()
-            
-        except Exception as e:
-            # 恢复画笔状态
-            painter.restore()
-            # 使用最基本的绘制方式
-            painter.setPen(QColor('#000000'))
-            painter.drawText(int(self.watermark_pos.x()), int(self.watermark_pos.y()), text)
+        if self.renderer.is_tiled(self.watermark_settings):
+            self.drawTiledWatermark(painter, size)
+        else:
+            self.drawSpriteWatermark(painter)
     
-    def drawImageWatermark(self, painter):
-        """绘制图片水印
+    def drawTiledWatermark(self, painter, size):
+        """绘制平铺水印，与导出使用同一个平铺图层生成逻辑
         
         Args:
             painter: QPainter对象
+            size: 预览图片尺寸
         """
-        image_path = self.watermark_settings.get('image_path')
-        if not image_path or not os.path.exists(image_path):
-            return
-        
-        # 加载水印图片
-        watermark = QPixmap(image_path)
-        
-        # 调整大小
-        scale = self.watermark_settings.get('scale', 100) / 100 * self.scale_factor
-        watermark = watermark.scaled(
-            int(watermark.width() * scale),
-            int(watermark.height() * scale),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
+        settings = self.renderSettings()
+        if self.view_origin != (0.0, 0.0):
+            # 平移后图案仍然对齐原图坐标
+            tile = dict(settings.get('tile', {}))
+            tile['offset_x'] = tile.get('offset_x', 0) - self.view_origin[0]
+            tile['offset_y'] = tile.get('offset_y', 0) - self.view_origin[1]
+            settings = dict(settings, tile=tile)
+        
+        from PIL import ImageQt
+        
+        overlay = self.renderer.build_tiled_overlay(
+            (size.width(), size.height()), settings, self.scale_factor
         )
+        if overlay is None:
+            return
         
-        # 设置透明度
-        opacity = self.watermark_settings.get('opacity', 100)
-        painter.setOpacity(opacity / 100)
-        
-        # 保存当前状态
-        painter.save()
-        
-        # 移动到绘制位置并旋转
-        painter.translate(self.watermark_pos)
-        rotation = self.watermark_settings.get('rotation', 0)
-        if rotation:
-            painter.rotate(rotation)
-        
-        # 绘制图片（考虑中心点偏移）
-        painter.drawPixmap(int(-watermark.width()/2), int(-watermark.height()/2), watermark)
-        
-        # 恢复状态
-        painter.restore()
+        # 渲染器返回缓存中的同一对象时复用已转换的QPixmap
+        if overlay is not self.tile_overlay:
+            self.tile_overlay = overlay
+            self.tile_pixmap = QPixmap.fromImage(ImageQt.ImageQt(overlay))
+        painter.drawPixmap(0, 0, self.tile_pixmap)
     
-    def getPresetPosition(self, position):
-        """获取预设位置坐标
+    def drawSpriteWatermark(self, painter):
+        """绘制文本或图片水印，贴图由渲染器按显示比例生成，与导出结果一致
         
         Args:
-            position: 位置名称
-            
-        Returns:
-            QPoint: 位置坐标
+            painter: QPainter对象
         """
-        if not self.pixmap():
-            return QPoint()
-        
-        width = self.pixmap().width()
-        height = self.pixmap().height()
-        padding = int(50 * self.scale_factor)  # 边距，转换为整数
-        
-        positions = {
-            '左上角': QPoint(padding, padding),
-            '上中': QPoint(width // 2, padding),
-            '右上角': QPoint(width - padding, padding),
-            '左中': QPoint(padding, height // 2),
-            '中心': QPoint(width // 2, height // 2),
-            '右中': QPoint(width - padding, height // 2),
-            '左下角': QPoint(padding, height - padding),
-            '下中': QPoint(width // 2, height - padding),
-            '右下角': QPoint(width - padding, height - padding)
-        }
-        
-        return positions.get(position, QPoint(width // 2, height // 2))
+        from PIL import ImageQt
+        
+        sprite = self.renderer.render_sprite(self.renderSettings(), self.scale_factor)
+        if sprite is None:
+            self.sprite = None
+            self.sprite_pixmap = None
+            return
+        
+        # 渲染器返回缓存中的同一对象时复用已转换的QPixmap
+        if sprite is not self.sprite:
+            self.sprite = sprite
+            self.sprite_pixmap = QPixmap.fromImage(ImageQt.ImageQt(sprite))
+        painter.drawPixmap(self.watermark_pos.x() - self.sprite_pixmap.width() // 2,
+                           self.watermark_pos.y() - self.sprite_pixmap.height() // 2,
+                           self.sprite_pixmap)
     
     def isValidWatermarkPosition(self, pos):
         """检查水印位置是否有效（在图片边界内）
@@ -455,25 +470,41 @@ class WatermarkPreview(QLabel):
     
     def mousePressEvent(self, event):
         """鼠标按下事件"""
+        # 右键或中键拖动平移视图
+        if event.button() in (Qt.MouseButton.RightButton, Qt.MouseButton.MiddleButton):
+            if self.pyramid and self.zoom > MIN_ZOOM:
+                self.panning = True
+                self.pan_start = event.pos()
+                self.setCursor(QCursor(Qt.CursorShape.SizeAllCursor))
+            return
+        
         if event.button() == Qt.MouseButton.LeftButton:
             # 如果有水印设置，允许在图片任意位置开始拖拽
-            if self.watermark_settings and self.pixmap():
+            if self.watermark_settings and self.pixmap() and not self.renderer.is_tiled(self.watermark_settings):
                 self.dragging = True
                 self.drag_start = event.pos()
                 # 计算从点击位置到水印中心的偏移
                 self.drag_offset = self.watermark_pos - event.pos()
-                self.watermark_settings['position_custom'] = True
+                self.setCustomPosition(self.watermark_pos)
                 self.setCursor(QCursor(Qt.CursorShape.ClosedHandCursor))
     
     def mouseMoveEvent(self, event):
         """鼠标移动事件"""
+        if self.panning:
+            delta = event.pos() - self.pan_start
+            self.pan_start = event.pos()
+            self.view_origin = (self.view_origin[0] - delta.x() / self.scale_factor,
+                                self.view_origin[1] - delta.y() / self.scale_factor)
+            self.updatePreview()
+            return
+        
         if self.dragging:
             # 使用拖拽偏移计算新的水印位置
             new_pos = event.pos() + self.drag_offset
             
             # 检查边界限制
             if self.isValidWatermarkPosition(new_pos):
-                self.watermark_pos = new_pos
+                self.setCustomPosition(new_pos)
                 # 使用轻量级拖动预览
                 self.updateDragPreview()
         else:
@@ -493,6 +524,11 @@ class WatermarkPreview(QLabel):
     
     def mouseReleaseEvent(self, event):
         """鼠标释放事件"""
+        if self.panning and event.button() in (Qt.MouseButton.RightButton, Qt.MouseButton.MiddleButton):
+            self.panning = False
+            self.setCursor(QCursor(Qt.CursorShape.ArrowCursor))
+            return
+        
         if event.button() == Qt.MouseButton.LeftButton and self.dragging:
             self.dragging = False
             # 恢复鼠标样式
@@ -501,4 +537,8 @@ class WatermarkPreview(QLabel):
             else:
                 self.setCursor(QCursor(Qt.CursorShape.ArrowCursor))
             # 最终更新预览
-            self.updatePreview()
\ No newline at end of file
+            self.updatePreview()
+            # 通知设置面板，列表缩略图、联系表和自动保存按普通的设置变化处理
+            if event.pos() != self.drag_start:
+                self.positionChanged.emit(self.watermark_settings['custom_rel_x'],
+                                          self.watermark_settings['custom_rel_y'])
\ No newline at end of file
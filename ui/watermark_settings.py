@@ -1,10 +1,25 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QLineEdit, QComboBox, QSpinBox, QPushButton,
-                             QFontComboBox, QColorDialog, QFileDialog, QSlider,
-                             QGroupBox, QRadioButton, QButtonGroup)
+                             QColorDialog, QFileDialog, QSlider,
+                             QGroupBox, QRadioButton, QButtonGroup, QCheckBox)
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QColor, QFont
 from pathlib import Path
+from ui.font_picker import LazyFontComboBox
+
+# 文字效果：(设置键, 显示名称, 数值参数 [(设置键, 标签, 最小值, 最大值, 默认值)], 默认颜色)
+TEXT_EFFECTS = (
+    ('shadow', '阴影', [('offset', '距离：', 0, 50, 3), ('blur', '模糊：', 0, 50, 3)], '#000000'),
+    ('outline', '描边', [('width', '宽度：', 1, 20, 2)], '#000000'),
+    ('glow', '外发光', [('radius', '半径：', 1, 50, 6)], '#000000')
+)
+
+# 文本输入框的提示：可用的字段
+FIELD_TOOLTIP = ('最大输入长度：100字符\n'
+                 '可使用字段，按每张图片替换：\n'
+                 '{filename} 文件名　{stem} 不含扩展名的文件名　{index} 序号（如 {index:04d}）\n'
+                 '{exif_date} 拍摄日期　{exif_time} 拍摄时间　{camera} 相机　{gps} GPS坐标\n'
+                 '以及字段CSV中的各列，如 {photographer}')
 
 class WatermarkSettings(QWidget):
     # 设置变更信号
@@ -26,7 +41,17 @@ class WatermarkSettings(QWidget):
             'opacity': 100,
             'position': '中心',
             'position_custom': False,
-            'rotation': 0
+            'rotation': 0,
+            'field_csv': '',  # 自定义字段的CSV文件路径，空字符串表示未选择
+            'effects': self.collect_effects(),
+            'tile': {
+                'enabled': False,
+                'spacing_x': 100,
+                'spacing_y': 100,
+                'offset_x': 0,
+                'offset_y': 0,
+                'stagger': True
+            }
         }
     
     def initUI(self):
@@ -60,16 +85,31 @@ class WatermarkSettings(QWidget):
         text_label = QLabel('文本：')
         self.text_edit = QLineEdit()
         self.text_edit.setMaxLength(100)  # 限制最大输入长度
-        self.text_edit.setToolTip('最大输入长度：100字符')
+        self.text_edit.setToolTip(FIELD_TOOLTIP)
         self.text_edit.textChanged.connect(self.onTextChanged)
         text_input_layout.addWidget(text_label)
         text_input_layout.addWidget(self.text_edit)
         text_layout.addLayout(text_input_layout)
         
+        # 自定义字段CSV：每行对应一张图片，各列可以作为文字中的字段
+        field_csv_layout = QHBoxLayout()
+        self.field_csv_label = QLabel('未选择字段CSV')
+        select_csv_button = QPushButton('字段CSV')
+        select_csv_button.setToolTip('第一行为列名，按filename列（或第一列）匹配图片')
+        self.remove_csv_button = QPushButton('移除')
+        self.remove_csv_button.setEnabled(False)
+        select_csv_button.clicked.connect(self.selectFieldCsv)
+        self.remove_csv_button.clicked.connect(self.removeFieldCsv)
+        field_csv_layout.addWidget(self.field_csv_label)
+        field_csv_layout.addWidget(select_csv_button)
+        field_csv_layout.addWidget(self.remove_csv_button)
+        text_layout.addLayout(field_csv_layout)
+        
         # 字体设置
         font_layout = QHBoxLayout()
         font_label = QLabel('字体：')
-        self.font_combo = QFontComboBox()
+        # 字体列表在第一次展开时才加载，不随已安装字体数量拖慢启动
+        self.font_combo = LazyFontComboBox()
         self.font_combo.currentFontChanged.connect(self.onSettingChanged)
         font_layout.addWidget(font_label)
         font_layout.addWidget(self.font_combo)
@@ -99,6 +139,42 @@ class WatermarkSettings(QWidget):
         color_layout.addStretch()
         text_layout.addLayout(color_layout)
         
+        # 文字效果：提高浅色文字在明亮背景上的可读性
+        effects_group = QGroupBox('文字效果')
+        effects_layout = QVBoxLayout()
+        self.effect_checks = {}
+        self.effect_spins = {}
+        self.effect_colors = {}
+        self.effect_color_buttons = {}
+        for name, title, params, color in TEXT_EFFECTS:
+            effect_layout = QHBoxLayout()
+            check = QCheckBox(title)
+            check.toggled.connect(self.onEffectChanged)
+            effect_layout.addWidget(check)
+            self.effect_checks[name] = check
+            
+            for key, text, minimum, maximum, value in params:
+                spin = QSpinBox()
+                spin.setRange(minimum, maximum)
+                spin.setValue(value)
+                spin.setSuffix('px')
+                spin.valueChanged.connect(self.onEffectChanged)
+                effect_layout.addWidget(QLabel(text))
+                effect_layout.addWidget(spin)
+                self.effect_spins[(name, key)] = spin
+            
+            color_button = QPushButton()
+            color_button.setStyleSheet(f'background-color: {color};')
+            color_button.setFixedSize(20, 20)
+            color_button.clicked.connect(lambda checked=False, name=name: self.showEffectColorDialog(name))
+            effect_layout.addWidget(color_button)
+            effect_layout.addStretch()
+            self.effect_colors[name] = color
+            self.effect_color_buttons[name] = color_button
+            effects_layout.addLayout(effect_layout)
+        effects_group.setLayout(effects_layout)
+        text_layout.addWidget(effects_group)
+        
         self.text_settings.setLayout(text_layout)
         layout.addWidget(self.text_settings)
         
@@ -238,6 +314,40 @@ class WatermarkSettings(QWidget):
         common_group.setLayout(common_layout)
         layout.addWidget(common_group)
         
+        # 平铺水印设置
+        self.tile_group = QGroupBox('平铺水印')
+        self.tile_group.setCheckable(True)
+        self.tile_group.setChecked(False)
+        self.tile_group.toggled.connect(self.onTileChanged)
+        tile_layout = QVBoxLayout()
+        
+        # 间距和偏移
+        self.tile_spins = {}
+        for key, text, minimum, value in (
+            ('spacing_x', '水平间距：', 0, 100), ('spacing_y', '垂直间距：', 0, 100),
+            ('offset_x', '水平偏移：', -2000, 0), ('offset_y', '垂直偏移：', -2000, 0)
+        ):
+            spin_layout = QHBoxLayout()
+            spin_label = QLabel(text)
+            spin = QSpinBox()
+            spin.setRange(minimum, 2000)
+            spin.setValue(value)
+            spin.setSuffix('px')
+            spin.valueChanged.connect(self.onTileChanged)
+            spin_layout.addWidget(spin_label)
+            spin_layout.addWidget(spin)
+            tile_layout.addLayout(spin_layout)
+            self.tile_spins[key] = spin
+        
+        # 交错排列
+        self.tile_stagger_check = QCheckBox('隔行交错')
+        self.tile_stagger_check.setChecked(True)
+        self.tile_stagger_check.toggled.connect(self.onTileChanged)
+        tile_layout.addWidget(self.tile_stagger_check)
+        
+        self.tile_group.setLayout(tile_layout)
+        layout.addWidget(self.tile_group)
+        
         # 添加弹性空间
         layout.addStretch()
     
@@ -293,6 +403,50 @@ class WatermarkSettings(QWidget):
         self.current_settings['opacity'] = value
         self.settingsChanged.emit(self.current_settings)
     
+    def onTileChanged(self, *args):
+        """处理平铺设置变化"""
+        tile = {key: spin.value() for key, spin in self.tile_spins.items()}
+        tile['enabled'] = self.tile_group.isChecked()
+        tile['stagger'] = self.tile_stagger_check.isChecked()
+        self.current_settings['tile'] = tile
+        self.settingsChanged.emit(self.current_settings)
+    
+    def collect_effects(self) -> dict:
+        """根据界面控件生成文字效果设置"""
+        shadow_offset = self.effect_spins[('shadow', 'offset')].value()
+        return {
+            'shadow': {
+                'enabled': self.effect_checks['shadow'].isChecked(),
+                'offset_x': shadow_offset,
+                'offset_y': shadow_offset,
+                'blur': self.effect_spins[('shadow', 'blur')].value(),
+                'color': self.effect_colors['shadow']
+            },
+            'outline': {
+                'enabled': self.effect_checks['outline'].isChecked(),
+                'width': self.effect_spins[('outline', 'width')].value(),
+                'color': self.effect_colors['outline']
+            },
+            'glow': {
+                'enabled': self.effect_checks['glow'].isChecked(),
+                'radius': self.effect_spins[('glow', 'radius')].value(),
+                'color': self.effect_colors['glow']
+            }
+        }
+    
+    def onEffectChanged(self, *args):
+        """处理文字效果设置变化"""
+        self.current_settings['effects'] = self.collect_effects()
+        self.settingsChanged.emit(self.current_settings)
+    
+    def showEffectColorDialog(self, name: str):
+        """选择文字效果的颜色"""
+        color = QColorDialog.getColor(QColor(self.effect_colors[name]))
+        if color.isValid():
+            self.effect_colors[name] = color.name()
+            self.effect_color_buttons[name].setStyleSheet(f'background-color: {color.name()};')
+            self.onEffectChanged()
+    
     def onRotationSliderChanged(self, value):
         """处理旋转滑块变化"""
         # 同步更新输入框
@@ -353,6 +507,18 @@ class WatermarkSettings(QWidget):
         self.current_settings['position_custom'] = False
         self.settingsChanged.emit(self.current_settings)
      
+    def setCustomPosition(self, rel_x: float, rel_y: float):
+        """设置自定义水印位置（如在预览中拖动水印后）
+        
+        Args:
+            rel_x: 水印中心相对原图宽度的比例
+            rel_y: 水印中心相对原图高度的比例
+        """
+        self.current_settings['position_custom'] = True
+        self.current_settings['custom_rel_x'] = rel_x
+        self.current_settings['custom_rel_y'] = rel_y
+        self.settingsChanged.emit(self.current_settings)
+     
     def showColorDialog(self):
         """显示颜色选择对话框"""
         color = QColorDialog.getColor(QColor(self.current_settings['color']))
@@ -361,6 +527,22 @@ class WatermarkSettings(QWidget):
             self.color_button.setStyleSheet(f'background-color: {color.name()};')
             self.settingsChanged.emit(self.current_settings)
     
+    def selectFieldCsv(self):
+        """选择自定义字段的CSV文件"""
+        csv_path, _ = QFileDialog.getOpenFileName(self, '选择字段CSV', '', 'CSV (*.csv)')
+        if csv_path:
+            self.current_settings['field_csv'] = csv_path
+            self.field_csv_label.setText(Path(csv_path).name)
+            self.remove_csv_button.setEnabled(True)
+            self.settingsChanged.emit(self.current_settings)
+    
+    def removeFieldCsv(self):
+        """移除自定义字段的CSV文件"""
+        self.current_settings['field_csv'] = ''
+        self.field_csv_label.setText('未选择字段CSV')
+        self.remove_csv_button.setEnabled(False)
+        self.settingsChanged.emit(self.current_settings)
+    
     def selectWatermarkImage(self):
         """选择水印图片"""
         file_dialog = QFileDialog()
@@ -383,8 +565,9 @@ class WatermarkSettings(QWidget):
     def load_settings(self, settings):
         """从模板加载设置"""
         try:
-            # 更新当前设置
+            # 更新当前设置；没有CSV的模板不能沿用上一个模板的CSV
             self.current_settings.update(settings)
+            self.current_settings['field_csv'] = settings.get('field_csv', '')
             
             # 更新UI控件
             if 'watermark_type' in settings:
@@ -401,6 +584,8 @@ class WatermarkSettings(QWidget):
                 
             if 'font_family' in settings:
                 self.font_combo.setCurrentFont(QFont(settings['font_family']))
+            elif isinstance(settings.get('font'), dict) and settings['font'].get('family'):
+                self.font_combo.setCurrentFont(QFont(settings['font']['family']))
                 
             if 'font_size' in settings:
                 self.size_spin.setValue(settings['font_size'])
@@ -425,6 +610,48 @@ class WatermarkSettings(QWidget):
                 if index >= 0:
                     self.position_combo.setCurrentIndex(index)
                     
+            # 平铺设置
+            if 'tile' in settings:
+                tile = settings['tile']
+                for key, spin in self.tile_spins.items():
+                    spin.blockSignals(True)
+                    spin.setValue(tile.get(key, spin.value()))
+                    spin.blockSignals(False)
+                self.tile_stagger_check.blockSignals(True)
+                self.tile_stagger_check.setChecked(tile.get('stagger', True))
+                self.tile_stagger_check.blockSignals(False)
+                self.tile_group.blockSignals(True)
+                self.tile_group.setChecked(tile.get('enabled', False))
+                self.tile_group.blockSignals(False)
+                
+            # 文字效果设置
+            if isinstance(settings.get('effects'), dict):
+                effects = settings['effects']
+                for name, check in self.effect_checks.items():
+                    effect = effects.get(name) or {}
+                    for (effect_name, key), spin in self.effect_spins.items():
+                        if effect_name != name:
+                            continue
+                        # 界面上阴影的距离同时用于水平和垂直偏移
+                        value = effect.get('offset_x') if key == 'offset' else effect.get(key)
+                        if value is not None:
+                            spin.blockSignals(True)
+                            spin.setValue(value)
+                            spin.blockSignals(False)
+                    if effect.get('color'):
+                        self.effect_colors[name] = effect['color']
+                        self.effect_color_buttons[name].setStyleSheet(f'background-color: {effect["color"]};')
+                    check.blockSignals(True)
+                    check.setChecked(effect.get('enabled', False))
+                    check.blockSignals(False)
+                
+            if settings.get('field_csv'):
+                self.field_csv_label.setText(Path(settings['field_csv']).name)
+                self.remove_csv_button.setEnabled(True)
+            else:
+                self.field_csv_label.setText('未选择字段CSV')
+                self.remove_csv_button.setEnabled(False)
+                
             # 图片水印设置
             if 'image_path' in settings and settings['image_path']:
                 self.image_path_label.setText(Path(settings['image_path']).name)
@@ -0,0 +1,118 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+from PIL.ImageQt import ImageQt
+import copy
+from utils.thumbnail_cache import get_shared_thumbnail_cache, DEFAULT_THUMBNAIL_EDGE
+from utils.watermark_renderer import get_shared_renderer
+from utils.watermark_fields import FieldResolver
+
+# 优先渲染的任务（如可见行）在线程池中的优先级
+HIGH_PRIORITY = 1
+NORMAL_PRIORITY = 0
+
+class _ThumbnailRenderTask(QRunnable):
+    """后台渲染一张带水印的缩略图"""
+
+    def __init__(self, owner: 'WatermarkedThumbnailRenderer', image_path: str,
+                 generation: int, settings: dict, resolver: FieldResolver = None):
+        super().__init__()
+        self.owner = owner
+        self.image_path = image_path
+        self.generation = generation
+        self.settings = settings
+        self.resolver = resolver
+
+    def run(self):
+        # 设置已经变化的任务直接放弃
+        if not self.owner.is_current(self.generation):
+            return
+        try:
+            item = get_shared_thumbnail_cache().get(self.image_path, self.owner.max_edge)
+            if not self.owner.is_current(self.generation):
+                return
+            if item is None:
+                raise ValueError('无法读取图片')
+
+            thumbnail, original_size = item
+            # 水印按缩略图与原图的比例缩小，与导出结果的比例一致
+            scale = thumbnail.width / max(1, original_size[0])
+            fields = self.resolver.fields(self.image_path) if self.resolver else None
+            rendered = get_shared_renderer().composite(thumbnail, self.settings, scale, fields)
+            image = ImageQt(rendered).copy()
+        except Exception as e:
+            print(f"渲染水印缩略图失败 {self.image_path}: {e}")
+            if self.owner.is_current(self.generation):
+                self.owner.failed.emit(self.image_path, self.generation)
+            return
+        self.owner.rendered.emit(self.image_path, self.generation, image)
+
+class WatermarkedThumbnailRenderer(QObject):
+    """在后台线程池中为缩略图合成水印
+
+    缩略图来自共用的低分辨率解码缓存，只有水印需要重新合成。
+    每次用新设置渲染时代数加一：尚未开始的旧任务被清除，
+    正在运行的旧任务在开始合成前放弃，已完成的旧结果由接收方按代数丢弃。
+    """
+
+    # 图片路径, 渲染代数, 渲染结果（从后台线程发出）
+    rendered = pyqtSignal(str, int, QImage)
+    # 图片路径, 渲染代数：读取或合成失败（从后台线程发出）
+    failed = pyqtSignal(str, int)
+
+    def __init__(self, max_edge: int = DEFAULT_THUMBNAIL_EDGE, parent=None):
+        """初始化渲染器
+
+        Args:
+            max_edge: 缩略图最长边像素
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.max_edge = max_edge
+        self.generation = 0
+        self.settings = {}
+        self.resolver = None  # 水印文字含字段时按图片替换
+        self.pool = QThreadPool(self)
+
+    def is_current(self, generation: int) -> bool:
+        """渲染结果是否属于当前设置（可在后台线程中调用）"""
+        return generation == self.generation
+
+    def render(self, image_paths: list, settings: dict, priority_paths=()) -> int:
+        """取消旧任务，用新设置渲染所有缩略图
+
+        Args:
+            image_paths: 图片路径列表
+            settings: 水印设置
+            priority_paths: 优先渲染的图片路径（如当前可见的行）
+
+        Returns:
+            int: 本次渲染的代数
+        """
+        self.cancel()
+        self.settings = copy.deepcopy(settings)
+        self.resolver = None
+        if self.settings.get('type') == '文本水印':
+            self.resolver = FieldResolver([self.settings.get('text', '')], self.settings.get('field_csv'),
+                                          image_paths) or None
+        priority = set(priority_paths)
+        ordered = [p for p in image_paths if p in priority] + [p for p in image_paths if p not in priority]
+        for path in ordered:
+            self._submit(path, HIGH_PRIORITY if path in priority else NORMAL_PRIORITY)
+        return self.generation
+
+    def extend(self, image_paths: list):
+        """用当前设置渲染新加入的图片，不取消已有任务"""
+        if self.resolver:
+            self.resolver.add_paths(image_paths)
+        for path in image_paths:
+            self._submit(path, NORMAL_PRIORITY)
+
+    def cancel(self):
+        """作废所有旧任务"""
+        self.generation += 1
+        self.pool.clear()
+
+    def _submit(self, image_path: str, priority: int):
+        """提交一个渲染任务"""
+        task = _ThumbnailRenderTask(self, image_path, self.generation, self.settings, self.resolver)
+        self.pool.start(task, priority)
@@ -0,0 +1,137 @@
+import copy
+import threading
+import time
+from typing import Any, Callable
+
+class DebouncedSaver:
+    """防抖保存器，在后台线程中合并短时间内的多次变更，只写入最后一次的数据
+
+    每次变更带有递增的序号，只写入比已写入的数据更新的数据；
+    关闭后不再写入，关闭时由close()写入最新的数据。
+    """
+
+    def __init__(self, save_func: Callable[[Any], Any], delay: float = 1.0, max_wait: float = 5.0):
+        """初始化保存器
+
+        Args:
+            save_func: 实际执行保存的函数，接收要保存的数据
+            delay: 最后一次变更后等待的秒数
+            max_wait: 连续变更时两次写入之间的最长间隔秒数
+        """
+        self.save_func = save_func
+        self.delay = delay
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # 保证同一时间只有一次写入
+        self._pending = None  # 待写入的(序号, 数据快照)
+        self._inflight = None  # 后台线程已取出、尚未写完的(序号, 数据快照)
+        self._seq = 0
+        self._written = 0  # 已写入的最新序号
+        self._deadline = 0.0
+        self._first_change = 0.0
+        self._closed = False
+        self._finished = False  # close()完成最后一次写入后为True，之后不再写入
+
+        self._thread = threading.Thread(target=self._run, name='DebouncedSaver', daemon=True)
+        self._thread.start()
+
+    def schedule(self, data: Any):
+        """登记一次变更，延迟写入
+
+        Args:
+            data: 要保存的数据，会在调用线程中复制一份快照
+        """
+        snapshot = copy.deepcopy(data)
+        now = time.monotonic()
+
+        with self._cond:
+            if self._closed:
+                return
+            if self._pending is None:
+                self._first_change = now
+            self._seq += 1
+            self._pending = (self._seq, snapshot)
+            # 防抖截止时间不超过首次变更后的最长等待时间
+            self._deadline = min(now + self.delay, self._first_change + self.max_wait)
+            self._cond.notify()
+
+    def flush(self) -> bool:
+        """立即同步写入尚未保存的数据
+
+        Returns:
+            bool: 是否有数据被写入
+        """
+        with self._cond:
+            item = self._pending
+            self._pending = None
+
+        if item is None:
+            return False
+        with self._write_lock:
+            return self._write_locked(item)
+
+    def close(self):
+        """停止后台线程并写入最新的数据，重复调用时不做任何事"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            # 后台线程已取出但可能还没写入的数据也由这里负责
+            items = [item for item in (self._pending, self._inflight) if item is not None]
+            self._pending = None
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+
+        # 在写入锁内完成最后一次写入，后台线程之后的写入都会被跳过
+        with self._write_lock:
+            if items:
+                self._write_locked(max(items, key=lambda item: item[0]))
+            self._finished = True
+
+    def _run(self):
+        """后台线程：等待变更平静后写入"""
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                # 等待到截止时间，期间的新变更会推迟截止时间
+                while not self._closed:
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+
+                item = self._inflight = self._pending
+                self._pending = None
+
+            if item is not None:
+                with self._write_lock:
+                    self._write_locked(item)
+            with self._cond:
+                self._inflight = None
+
+    def _write_locked(self, item: tuple) -> bool:
+        """执行写入并捕获异常（调用方持有写入锁）
+
+        Args:
+            item: (序号, 数据快照)
+
+        Returns:
+            bool: 是否写入成功；已关闭或已写入过更新的数据时跳过，返回False
+        """
+        seq, data = item
+        if self._finished or seq <= self._written:
+            return False
+        try:
+            self.save_func(data)
+        except Exception as e:
+            print(f"自动保存失败: {e}")
+            return False
+        self._written = seq
+        return True
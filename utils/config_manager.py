@@ -1,7 +1,9 @@
 import json
 import os
+import tempfile
 from datetime import datetime
 from typing import Dict, List, Optional, Any
+from utils.file_mode import replacement_mode
 
 class ConfigManager:
     """配置管理器，负责水印模板的保存、加载和管理"""
@@ -41,8 +43,7 @@ class ConfigManager:
             safe_name = self._sanitize_filename(name)
             template_file = os.path.join(self.templates_dir, f"{safe_name}.json")
             
-            with open(template_file, 'w', encoding='utf-8') as f:
-                json.dump(template_data, f, ensure_ascii=False, indent=2)
+            self._write_json_atomic(template_file, template_data)
                 
             return True
             
@@ -75,6 +76,28 @@ class ConfigManager:
             print(f"加载模板失败: {e}")
             return None
             
+    def load_export_templates(self, names: List[str]) -> List[Dict[str, Any]]:
+        """加载多个模板用于批量导出
+        
+        Args:
+            names: 模板名称列表
+            
+        Returns:
+            List: 导出模板列表，每项包含名称、水印设置和输出子目录，加载失败的模板会被跳过
+        """
+        templates = []
+        for name in names:
+            settings = self.load_template(name)
+            if settings is None:
+                print(f"模板不存在，已跳过: {name}")
+                continue
+            templates.append({
+                'name': name,
+                'watermark': settings,
+                'subfolder': self._sanitize_filename(name)
+            })
+        return templates
+        
     def get_template_list(self) -> List[Dict[str, str]]:
         """获取所有模板列表
         
@@ -164,8 +187,7 @@ class ConfigManager:
             bool: 保存是否成功
         """
         try:
-            with open(self.last_settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            self._write_json_atomic(self.last_settings_file, settings)
             return True
             
         except Exception as e:
@@ -212,6 +234,34 @@ class ConfigManager:
             'watermark_type': 'text'  # 'text' 或 'image'
         }
         
+    def _write_json_atomic(self, file_path: str, data: Any):
+        """原子写入JSON文件
+        
+        先写入同目录下的临时文件并落盘，再通过重命名覆盖目标文件，
+        写入中途崩溃时原文件保持完整。临时文件使用原文件的权限，覆盖后权限不变。
+        
+        Args:
+            file_path: 目标文件路径
+            data: 要写入的数据
+        """
+        directory = os.path.dirname(file_path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+        try:
+            # 先交给文件对象，之后的任何异常都会关闭描述符
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                os.chmod(tmp_path, replacement_mode(file_path))
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            # 清理残留的临时文件
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+            
     def _sanitize_filename(self, filename: str) -> str:
         """清理文件名，移除不安全字符
         
@@ -0,0 +1,157 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+# 快速预筛选时读取的文件头尾字节数
+PARTIAL_HASH_BYTES = 64 * 1024
+
+# 计算完整哈希时每次读取的字节数
+HASH_CHUNK_BYTES = 1024 * 1024
+
+class ContentDeduplicator:
+    """按文件内容检测重复图片
+    
+    先按文件大小分组，大小相同时再比较文件头尾的部分哈希，
+    部分哈希也相同时才计算完整哈希，绝大多数文件只需要一次stat。
+    某个大小第一次出现第二个文件时，才计算该大小下已登记文件的部分哈希，
+    之后按(大小, 部分哈希)索引，每次检查只需一次字典查找，不随已登记文件数量增长。
+    登记时不知道大小的文件先放入待分组列表，第一次检查重复时才统一stat分组，
+    不开启重复检测时登记几乎没有开销。
+    """
+    
+    def __init__(self):
+        self._by_size: Dict[int, List[str]] = {}  # 大小 -> 尚未计算部分哈希的路径
+        self._by_partial: Dict[Tuple[int, bytes], List[str]] = {}  # (大小, 部分哈希) -> 路径
+        self._partial_counts: Dict[int, int] = {}  # 大小 -> 已按部分哈希索引的文件数
+        self._sizes: Dict[str, int] = {}
+        self._pending: Dict[str, None] = {}
+        self._partial: Dict[str, bytes] = {}
+        self._full: Dict[str, bytes] = {}
+        
+    def add(self, path: str) -> Optional[str]:
+        """登记一个文件并检查是否与已登记的文件内容相同
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            str: 内容相同的已登记文件路径，不重复时返回None（并登记该文件）
+        """
+        duplicate = self.find(path)
+        if duplicate is None:
+            self.register(path)
+        return duplicate
+        
+    def find(self, path: str) -> Optional[str]:
+        """检查文件是否与已登记的文件内容相同，不登记该文件
+        
+        Args:
+            path: 文件路径
+            
+        Returns:
+            str: 内容相同的已登记文件路径，不重复时返回None
+        """
+        self._bucket_pending()
+        size = os.path.getsize(path)
+        if not self._partial_counts.get(size) and not any(p != path for p in self._by_size.get(size, ())):
+            return None
+        
+        self._index_partials(size)
+        key = (size, self._partial_hash(path))
+        candidates = [p for p in self._by_partial.get(key, ()) if p != path]
+        if candidates:
+            full = self._full_hash(path)
+            for candidate in candidates:
+                try:
+                    if self._full_hash(candidate) == full:
+                        return candidate
+                except OSError:
+                    # 已登记的文件被删除或无法读取时跳过
+                    continue
+        return None
+        
+    def register(self, path: str, size: int = None):
+        """登记一个文件，之后加入的相同内容文件会被检测为重复
+        
+        Args:
+            path: 文件路径
+            size: 文件大小（可选，已知时直接分组，否则在第一次检查重复时才stat）
+        """
+        if path in self._sizes or path in self._pending:
+            return
+        if size is None:
+            self._pending[path] = None
+        else:
+            self._sizes[path] = size
+            self._by_size.setdefault(size, []).append(path)
+            
+    def unregister(self, path: str):
+        """移除文件的登记和缓存的哈希"""
+        self._pending.pop(path, None)
+        size = self._sizes.pop(path, None)
+        partial = self._partial.pop(path, None)
+        self._full.pop(path, None)
+        if size is None:
+            return
+        group = self._by_size.get(size, [])
+        if path in group:
+            group.remove(path)
+            if not group:
+                del self._by_size[size]
+            return
+        group = self._by_partial.get((size, partial), [])
+        if path in group:
+            group.remove(path)
+            if not group:
+                del self._by_partial[(size, partial)]
+            self._partial_counts[size] -= 1
+            if not self._partial_counts[size]:
+                del self._partial_counts[size]
+        
+    def _bucket_pending(self):
+        """把待分组的文件按大小分组，无法stat的文件不再登记"""
+        pending, self._pending = self._pending, {}
+        for path in pending:
+            try:
+                self.register(path, os.path.getsize(path))
+            except OSError:
+                continue
+                
+    def _index_partials(self, size: int):
+        """计算该大小下尚未计算部分哈希的已登记文件，移入(大小, 部分哈希)索引，无法读取的文件不再登记"""
+        for path in self._by_size.pop(size, ()):
+            try:
+                partial = self._partial_hash(path)
+            except OSError:
+                self._sizes.pop(path, None)
+                continue
+            self._by_partial.setdefault((size, partial), []).append(path)
+            self._partial_counts[size] = self._partial_counts.get(size, 0) + 1
+        
+    def _partial_hash(self, path: str) -> bytes:
+        """计算文件头尾部分内容的哈希，结果缓存"""
+        digest = self._partial.get(path)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                hasher.update(f.read(PARTIAL_HASH_BYTES))
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size > PARTIAL_HASH_BYTES:
+                    f.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+                    hasher.update(f.read(PARTIAL_HASH_BYTES))
+            digest = hasher.digest()
+            self._partial[path] = digest
+        return digest
+        
+    def _full_hash(self, path: str) -> bytes:
+        """计算完整文件内容的哈希，结果缓存"""
+        digest = self._full.get(path)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=32)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                    hasher.update(chunk)
+            digest = hasher.digest()
+            self._full[path] = digest
+        return digest
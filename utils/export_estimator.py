@@ -0,0 +1,227 @@
+from collections import defaultdict
+from typing import Any, Dict, List
+import math
+import os
+import random
+from utils.preflight import PreflightScanner, estimate_working_set
+from utils.export_scheduler import default_memory_budget
+from utils.watermark_renderer import get_shared_renderer
+
+# 默认抽样数量
+DEFAULT_SAMPLE_SIZE = 30
+
+# 分层使用的百万像素区间上界
+MEGAPIXEL_BUCKETS = (1, 4, 12, 24, 48)
+
+# 95%置信区间对应的正态分位数
+CONFIDENCE_Z = 1.96
+
+# 结果中列出的处理阶段
+STAGES = ('decode', 'transform', 'watermark', 'resize', 'encode', 'other')
+
+def megapixel_bucket(width: int, height: int) -> str:
+    """按百万像素数划分的区间名称，如 '4-12MP'"""
+    megapixels = width * height / 1_000_000
+    lower = 0
+    for upper in MEGAPIXEL_BUCKETS:
+        if megapixels < upper:
+            return f'{lower}-{upper}MP'
+        lower = upper
+    return f'{lower}MP+'
+
+class ExportEstimator:
+    """导出试运行：抽样完整处理一部分图片，推算整批导出的输出体积和耗时
+
+    按(格式, 百万像素区间)分层，各层按图片数量比例抽样且至少抽一张。
+    样本只编码到内存，不写出文件。各层用比率估计（以原图像素数为辅助变量）
+    推算总量，并给出置信区间；没有抽到样本的层使用全部样本的比率。
+    """
+
+    def __init__(self, processor, scanner: PreflightScanner = None,
+                 sample_size: int = DEFAULT_SAMPLE_SIZE, seed: int = None):
+        """初始化估算器
+
+        Args:
+            processor: 图片处理器（ImageProcessor）
+            scanner: 文件头扫描器，默认使用处理器的元数据索引
+            sample_size: 抽样数量
+            seed: 随机种子，相同种子得到相同的样本
+        """
+        self.processor = processor
+        self.scanner = scanner or PreflightScanner(processor.metadata_index)
+        self.sample_size = max(1, sample_size)
+        self.seed = seed
+
+    def stratify(self, records: List[Dict[str, Any]]) -> Dict[tuple, List[Dict[str, Any]]]:
+        """按(格式, 百万像素区间)将可读取的图片分层"""
+        strata = defaultdict(list)
+        for record in records:
+            if record['error'] is None:
+                key = (record['format'] or '?', megapixel_bucket(record['width'], record['height']))
+                strata[key].append(record)
+        return dict(strata)
+
+    def sample(self, strata: Dict[tuple, List[Dict[str, Any]]]) -> Dict[tuple, List[Dict[str, Any]]]:
+        """按各层图片数量比例分配样本，每层至少一张，层数多于样本数时优先大的层"""
+        total = sum(len(items) for items in strata.values())
+        rng = random.Random(self.seed)
+        ordered = sorted(strata.items(), key=lambda item: len(item[1]), reverse=True)
+
+        samples = {}
+        remaining = self.sample_size
+        for key, items in ordered:
+            if remaining <= 0:
+                break
+            count = max(1, round(self.sample_size * len(items) / total))
+            count = min(count, len(items), remaining)
+            samples[key] = rng.sample(items, count)
+            remaining -= count
+        return samples
+
+    def estimate(self, image_paths: List[str], settings: dict, templates: list = None,
+                 workers: int = None) -> Dict[str, Any]:
+        """试运行并推算整批导出的结果
+
+        Args:
+            image_paths: 图片路径列表
+            settings: 导出设置，与ImageProcessor.export_images相同
+            templates: 可选的模板导出列表
+            workers: 并行导出的线程数，默认使用settings中的max_workers
+
+        Returns:
+            Dict: 包含：
+                - count / sample_count: 图片数量和实际处理的样本数量
+                - total_bytes / bytes_low / bytes_high: 输出总字节数的估计值和置信区间
+                - cpu_seconds: 单线程处理全部图片的估计秒数
+                - wall_seconds / wall_low / wall_high: 按并行数推算的耗时及置信区间
+                - parallelism: 推算时使用的有效并行数
+                - stages: 各阶段每张图片的平均秒数
+                - strata: 各层的图片数量、样本数量和每张图片的平均输出字节数与秒数
+                - errors: 无法读取或处理失败的图片
+        """
+        records = self.scanner.scan(image_paths)
+        strata = self.stratify(records)
+        samples = self.sample(strata)
+        errors = [(r['path'], r['error']) for r in records if r['error'] is not None]
+
+        # 完整处理样本，记录(原图百万像素, 输出字节数, 秒数)
+        measured = {}
+        stage_totals = defaultdict(float)
+        for key, items in samples.items():
+            points = []
+            for record in items:
+                result = self.processor.measure_export(record['path'], settings, templates)
+                if result is None:
+                    errors.append((record['path'], '试运行处理失败'))
+                    continue
+                points.append((self._megapixels(record), result['bytes'], result['seconds']))
+                for stage, seconds in result['timings'].items():
+                    stage_totals[stage] += seconds
+            if points:
+                measured[key] = points
+
+        all_points = [p for points in measured.values() for p in points]
+        sample_count = len(all_points)
+        bytes_total, bytes_var = self._extrapolate(strata, measured, all_points, 1)
+        cpu_total, cpu_var = self._extrapolate(strata, measured, all_points, 2)
+
+        parallelism = self._parallelism(records, settings, workers, templates)
+        bytes_margin = CONFIDENCE_Z * math.sqrt(bytes_var)
+        cpu_margin = CONFIDENCE_Z * math.sqrt(cpu_var)
+        # 样本已经真实处理过，下界不低于样本自身的合计
+        sampled_bytes = sum(p[1] for p in all_points)
+        sampled_seconds = sum(p[2] for p in all_points)
+
+        return {
+            'count': sum(len(items) for items in strata.values()),
+            'sample_count': sample_count,
+            'total_bytes': bytes_total,
+            'bytes_low': max(sampled_bytes, bytes_total - bytes_margin),
+            'bytes_high': bytes_total + bytes_margin,
+            'cpu_seconds': cpu_total,
+            'wall_seconds': cpu_total / parallelism,
+            'wall_low': max(sampled_seconds, cpu_total - cpu_margin) / parallelism,
+            'wall_high': (cpu_total + cpu_margin) / parallelism,
+            'parallelism': parallelism,
+            'stages': {stage: stage_totals.get(stage, 0.0) / max(1, sample_count) for stage in STAGES},
+            'strata': [{
+                'format': key[0],
+                'bucket': key[1],
+                'count': len(items),
+                'samples': len(measured.get(key, ())),
+                'bytes_per_image': self._mean(measured.get(key), 1),
+                'seconds_per_image': self._mean(measured.get(key), 2)
+            } for key, items in sorted(strata.items())],
+            'errors': errors
+        }
+
+    def _extrapolate(self, strata: dict, measured: dict, all_points: list, column: int) -> tuple:
+        """用分层比率估计推算总量
+
+        每层的总量 = 该层样本的(输出量 / 原图像素)比率 x 该层原图像素总和；
+        方差按比率估计的残差计算。样本只有一张或没有样本的层，使用全部样本的比率离散程度近似。
+
+        Args:
+            strata: 分层后的全部图片
+            measured: 各层样本的测量结果
+            all_points: 全部样本的测量结果
+            column: 要推算的量在测量结果中的位置（1为字节数，2为秒数）
+
+        Returns:
+            (总量估计值, 方差)
+        """
+        if not all_points:
+            return 0.0, 0.0
+        pooled_ratio = self._ratio(all_points, column)
+        # 各样本比率的变异系数，用于样本不足的层
+        ratios = [p[column] / p[0] for p in all_points if p[0] > 0]
+        pooled_cv = 0.0
+        if len(ratios) > 1 and pooled_ratio > 0:
+            mean = sum(ratios) / len(ratios)
+            pooled_cv = math.sqrt(sum((r - mean) ** 2 for r in ratios) / (len(ratios) - 1)) / mean
+
+        total = 0.0
+        variance = 0.0
+        for key, items in strata.items():
+            population = len(items)
+            x_total = sum(self._megapixels(r) for r in items)
+            points = measured.get(key, [])
+            n = len(points)
+            ratio = self._ratio(points, column) if n else pooled_ratio
+            total += ratio * x_total
+
+            if n >= 2:
+                residual = sum((p[column] - ratio * p[0]) ** 2 for p in points) / (n - 1)
+            else:
+                residual = (pooled_cv * ratio * x_total / population) ** 2
+            # 有限总体校正：整层都被抽中时没有抽样误差
+            variance += population ** 2 * (1 - n / population) * residual / max(1, n)
+        return total, variance
+
+    def _parallelism(self, records: list, settings: dict, workers: int = None,
+                     templates: list = None) -> float:
+        """导出时的有效并行数：受线程数、CPU数量和内存预算（按典型图片的内存占用）限制"""
+        workers = max(1, workers or settings.get('max_workers', 1))
+        renderer = get_shared_renderer()
+        watermarks = [t.get('watermark') for t in templates] if templates else [settings.get('watermark')]
+        tiled = any(renderer.is_tiled(w or {}) for w in watermarks)
+        working_sets = sorted(estimate_working_set(r['width'], r['height'], r['mode'], tiled)
+                              for r in records if r['error'] is None)
+        limit = min(workers, os.cpu_count() or 1)
+        if working_sets:
+            typical = working_sets[len(working_sets) // 2]
+            # 与导出时相同：渲染器缓存的图层从预算中扣除
+            budget = (settings.get('memory_budget') or default_memory_budget()) - renderer.max_overlay_bytes
+            limit = min(limit, max(1, budget // max(1, typical)))
+        return float(limit)
+
+    def _megapixels(self, record: dict) -> float:
+        return record['width'] * record['height'] / 1_000_000
+
+    def _ratio(self, points: list, column: int) -> float:
+        """样本的合计输出量与合计原图像素之比"""
+        x_sum = sum(p[0] for p in points)
+        return sum(p[column] for p in points) / x_sum if x_sum > 0 else 0.0
+
+    def _mean(self, points: list, column: int) -> float:
+        return sum(p[column] for p in points) / len(points) if points else 0.0
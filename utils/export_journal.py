@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+
+# 导出目录中的进度日志文件名
+JOURNAL_FILENAME = '.export_journal.jsonl'
+
+class ExportJournal:
+    """导出进度日志，逐行记录已完成的输出文件
+    
+    输出文件先写入临时文件再重命名到位，之后才写入日志，
+    因此日志中的每条记录都对应一个完整的文件。
+    """
+    
+    def __init__(self, export_dir: str, resume: bool = False, sync_interval: float = 1.0):
+        """打开进度日志
+        
+        Args:
+            export_dir: 导出目录
+            resume: 是否继续上次的导出；为False时清空已有日志
+            sync_interval: 日志落盘的最小间隔秒数
+        """
+        self.path = os.path.join(export_dir, JOURNAL_FILENAME)
+        self.sync_interval = sync_interval
+        self._done = {}
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        
+        os.makedirs(export_dir, exist_ok=True)
+        if resume:
+            self._load()
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        
+    @staticmethod
+    def exists(export_dir: str) -> bool:
+        """检查导出目录中是否有未完成的导出日志"""
+        return os.path.exists(os.path.join(export_dir, JOURNAL_FILENAME))
+        
+    def _load(self):
+        """读取已有日志，忽略崩溃时写了一半的最后一行"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._done[entry['output']] = entry.get('size', -1)
+                
+    def is_done(self, output_path: str, rel_path: str) -> bool:
+        """检查输出文件是否已在上次导出中完成
+
+        只看继续导出时读入的记录，本次写入的记录不算在内：
+        同一个日志追加多批导出时（如监视文件夹），重新写入的同名原图仍会导出。
+        
+        Args:
+            output_path: 输出文件的完整路径
+            rel_path: 相对于导出目录的路径（日志中的键）
+            
+        Returns:
+            bool: 日志中有记录且文件仍然存在、大小一致
+        """
+        with self._lock:
+            size = self._done.get(rel_path)
+        if size is None:
+            return False
+        try:
+            return size < 0 or os.path.getsize(output_path) == size
+        except OSError:
+            return False
+            
+    def record(self, rel_path: str, source: str, size: int):
+        """记录一个已完成的输出文件
+        
+        Args:
+            rel_path: 相对于导出目录的输出路径
+            source: 原图路径
+            size: 输出文件大小
+        """
+        line = json.dumps({'output': rel_path, 'source': source, 'size': size}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            # 限制fsync频率，崩溃时最多丢失最近一段时间的记录（对应的图片会重新导出）
+            now = time.monotonic()
+            if now - self._last_sync >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+                
+    def close(self, completed: bool = False):
+        """关闭日志
+        
+        Args:
+            completed: 导出是否全部成功，成功时删除日志
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+import os
+import threading
+
+# 无法获取物理内存时使用的默认内存预算
+FALLBACK_MEMORY_BUDGET = 2 * 1024 ** 3
+
+def default_memory_budget() -> int:
+    """获取默认内存预算：物理内存的一半
+
+    Returns:
+        int: 内存预算字节数
+    """
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        if total > 0:
+            return total // 2
+    except (AttributeError, ValueError, OSError):
+        pass
+    return FALLBACK_MEMORY_BUDGET
+
+class MemoryBudgetScheduler:
+    """按内存预算调度导出任务
+
+    只有当运行中任务的估算内存总和不超过预算时才启动新任务；
+    大图占满预算时优先启动能放下的小图，保持所有线程忙碌。
+    单个任务超过预算时，等其他任务全部结束后单独运行。
+    """
+
+    def __init__(self, memory_budget: int = None, max_workers: int = None, reserved_bytes: int = 0):
+        """初始化调度器
+
+        Args:
+            memory_budget: 内存预算字节数，默认为物理内存的一半
+            max_workers: 最大并行任务数，默认为CPU数量
+            reserved_bytes: 任务之外常驻的内存（如渲染器缓存），从预算中扣除
+        """
+        self.memory_budget = max(1, (memory_budget or default_memory_budget()) - reserved_bytes)
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._running = 0
+        self.peak_in_use = 0  # 运行期间的最大估算内存占用
+
+    def run(self, jobs: List[Tuple[int, Any]], func: Callable[[Any], Any]):
+        """执行所有任务，全部完成后返回
+
+        Args:
+            jobs: 任务列表，每项为(估算内存字节数, 任务参数)
+            func: 执行单个任务的函数，接收任务参数
+        """
+        pending = list(jobs)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending:
+                with self._cond:
+                    index = self._wait_for_admission(pending)
+                    cost, payload = pending.pop(index)
+                    self._in_use += cost
+                    self._running += 1
+                    self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+                future = executor.submit(func, payload)
+                future.add_done_callback(lambda f, cost=cost: self._release(cost))
+
+    def _wait_for_admission(self, pending: List[Tuple[int, Any]]) -> int:
+        """等待直到有任务可以启动，返回该任务在pending中的位置（需持有锁调用）"""
+        while True:
+            if self._running < self.max_workers:
+                available = self.memory_budget - self._in_use
+                # 按提交顺序找到第一个放得下的任务
+                for index, (cost, _) in enumerate(pending):
+                    if cost <= available:
+                        return index
+                # 没有任务在运行时，超出预算的任务单独运行
+                if self._running == 0:
+                    return 0
+            self._cond.wait()
+
+    def _release(self, cost: int):
+        """任务结束后归还内存预算"""
+        with self._cond:
+            self._in_use -= cost
+            self._running -= 1
+            self._cond.notify_all()
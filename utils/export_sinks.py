@@ -0,0 +1,215 @@
+from PIL import Image
+import io
+import os
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from utils.export_journal import ExportJournal
+
+# 写入中的临时文件后缀，重命名到位前的文件不会被当作已完成的输出
+PARTIAL_SUFFIX = '.part'
+
+# 已经压缩过的格式在ZIP中直接存储，不再重复压缩
+STORED_FORMATS = ('JPEG', 'WEBP')
+
+class DirectorySink:
+    """导出到目录：每张图片先写入临时文件，完整写入后再重命名到位"""
+    
+    def __init__(self, root: str, journal: ExportJournal = None):
+        """初始化目录输出
+        
+        Args:
+            root: 导出根目录
+            journal: 导出进度日志，为空时不记录进度
+        """
+        self.root = root
+        self.journal = journal
+        os.makedirs(root, exist_ok=True)
+        
+    def prepare(self, rel_dir: str):
+        """创建输出子目录，并清理上次中断时残留的临时文件
+        
+        Args:
+            rel_dir: 相对于导出根目录的子目录
+        """
+        directory = os.path.join(self.root, rel_dir)
+        os.makedirs(directory, exist_ok=True)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') and entry.name.endswith(PARTIAL_SUFFIX):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                        
+    def is_done(self, rel_path: str) -> bool:
+        """检查输出文件是否已在之前的导出中完成
+        
+        Args:
+            rel_path: 相对于导出根目录的文件路径
+        """
+        if self.journal is None:
+            return False
+        return self.journal.is_done(os.path.join(self.root, rel_path), rel_path)
+        
+    def save(self, rel_path: str, img: Image.Image, output_format: str, save_params: dict, source: str = ''):
+        """编码并保存图片
+        
+        Args:
+            rel_path: 相对于导出根目录的文件路径
+            img: 要保存的图片
+            output_format: 输出格式
+            save_params: 编码参数
+            source: 原图路径，记录到进度日志中
+        """
+        output_path = os.path.join(self.root, rel_path)
+        directory, filename = os.path.split(output_path)
+        tmp_path = os.path.join(directory, f'.{filename}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}')
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                img.save(f, output_format, **save_params)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+            
+        if self.journal is not None:
+            self.journal.record(rel_path, source, size)
+        
+    def close(self, completed: bool = False):
+        """结束输出
+        
+        Args:
+            completed: 是否所有图片都导出成功，成功时删除进度日志
+        """
+        if self.journal is not None:
+            self.journal.close(completed)
+
+class ArchiveSink:
+    """导出到ZIP或TAR归档：编码结果在内存中完成后顺序写入归档，不产生临时文件
+    
+    内存中同时存在的编码结果数量不超过并行导出的线程数。
+    """
+    
+    def __init__(self, archive_path: str):
+        """初始化归档输出，根据扩展名选择ZIP或TAR
+        
+        Args:
+            archive_path: 归档文件路径（.zip 或 .tar）
+        """
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(archive_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        if archive_path.lower().endswith('.tar'):
+            self._zip = None
+            self._tar = tarfile.open(archive_path, 'w')
+        else:
+            self._zip = zipfile.ZipFile(archive_path, 'w', allowZip64=True)
+            self._tar = None
+            
+    def prepare(self, rel_dir: str):
+        """归档中的目录随文件一起创建，无需预先准备"""
+        pass
+        
+    def is_done(self, rel_path: str) -> bool:
+        """归档每次都重新生成，没有已完成的条目"""
+        return False
+        
+    def save(self, rel_path: str, img: Image.Image, output_format: str, save_params: dict, source: str = ''):
+        """编码图片并作为一个条目写入归档
+        
+        Args:
+            rel_path: 归档内的文件路径
+            img: 要保存的图片
+            output_format: 输出格式
+            save_params: 编码参数
+            source: 原图路径（未使用）
+        """
+        buffer = io.BytesIO()
+        img.save(buffer, output_format, **save_params)
+        data = buffer.getbuffer()
+        name = rel_path.replace(os.sep, '/')
+        
+        # 归档只能顺序写入，多个线程的写入串行进行
+        with self._lock:
+            if self._zip is not None:
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED if output_format in STORED_FORMATS else zipfile.ZIP_DEFLATED
+                self._zip.writestr(info, data)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                self._tar.addfile(info, io.BytesIO(data))
+                
+    def close(self, completed: bool = False):
+        """写入归档目录并关闭文件"""
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+
+class MeasuringSink:
+    """只编码不写出的输出目标，记录编码耗时和输出体积，用于导出预估"""
+    
+    def __init__(self):
+        self.bytes_written = 0
+        self.encode_seconds = 0.0
+        self.count = 0
+        
+    def prepare(self, rel_dir: str):
+        """不产生任何文件，无需准备"""
+        pass
+        
+    def is_done(self, rel_path: str) -> bool:
+        """每次都完整处理"""
+        return False
+        
+    def save(self, rel_path: str, img: Image.Image, output_format: str, save_params: dict, source: str = ''):
+        """编码到内存并丢弃，只记录耗时和字节数
+        
+        Args:
+            rel_path: 输出路径（未使用）
+            img: 要编码的图片
+            output_format: 输出格式
+            save_params: 编码参数
+            source: 原图路径（未使用）
+        """
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        img.save(buffer, output_format, **save_params)
+        self.encode_seconds += time.perf_counter() - start
+        self.bytes_written += buffer.tell()
+        self.count += 1
+        
+    def close(self, completed: bool = False):
+        pass
+
+def open_sink(export_dir: str, archive_path: str = None, resume: bool = False):
+    """根据导出设置创建输出目标
+    
+    Args:
+        export_dir: 导出目录
+        archive_path: 归档文件路径，为空时导出到目录
+        resume: 导出到目录时是否继续上次未完成的导出
+        
+    Returns:
+        DirectorySink 或 ArchiveSink
+    """
+    if archive_path:
+        return ArchiveSink(archive_path)
+    return DirectorySink(export_dir, ExportJournal(export_dir, resume))
@@ -0,0 +1,157 @@
+from PIL import Image
+from typing import Optional, Tuple
+import math
+
+# EXIF方向标签
+EXIF_ORIENTATION_TAG = 0x0112
+
+# EXIF方向值对应的无损转置操作（与ImageOps.exif_transpose一致）
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+# 宽高互换的方向值
+SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+
+def read_orientation(img: Image.Image) -> int:
+    """读取图片的EXIF方向，没有或无效时返回1"""
+    try:
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        return 1
+    return orientation if orientation in ORIENTATION_TRANSPOSE else 1
+
+def oriented_size(size: tuple, orientation: int) -> tuple:
+    """按EXIF方向转正后的图片尺寸"""
+    width, height = size
+    return (height, width) if orientation in SWAPPED_ORIENTATIONS else (width, height)
+
+def plan_transform(size: tuple, orientation: int = 1, crop: tuple = None,
+                   target_size: tuple = None, max_edge: int = None) -> dict:
+    """计算导出变换：方向、裁剪区域、输出尺寸和所需的解码比例
+
+    所有坐标都在转正后的原图坐标系中。
+
+    Args:
+        size: 原图（未转正）的尺寸
+        orientation: EXIF方向值
+        crop: 裁剪区域 (left, top, right, bottom)，取值为相对转正后图片尺寸的比例（0~1），None表示不裁剪
+        target_size: 输出尺寸上限 (width, height)，按比例缩小到不超过该尺寸，不放大，None表示不缩放
+        max_edge: 后续输出规格的最长边上限，只用于决定解码比例
+
+    Returns:
+        dict: 包含orientation、crop_box（转正后原图坐标）、output_size（转正后的输出尺寸）
+              和decode_ratio（解码时可以缩小到的比例）
+    """
+    width, height = oriented_size(size, orientation)
+    if crop:
+        left, top, right, bottom = (min(1.0, max(0.0, v)) for v in crop)
+        if right <= left or bottom <= top:
+            raise ValueError(f'无效的裁剪区域: {crop}')
+        crop_box = (left * width, top * height, right * width, bottom * height)
+    else:
+        crop_box = (0.0, 0.0, float(width), float(height))
+
+    crop_w = crop_box[2] - crop_box[0]
+    crop_h = crop_box[3] - crop_box[1]
+    ratio = 1.0
+    if target_size:
+        ratio = min(ratio, target_size[0] / crop_w, target_size[1] / crop_h)
+    output_size = (max(1, round(crop_w * ratio)), max(1, round(crop_h * ratio)))
+
+    # 后续规格只会更小，解码时按最终需要的最大尺寸缩小即可
+    decode_ratio = ratio
+    if max_edge:
+        decode_ratio = min(decode_ratio, max_edge / max(crop_w, crop_h))
+
+    return {
+        'orientation': orientation,
+        'crop_box': crop_box,
+        'output_size': output_size,
+        'decode_ratio': decode_ratio
+    }
+
+def decode_edge(size: tuple, plan: dict) -> Optional[int]:
+    """按变换计划需要解码的最长边，不需要缩小解码时返回None"""
+    if plan['decode_ratio'] >= 1:
+        return None
+    return max(1, math.ceil(max(size) * plan['decode_ratio']))
+
+def apply_transform(img: Image.Image, plan: dict, raw_size: tuple) -> Image.Image:
+    """按变换计划处理已解码的图片
+
+    裁剪区域先换算到未转正（且可能已按draft缩小）的图片坐标中，裁剪和缩放合并为一次resize，
+    再对缩小后的结果做无损转置，避免对整张原图做多次复制。
+
+    Args:
+        img: 已解码的图片（未转正）
+        plan: plan_transform返回的变换计划
+        raw_size: 原图（未转正、未缩小解码）的尺寸
+
+    Returns:
+        转正、裁剪并缩放后的图片；不需要任何变换时返回原对象
+    """
+    orientation = plan['orientation']
+    # draft解码时宽高的缩小比例可能略有不同，分别换算
+    scale_x = img.width / raw_size[0]
+    scale_y = img.height / raw_size[1]
+    left, top, right, bottom = _to_raw_box(plan['crop_box'], raw_size, orientation)
+    box = (max(0.0, left * scale_x), max(0.0, top * scale_y),
+           min(float(img.width), right * scale_x), min(float(img.height), bottom * scale_y))
+
+    # 未转正坐标系中的输出尺寸
+    out_w, out_h = plan['output_size']
+    if orientation in SWAPPED_ORIENTATIONS:
+        out_w, out_h = out_h, out_w
+    # draft解码得到的图片比计划的输出小时不放大，由后续规格继续缩小
+    box_w, box_h = box[2] - box[0], box[3] - box[1]
+    if out_w > box_w + 0.5 or out_h > box_h + 0.5:
+        out_w, out_h = max(1, round(box_w)), max(1, round(box_h))
+
+    full = box == (0.0, 0.0, float(img.width), float(img.height))
+    if (out_w, out_h) != img.size or not full:
+        rounded = tuple(round(v) for v in box)
+        if (out_w, out_h) == (rounded[2] - rounded[0], rounded[3] - rounded[1]) and \
+                all(abs(a - b) < 1e-6 for a, b in zip(box, rounded)):
+            # 只裁剪不缩放：直接裁剪，不重新采样
+            img = img.crop(rounded)
+        else:
+            img = img.resize((out_w, out_h), Image.Resampling.LANCZOS, box=box)
+
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        img = img.transpose(transpose)
+    return img
+
+def _to_raw_box(box: tuple, raw_size: tuple, orientation: int) -> Tuple[float, float, float, float]:
+    """将转正后坐标系中的矩形换算到未转正的原图坐标系"""
+    width, height = raw_size
+    left, top, right, bottom = box
+
+    def to_raw(x, y):
+        # 各方向下转正后坐标 (x, y) 对应的原图坐标
+        if orientation == 2:
+            return width - x, y
+        if orientation == 3:
+            return width - x, height - y
+        if orientation == 4:
+            return x, height - y
+        if orientation == 5:
+            return y, x
+        if orientation == 6:
+            return y, height - x
+        if orientation == 7:
+            return width - y, height - x
+        if orientation == 8:
+            return width - y, x
+        return x, y
+
+    x1, y1 = to_raw(left, top)
+    x2, y2 = to_raw(right, bottom)
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
@@ -0,0 +1,27 @@
+import os
+import stat
+
+def _default_file_mode() -> int:
+    """按当前umask计算新建文件的权限（mkstemp创建的临时文件固定为0600）"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+# 目标文件不存在时写入文件使用的权限，在导入时（其他线程启动前）读取一次umask
+DEFAULT_FILE_MODE = _default_file_mode()
+
+def replacement_mode(file_path: str) -> int:
+    """原子写入时临时文件应使用的权限
+
+    临时文件重命名覆盖目标文件后沿用目标文件原来的权限，目标文件不存在时按umask新建。
+
+    Args:
+        file_path: 目标文件路径
+
+    Returns:
+        int: 权限位
+    """
+    try:
+        return stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        return DEFAULT_FILE_MODE
@@ -0,0 +1,107 @@
+from typing import Callable, List, Optional
+import json
+import os
+import sys
+import tempfile
+
+def font_directories() -> List[str]:
+    """获取当前平台的系统和用户字体目录"""
+    home = os.path.expanduser('~')
+    if sys.platform.startswith('win'):
+        directories = [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts')]
+        local = os.environ.get('LOCALAPPDATA')
+        if local:
+            directories.append(os.path.join(local, 'Microsoft', 'Windows', 'Fonts'))
+    elif sys.platform == 'darwin':
+        directories = ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library', 'Fonts')]
+    else:
+        directories = ['/usr/share/fonts', '/usr/local/share/fonts',
+                       os.path.join(home, '.fonts'), os.path.join(home, '.local', 'share', 'fonts')]
+    return directories
+
+class FontIndex:
+    """已安装字体家族的磁盘缓存
+
+    枚举系统字体很慢，结果按字体目录（包括子目录）的修改时间缓存到配置目录中。
+    安装或删除字体会改变所在目录的修改时间，此时缓存失效并重新枚举。
+    """
+
+    def __init__(self, cache_path: str = None):
+        """初始化字体索引
+
+        Args:
+            cache_path: 缓存文件路径，默认为 ~/.photo_watermark/font_index.json
+        """
+        self.cache_path = cache_path or os.path.join(os.path.expanduser("~"), ".photo_watermark", "font_index.json")
+
+    def fingerprint(self) -> list:
+        """字体目录及其子目录的修改时间，用于判断缓存是否过期
+
+        字体通常安装在字体目录下的多级子目录中（如 /usr/share/fonts/truetype/dejavu），
+        只有直接所在的目录修改时间会变化，因此递归统计每个字体目录下的子目录数量和最大修改时间。
+        """
+        result = []
+        for directory in font_directories():
+            try:
+                latest = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            count = 0
+            for root, subdirs, _ in os.walk(directory):
+                for name in subdirs:
+                    try:
+                        latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+                        count += 1
+                    except OSError:
+                        continue
+            result.append([directory, count, latest])
+        return result
+
+    def load(self) -> Optional[List[str]]:
+        """读取缓存的字体家族列表
+
+        Returns:
+            字体家族名称列表，缓存不存在或已过期时返回None
+        """
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('fingerprint') != self.fingerprint():
+            return None
+        families = data.get('families')
+        return families if isinstance(families, list) else None
+
+    def save(self, families: List[str]):
+        """保存字体家族列表（原子写入）"""
+        data = {'fingerprint': self.fingerprint(), 'families': list(families)}
+        directory = os.path.dirname(self.cache_path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            print(f"保存字体索引失败: {e}")
+
+    def families(self, enumerate_func: Callable[[], List[str]]) -> List[str]:
+        """获取字体家族列表，缓存有效时直接返回，否则重新枚举并更新缓存
+
+        Args:
+            enumerate_func: 枚举系统字体的函数
+
+        Returns:
+            排序后的字体家族名称列表
+        """
+        families = self.load()
+        if families is None:
+            families = sorted(set(enumerate_func()), key=str.casefold)
+            self.save(families)
+        return families
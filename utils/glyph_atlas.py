@@ -0,0 +1,93 @@
+from PIL import Image, ImageChops, ImageDraw
+from collections import OrderedDict
+import threading
+
+# 多行文字的行距（与ImageDraw多行绘制的默认值一致）
+LINE_SPACING = 4
+
+# 每个字体最多缓存的字形数量
+DEFAULT_MAX_GLYPHS = 4096
+
+class GlyphAtlas:
+    """单个字体（字体、字号、字形）的字形缓存
+
+    每个字符第一次出现时光栅化为灰度遮罩，并记录相对基准点的偏移和步进宽度；
+    之后的字符串直接用缓存的遮罩拼接，不再逐行调用FreeType重新光栅化。
+    用于每张图片文字都不同的可变水印。按字符拼接不做字距调整，与整行绘制可能相差不到一个像素。
+    """
+
+    def __init__(self, font, max_glyphs: int = DEFAULT_MAX_GLYPHS):
+        """初始化字形缓存
+
+        Args:
+            font: PIL字体对象
+            max_glyphs: 最多缓存的字形数量
+        """
+        self.font = font
+        self.max_glyphs = max_glyphs
+        self._glyphs = OrderedDict()
+        self._lock = threading.Lock()
+        # 行高与ImageDraw多行绘制一致
+        self.line_height = font.getbbox('A')[3] + LINE_SPACING
+
+    def glyph(self, char: str) -> tuple:
+        """获取字符的字形
+
+        Returns:
+            (遮罩, 左偏移, 上偏移, 步进宽度)，空白字符的遮罩为None
+        """
+        with self._lock:
+            glyph = self._glyphs.get(char)
+            if glyph is not None:
+                self._glyphs.move_to_end(char)
+                return glyph
+
+        left, top, right, bottom = self.font.getbbox(char)
+        mask = None
+        if right > left and bottom > top:
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), char, font=self.font, fill=255)
+        glyph = (mask, left, top, self.font.getlength(char))
+
+        with self._lock:
+            self._glyphs[char] = glyph
+            while len(self._glyphs) > self.max_glyphs:
+                self._glyphs.popitem(last=False)
+        return glyph
+
+    def render(self, text: str):
+        """用缓存的字形拼出整段文字的遮罩
+
+        Args:
+            text: 文字，可以包含换行
+
+        Returns:
+            紧贴文字边界的灰度遮罩（'L'模式），没有可见字符时返回None
+        """
+        placements = []
+        min_x = min_y = None
+        max_x = max_y = None
+        for row, line in enumerate(text.split('\n')):
+            x = 0.0
+            y = row * self.line_height
+            for char in line:
+                mask, left, top, advance = self.glyph(char)
+                if mask is not None:
+                    px = int(round(x)) + left
+                    py = y + top
+                    placements.append((mask, px, py))
+                    min_x = px if min_x is None else min(min_x, px)
+                    min_y = py if min_y is None else min(min_y, py)
+                    max_x = px + mask.width if max_x is None else max(max_x, px + mask.width)
+                    max_y = py + mask.height if max_y is None else max(max_y, py + mask.height)
+                x += advance
+
+        if not placements:
+            return None
+
+        canvas = Image.new('L', (max_x - min_x, max_y - min_y), 0)
+        for mask, px, py in placements:
+            box = (px - min_x, py - min_y, px - min_x + mask.width, py - min_y + mask.height)
+            # 相邻字形可能重叠（斜体、紧凑字体），取较大值而不是覆盖
+            canvas.paste(ImageChops.lighter(canvas.crop(box), mask), box[:2])
+        return canvas
@@ -0,0 +1,226 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Optional
+from utils.image_processor import ImageProcessor
+
+# inotify事件标志
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# inotify_event结构体头部：wd, mask, cookie, len
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+class HotFolderWatcher:
+    """监视文件夹，自动为新写入完成的图片添加水印并导出
+
+    Linux上使用inotify，文件关闭写入或移动进来时立即得到通知；
+    其他平台退回到轮询，文件大小和修改时间在两次轮询间不变才视为写入完成。
+    新文件会在短时间窗口内合并成一批，再通过ImageProcessor的导出流程处理；
+    输出目标和进度日志在监视期间只打开一次，每批追加写入。
+    """
+
+    def __init__(self, input_dir: str, export_dir: str, settings: dict,
+                 processor: ImageProcessor = None, batch_window: float = 0.2,
+                 max_batch: int = 16, poll_interval: float = 0.3,
+                 on_batch: Optional[Callable[[list, float], None]] = None):
+        """初始化监视器
+
+        Args:
+            input_dir: 监视的输入目录
+            export_dir: 导出目录，不能与输入目录相同
+            settings: 导出设置，格式同ImageProcessor.export_images，必须包含水印设置
+            processor: 图片处理器，默认新建一个
+            batch_window: 收到第一张新图片后等待更多图片的秒数
+            max_batch: 每批最多处理的图片数量
+            poll_interval: 轮询模式下的扫描间隔秒数
+            on_batch: 每批处理完成后的回调，参数为图片路径列表和处理耗时
+        """
+        if os.path.abspath(input_dir) == os.path.abspath(export_dir):
+            raise ValueError('导出目录不能与监视目录相同')
+        if not settings.get('watermark'):
+            # 没有水印设置时只会导出原图的副本
+            raise ValueError('监视模式没有可用的水印设置')
+
+        self.input_dir = input_dir
+        self.export_dir = export_dir
+        self.settings = settings
+        self.processor = processor or ImageProcessor()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.poll_interval = poll_interval
+        self.on_batch = on_batch
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._sink = None  # 监视期间共用的输出目标
+        self._failed = False
+        self._next_index = 1  # 下一张图片在水印文字 {index} 字段中的序号，整个监视期间连续编号
+        self.mode = None  # 'inotify' 或 'polling'
+
+    def start(self):
+        """开始监视"""
+        self._stop.clear()
+        self._sink = self.processor.open_export(self.export_dir, self.settings)
+        self._failed = False
+        self._next_index = 1
+        inotify_fd = self._open_inotify()
+        if inotify_fd is not None:
+            self.mode = 'inotify'
+            watch_target = lambda: self._watch_inotify(inotify_fd)
+        else:
+            self.mode = 'polling'
+            watch_target = self._watch_polling
+
+        self._threads = [
+            threading.Thread(target=watch_target, name='HotFolderWatch', daemon=True),
+            threading.Thread(target=self._process_batches, name='HotFolderBatch', daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """停止监视，等待正在处理的批次完成"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._sink is not None:
+            # 所有批次都成功时删除进度日志
+            self._sink.close(not self._failed)
+            self._sink = None
+
+    def is_running(self) -> bool:
+        """是否正在监视"""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _accept(self, path: str):
+        """将写入完成的文件加入待处理队列"""
+        if os.path.isfile(path) and self.processor.is_supported_format(path):
+            self._queue.put(path)
+
+    def _open_inotify(self) -> Optional[int]:
+        """创建inotify监视，不支持时返回None"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.input_dir), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError) as e:
+            print(f"inotify不可用，改用轮询: {e}")
+            return None
+
+    def _watch_inotify(self, fd: int):
+        """inotify监视循环：文件关闭写入或移入时即为写入完成"""
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                offset = 0
+                while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+                    _, mask, _, name_len = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+                    offset += INOTIFY_EVENT_HEADER.size
+                    name = data[offset:offset + name_len].rstrip(b'\0')
+                    offset += name_len
+                    if name and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        self._accept(os.path.join(self.input_dir, os.fsdecode(name)))
+        finally:
+            os.close(fd)
+
+    def _watch_polling(self):
+        """轮询监视循环：大小和修改时间稳定后视为写入完成"""
+        # 启动时已存在的文件不处理
+        seen = self._scan()
+        pending = {}
+
+        while not self._stop.wait(self.poll_interval):
+            current = self._scan()
+            for path, signature in current.items():
+                if seen.get(path) == signature:
+                    continue
+                if pending.get(path) == signature and signature[0] > 0:
+                    # 两次轮询之间没有变化，写入完成
+                    del pending[path]
+                    seen[path] = signature
+                    self._accept(path)
+                else:
+                    pending[path] = signature
+
+            # 清理已删除的文件
+            for path in list(seen):
+                if path not in current:
+                    del seen[path]
+            for path in list(pending):
+                if path not in current:
+                    del pending[path]
+
+    def _scan(self) -> dict:
+        """扫描输入目录，返回路径到(大小, 修改时间)的映射"""
+        result = {}
+        try:
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        result[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            print(f"扫描监视目录失败: {e}")
+        return result
+
+    def _process_batches(self):
+        """批处理循环：合并短时间内到达的图片，一起导出"""
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # 同一批中重复通知的文件只处理一次
+            batch = list(dict.fromkeys(batch))
+            start = time.perf_counter()
+            try:
+                start_index = self._next_index
+                self._next_index += len(batch)
+                if not self.processor.export_images(batch, self.export_dir, self.settings, sink=self._sink,
+                                                    start_index=start_index):
+                    self._failed = True
+            except Exception as e:
+                self._failed = True
+                print(f"处理监视文件夹中的图片失败: {e}")
+            elapsed = time.perf_counter() - start
+
+            if self.on_batch:
+                self.on_batch(batch, elapsed)
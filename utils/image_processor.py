@@ -1,10 +1,59 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from pathlib import Path
+from typing import Optional
 from PyQt6.QtGui import QImage
+import io
 import os
+import time
+from utils.watermark_renderer import get_shared_renderer
+from utils.metadata_index import MetadataIndex
+from utils.preflight import read_header, estimate_working_set
+from utils.export_scheduler import MemoryBudgetScheduler
+from utils.export_sinks import open_sink, MeasuringSink
+from utils.watermark_fields import FieldResolver
+from utils.export_transform import (read_orientation, plan_transform, decode_edge, apply_transform,
+                                    ORIENTATION_TRANSPOSE)
+
+# 预设的输出规格：max_edge为最长边像素，None表示原始尺寸
+RENDITION_PRESETS = {
+    'full': {'name': 'full', 'max_edge': None},
+    'web': {'name': 'web', 'max_edge': 2048},
+    'thumbnail': {'name': 'thumbnail', 'max_edge': 400}
+}
+
+# 输出格式对应的扩展名
+OUTPUT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp'
+}
+
+# 编码器调优档位：在编码速度和文件体积之间取舍
+ENCODER_PROFILES = {
+    'fast': {
+        'JPEG': {'optimize': False, 'progressive': False, 'subsampling': '4:2:0'},
+        'PNG': {'compress_level': 1},
+        'WEBP': {'method': 0}
+    },
+    'balanced': {
+        'JPEG': {'optimize': True, 'progressive': False, 'subsampling': '4:2:0'},
+        'PNG': {'compress_level': 6},
+        'WEBP': {'method': 4}
+    },
+    'smallest': {
+        'JPEG': {'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+        'PNG': {'compress_level': 9, 'optimize': True},
+        'WEBP': {'method': 6}
+    }
+}
+
+DEFAULT_ENCODER_PROFILE = 'balanced'
+
+# 当最大输出尺寸不超过原图的一半时，JPEG使用draft模式按比例解码
+DRAFT_MIN_RATIO = 2
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, metadata_index: MetadataIndex = None):
         # 支持的图片格式
         self.supported_formats = {
             'JPEG': ('.jpg', '.jpeg'),
@@ -12,6 +61,10 @@ class ImageProcessor:
             'BMP': ('.bmp'),
             'TIFF': ('.tiff', '.tif')
         }
+        # 与预览共用的水印渲染器（含字体、贴图和平铺图层缓存）
+        self.renderer = get_shared_renderer()
+        # 图片文件头信息索引，用于并行导出时估算内存
+        self.metadata_index = metadata_index if metadata_index is not None else MetadataIndex()
     
     def create_thumbnail(self, image_path: str, size: tuple = (100, 100)) -> QImage:
         """创建图片缩略图
@@ -27,6 +80,10 @@ class ImageProcessor:
             with Image.open(image_path) as img:
                 # 生成缩略图
                 img.thumbnail(size)
+                # 按EXIF方向转正，与导出结果一致
+                transpose = ORIENTATION_TRANSPOSE.get(read_orientation(img))
+                if transpose is not None:
+                    img = img.transpose(transpose)
                 # 转换为RGB模式（如果是RGBA，保留透明通道）
                 if img.mode == 'RGBA':
                     data = img.tobytes('raw', 'RGBA')
@@ -39,163 +96,507 @@ class ImageProcessor:
             print(f"创建缩略图失败: {e}")
             return None
     
-    def apply_watermark(self, image: Image.Image, watermark_settings: dict) -> Image.Image:
+    def apply_watermark(self, image: Image.Image, watermark_settings: dict, scale: float = 1.0,
+                        fields: dict = None) -> Image.Image:
         """应用水印到图片
         
+        与预览使用同一个渲染器：水印贴图和位置都按比例计算，预览时生成的缓存导出时可直接复用。
+        
         Args:
             image: PIL Image对象
             watermark_settings: 水印设置
+            scale: 图片与原图的比例，解码时已缩小的图片按该比例缩小水印
+            fields: 该图片的字段值（可选），替换水印文字中的 {filename}、{index} 等字段
             
         Returns:
             处理后的PIL Image对象
         """
-        # 创建一个透明图层用于绘制水印
-        watermark_layer = Image.new('RGBA', image.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(watermark_layer)
-        
-        # 获取水印位置
-        position = watermark_settings.get('position', '中心')
-        x, y = self._calculate_position(position, image.size)
-        
-        # 根据水印类型处理
-        if watermark_settings.get('type') == '文本水印':
-            # 处理文本水印
-            text = watermark_settings.get('text', '')
-            if text:
-                try:
-                    # 获取字体设置
-                    font_family = watermark_settings.get('font', {}).get('family', 'Arial')
-                    print(f"正在处理文本水印，字体: {font_family}")
-                    
-                    # 确保字体大小有效
-                    font_size = max(1, watermark_settings.get('font', {}).get('size', 40))
-                    print(f"字体大小: {font_size}")
-                    
-                    # Windows系统字体目录
-                    font_path = os.path.join(os.environ['WINDIR'], 'Fonts', f'{font_family}.ttf')
-                    if not os.path.exists(font_path):
-                        # 尝试 .TTF 扩展名
-                        font_path = os.path.join(os.environ['WINDIR'], 'Fonts', f'{font_family}.TTF')
-                    
-                    if os.path.exists(font_path):
-                        print(f"使用字体文件: {font_path}")
-                        font = ImageFont.truetype(font_path, font_size)
-                    else:
-                        # 如果找不到指定字体，使用微软雅黑
-                        print(f"找不到字体 {font_family}，使用微软雅黑替代")
-                        fallback_font = os.path.join(os.environ['WINDIR'], 'Fonts', 'msyh.ttc')
-                        font = ImageFont.truetype(fallback_font, font_size)
-                    
-                    # 获取颜色设置
-                    color = watermark_settings.get('color', (0, 0, 0))
-                    if isinstance(color, str):
-                        color = tuple(int(color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
-                    opacity = int(255 * watermark_settings.get('opacity', 100) / 100)
-                    print(f"颜色: {color}, 透明度: {opacity}")
-                    
-                    # 绘制文本
-                    print(f"绘制文本位置: ({x}, {y})")
-                    draw.text((x, y), text, font=font, fill=color + (opacity,))
-                    print("文本水印绘制完成")
-                    
-                except Exception as e:
-                    print(f"应用文本水印时出错: {e}")
-                    # 使用最基本的设置
-                    font = ImageFont.load_default()
-                    draw.text((x, y), text, font=font, fill=(0, 0, 0, 255))
-        else:
-            # 处理图片水印
-            image_path = watermark_settings.get('image_path')
-            if image_path and Path(image_path).exists():
-                with Image.open(image_path) as watermark_img:
-                    # 调整大小
-                    scale = watermark_settings.get('scale', 100) / 100
-                    new_size = tuple(int(dim * scale) for dim in watermark_img.size)
-                    watermark_img = watermark_img.resize(new_size, Image.Resampling.LANCZOS)
-                    
-                    # 调整位置（考虑图片大小的偏移）
-                    x -= watermark_img.width // 2
-                    y -= watermark_img.height // 2
-                    
-                    # 粘贴水印图片
-                    watermark_layer.paste(watermark_img, (x, y), watermark_img)
-        
-        # 应用旋转
-        rotation = watermark_settings.get('rotation', 0)
-        if rotation:
-            watermark_layer = watermark_layer.rotate(rotation, expand=True)
-        
-        # 合并水印层和原图
-        return Image.alpha_composite(image.convert('RGBA'), watermark_layer)
-    
-    def export_images(self, image_paths: list, export_dir: str, settings: dict):
+        return self.renderer.composite(image, watermark_settings, scale, fields)
+    
+    def export_images(self, image_paths: list, export_dir: str, settings: dict, templates: list = None,
+                      sink=None, start_index: int = 1) -> bool:
         """导出图片
         
+        每张原图只解码一次，然后分发给所有模板分别合成水印并编码输出。
+        
         Args:
             image_paths: 图片路径列表
             export_dir: 导出目录
             settings: 导出设置，包含：
-                - format: 输出格式 ('JPEG' 或 'PNG')
-                - quality: JPEG质量 (0-100)
+                - format: 输出格式 ('JPEG'、'PNG' 或 'WEBP')
+                - quality: JPEG/WebP质量 (0-100)
+                - encoder_profile: 编码器档位 ('fast'、'balanced' 或 'smallest')
                 - prefix: 文件名前缀
                 - suffix: 文件名后缀
                 - watermark: 水印设置
+                - renditions: 输出规格列表（可选），见_build_renditions
+                - max_workers: 并行导出的线程数（可选，默认1）
+                - memory_budget: 并行导出的内存预算字节数（可选，默认为物理内存的一半）
+                - archive: ZIP/TAR归档文件路径（可选），设置后所有输出直接写入归档
+                - resume: 是否继续导出目录中上次未完成的导出（可选，默认False）
+                - transform: 合成水印前的几何变换（可选），见_export_source
+            templates: 可选的模板导出列表，每项包含：
+                - name: 模板名称
+                - watermark: 模板中的水印设置
+                - subfolder: 输出子目录（可选，默认为模板名称）
+                - prefix / suffix: 文件名前缀/后缀（可选，默认使用settings中的值）
+            sink: 由open_export打开的输出目标（可选），用于分多批追加导出；
+                  传入时不再打开和准备输出目录，导出后也不关闭
+            start_index: 本批第一张图片在水印文字 {index} 字段中的序号，分多批导出时接着上一批编号
+                  
+        Returns:
+            bool: 是否所有图片都导出成功
         """
-        os.makedirs(export_dir, exist_ok=True)
-        
-        for image_path in image_paths:
-            try:
-                # 打开原图
-                with Image.open(image_path) as img:
-                    # 应用水印
-                    if settings.get('watermark'):
-                        img = self.apply_watermark(img, settings['watermark'])
-                    
-                    # 处理文件名
-                    original_name = Path(image_path).stem
-                    new_name = f"{settings['prefix']}{original_name}{settings['suffix']}"
-                    
-                    # 设置输出格式和扩展名
-                    output_format = settings['format']
-                    ext = '.jpg' if output_format == 'JPEG' else '.png'
-                    output_path = str(Path(export_dir) / f"{new_name}{ext}")
-                    
-                    # 如果输出格式是JPEG，转换为RGB模式
-                    if output_format == 'JPEG':
-                        img = img.convert('RGB')
-                    
-                    # 保存图片
-                    save_params = {}
-                    if output_format == 'JPEG':
-                        save_params['quality'] = settings['quality']
-                    
-                    img.save(output_path, output_format, **save_params)
-                    
-            except Exception as e:
-                print(f"导出图片失败 {image_path}: {e}")
-    
-    def _calculate_position(self, position: str, image_size: tuple) -> tuple:
-        """计算水印位置
-        
-        Args:
-            position: 位置名称
-            image_size: 图片尺寸
+        jobs = self._build_export_jobs(settings, templates, image_paths, start_index)
+        renditions = self._build_renditions(settings)
+        
+        draft_edge = self._draft_edge(renditions)
+        
+        owns_sink = sink is None
+        if owns_sink:
+            sink = open_sink(export_dir, settings.get('archive'), settings.get('resume', False))
+        failed = []
+        
+        transform = settings.get('transform') or {}
+        
+        def export_one(path):
+            if not self._export_source(path, jobs, renditions, sink, draft_edge, transform):
+                failed.append(path)
+        
+        try:
+            if owns_sink:
+                self._prepare_sink(sink, jobs, renditions)
+            
+            max_workers = settings.get('max_workers', 1)
+            if max_workers <= 1 or len(image_paths) <= 1:
+                for image_path in image_paths:
+                    export_one(image_path)
+            else:
+                # 并行导出：按文件头估算每张图片的内存占用，在预算内调度；
+                # 渲染器缓存的图层在导出期间常驻，从预算中扣除
+                renderer = get_shared_renderer()
+                tiled = any(renderer.is_tiled(job['watermark'] or {}) for job in jobs)
+                scheduler = MemoryBudgetScheduler(settings.get('memory_budget'), max_workers,
+                                                  renderer.max_overlay_bytes)
+                scheduled = [(self._estimate_export_memory(path, tiled), path) for path in image_paths]
+                scheduler.run(scheduled, export_one)
+            completed = not failed
+        except BaseException:
+            completed = False
+            raise
+        finally:
+            # 全部成功时删除进度日志，否则保留以便继续导出
+            if owns_sink:
+                sink.close(completed)
+        return completed
+    
+    def open_export(self, export_dir: str, settings: dict, templates: list = None):
+        """打开输出目标并准备所有输出子目录，供多次export_images(sink=...)追加导出
+        
+        进度日志只打开一次，输出目录也只扫描一次，之后每批只追加记录。
+        
+        Args:
+            export_dir: 导出目录
+            settings: 导出设置，与export_images相同
+            templates: 可选的模板导出列表，与export_images相同
             
         Returns:
-            (x, y) 坐标元组
+            输出目标，用完后调用其close(completed)
         """
-        width, height = image_size
-        padding = 50  # 边距
+        sink = open_sink(export_dir, settings.get('archive'), settings.get('resume', False))
+        try:
+            self._prepare_sink(sink, self._build_export_jobs(settings, templates),
+                               self._build_renditions(settings))
+        except BaseException:
+            sink.close(False)
+            raise
+        return sink
+    
+    def _prepare_sink(self, sink, jobs: list, renditions: list):
+        """创建每个任务和规格的输出子目录"""
+        for job in jobs:
+            for rendition in renditions:
+                sink.prepare(self._rendition_dir(job, rendition))
+    
+    def measure_export(self, image_path: str, settings: dict, templates: list = None) -> Optional[dict]:
+        """按导出设置完整处理一张图片但不写出文件，测量各阶段耗时和编码后的体积
         
-        positions = {
-            '左上角': (padding, padding),
-            '右上角': (width - padding, padding),
-            '左下角': (padding, height - padding),
-            '右下角': (width - padding, height - padding),
-            '中心': (width // 2, height // 2)
+        Args:
+            image_path: 原图路径
+            settings: 导出设置，与export_images相同
+            templates: 可选的模板导出列表，与export_images相同
+            
+        Returns:
+            dict: 包含timings（decode、transform、watermark、resize、encode和other各阶段秒数）、
+                  seconds（合计秒数）、bytes（所有输出的字节数）和outputs（输出文件数），失败时返回None
+        """
+        jobs = self._build_export_jobs(settings, templates, [image_path])
+        renditions = self._build_renditions(settings)
+        sink = MeasuringSink()
+        timings = {}
+        start = time.perf_counter()
+        if not self._export_source(image_path, jobs, renditions, sink, self._draft_edge(renditions),
+                                   settings.get('transform') or {}, timings):
+            return None
+        seconds = time.perf_counter() - start
+        timings['encode'] = sink.encode_seconds
+        # 颜色模式转换等未单独计时的部分
+        timings['other'] = max(0.0, seconds - sum(timings.values()))
+        return {
+            'timings': timings,
+            'seconds': seconds,
+            'bytes': sink.bytes_written,
+            'outputs': sink.count
         }
+    
+    def _draft_edge(self, renditions: list) -> Optional[int]:
+        """所有规格都有尺寸上限时，只需解码到最大规格所需的尺寸；否则返回None"""
+        max_edges = [r['max_edge'] for r in renditions]
+        return None if None in max_edges else max(max_edges)
+    
+    def _estimate_export_memory(self, image_path: str, tiled: bool = False) -> int:
+        """根据文件头估算导出一张图片的内存占用，平铺水印另加一张同尺寸的图层"""
+        record = self.metadata_index.get(image_path)
+        if record is None:
+            record = read_header(image_path)
+            if record['error'] is None:
+                self.metadata_index.put(record)
+        return estimate_working_set(record['width'], record['height'], record['mode'], tiled)
+    
+    def _export_source(self, image_path: str, jobs: list, renditions: list, sink,
+                       draft_edge: int = None, transform: dict = None, timings: dict = None) -> bool:
+        """解码一张原图并输出所有任务和规格
+        
+        合成水印前先做几何变换：按EXIF方向无损转正、裁剪并缩小到目标尺寸，
+        裁剪和缩放合并为一次重新采样，转置只作用于缩小后的结果。
+        
+        Args:
+            image_path: 原图路径
+            jobs: 导出任务列表
+            renditions: 输出规格列表
+            sink: 输出目标（目录或归档）
+            draft_edge: 最大规格的最长边，None表示不限制
+            transform: 几何变换设置（可选），包含：
+                - auto_orient: 是否按EXIF方向转正（默认True）
+                - crop: 裁剪区域 (left, top, right, bottom)，相对转正后图片尺寸的比例
+                - size: 输出尺寸上限 (width, height)
+            timings: 各阶段耗时的累加字典（可选），记录decode、transform、watermark和resize的秒数
+            
+        Returns:
+            bool: 是否导出成功
+        """
+        # 继续导出时，所有输出都已完成的图片不再解码
+        if all(sink.is_done(self._output_rel_path(job, rendition, image_path))
+               for job in jobs for rendition in renditions):
+            return True
         
-        return positions.get(position, (width // 2, height // 2))
+        try:
+            # 打开并解码原图（只解码一次）
+            transform = transform or {}
+            start = time.perf_counter()
+            with Image.open(image_path) as img:
+                raw_size = img.size
+                orientation = read_orientation(img) if transform.get('auto_orient', True) else 1
+                plan = plan_transform(raw_size, orientation, transform.get('crop'),
+                                      transform.get('size'), draft_edge)
+                
+                # 只解码到变换和各规格需要的尺寸
+                edge = decode_edge(raw_size, plan)
+                if edge:
+                    self._apply_draft(img, edge)
+                img.load()
+                start = self._record_stage(timings, 'decode', start)
+                source = apply_transform(img, plan, raw_size)
+                # 水印按输出尺寸与裁剪区域（原图像素）的比例缩放，输出与完整解码一致
+                crop_box = plan['crop_box']
+                scale = source.width / (crop_box[2] - crop_box[0])
+                # 所有模板共用同一份RGBA数据，避免每个模板重复转换
+                if any(job['watermark'] for job in jobs) and source.mode != 'RGBA':
+                    source = source.convert('RGBA')
+                self._record_stage(timings, 'transform', start)
+                
+                for job in jobs:
+                    # 水印文字中的字段按图片替换，EXIF从已打开的原图读取
+                    fields = job['fields'].fields(image_path, img) if job['fields'] else None
+                    self._export_for_job(source, image_path, job, renditions, sink, scale, timings, fields)
+            return True
+                
+        except Exception as e:
+            print(f"导出图片失败 {image_path}: {e}")
+            return False
+    
+    def _record_stage(self, timings: dict, stage: str, start: float) -> float:
+        """把从start到现在的耗时累加到timings[stage]，返回当前时间作为下一阶段的起点"""
+        now = time.perf_counter()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + now - start
+        return now
+    
+    def _build_renditions(self, settings: dict) -> list:
+        """生成输出规格列表，按尺寸从大到小排序
+        
+        Args:
+            settings: 导出设置，可包含renditions列表，每项包含：
+                - name: 规格名称，同时作为输出子目录
+                - max_edge: 最长边像素，None表示原始尺寸
+                - format / quality / profile: 输出格式、质量和编码档位（可选，默认使用settings中的值）
+                
+        Returns:
+            list: 规格列表，未指定renditions时只包含一个原始尺寸规格
+        """
+        renditions = settings.get('renditions')
+        if not renditions:
+            return [{
+                'name': '',
+                'max_edge': None,
+                'format': settings['format'],
+                'quality': settings['quality'],
+                'profile': settings.get('encoder_profile', DEFAULT_ENCODER_PROFILE)
+            }]
+        
+        result = [{
+            'name': r.get('name', ''),
+            'max_edge': r.get('max_edge'),
+            'format': r.get('format', settings['format']),
+            'quality': r.get('quality', settings['quality']),
+            'profile': r.get('profile', settings.get('encoder_profile', DEFAULT_ENCODER_PROFILE))
+        } for r in renditions]
+        # 原始尺寸排在最前，其余按最长边降序，便于逐级缩小
+        result.sort(key=lambda r: -(r['max_edge'] or float('inf')))
+        return result
+    
+    def _rendition_dir(self, job: dict, rendition: dict) -> str:
+        """获取某个任务在某个规格下相对于导出根目录的输出目录"""
+        return os.path.join(job['subdir'], rendition['name'])
+    
+    def _output_rel_path(self, job: dict, rendition: dict, image_path: str) -> str:
+        """获取输出文件相对于导出根目录的路径"""
+        name = f"{job['prefix']}{Path(image_path).stem}{job['suffix']}"
+        ext = OUTPUT_EXTENSIONS.get(rendition['format'], '.png')
+        return os.path.join(self._rendition_dir(job, rendition), f"{name}{ext}")
+    
+    def _apply_draft(self, img: Image.Image, max_edge: int):
+        """对JPEG启用draft模式，让解码器直接按1/2、1/4、1/8比例解码
+        
+        Args:
+            img: 尚未加载像素的PIL Image对象
+            max_edge: 需要的最长边像素
+        """
+        if img.format != 'JPEG':
+            return
+        width, height = img.size
+        if max(width, height) < max_edge * DRAFT_MIN_RATIO:
+            return
+        ratio = max_edge / max(width, height)
+        # draft保证解码结果不小于请求的尺寸
+        img.draft('RGB', (max(1, int(width * ratio + 0.5)), max(1, int(height * ratio + 0.5))))
+    
+    def _fit_size(self, size: tuple, max_edge: int) -> tuple:
+        """计算按最长边限制缩放后的尺寸，不放大
+        
+        Args:
+            size: 原始尺寸
+            max_edge: 最长边像素，None表示不限制
+            
+        Returns:
+            (width, height) 尺寸元组
+        """
+        width, height = size
+        if not max_edge or max(width, height) <= max_edge:
+            return size
+        ratio = max_edge / max(width, height)
+        return (max(1, round(width * ratio)), max(1, round(height * ratio)))
+    
+    def _build_export_jobs(self, settings: dict, templates: list = None, image_paths: list = (),
+                           start_index: int = 1) -> list:
+        """根据导出设置和模板列表生成导出任务
+        
+        Args:
+            settings: 导出设置
+            templates: 模板导出列表，为空时只生成一个使用当前水印的任务
+            image_paths: 本批图片路径，用于水印文字中的 {index} 字段
+            start_index: 第一张图片的序号
+            
+        Returns:
+            list: 导出任务列表，每项包含输出子目录、命名规则、水印设置，
+                  以及水印文字含字段时的字段解析器（fields，否则为None）
+        """
+        if not templates:
+            jobs = [{
+                'subdir': '',
+                'prefix': settings.get('prefix', ''),
+                'suffix': settings.get('suffix', ''),
+                'watermark': settings.get('watermark')
+            }]
+        else:
+            jobs = []
+            for template in templates:
+                jobs.append({
+                    'subdir': template.get('subfolder') or template.get('name', ''),
+                    'prefix': template.get('prefix', settings.get('prefix', '')),
+                    'suffix': template.get('suffix', settings.get('suffix', '')),
+                    'watermark': template.get('watermark')
+                })
+        
+        for job in jobs:
+            watermark = job['watermark'] or {}
+            resolver = None
+            if watermark.get('type') == '文本水印':
+                resolver = FieldResolver([watermark.get('text', '')], watermark.get('field_csv'), image_paths,
+                                         start_index)
+            job['fields'] = resolver or None
+        return jobs
+    
+    def _export_for_job(self, source: Image.Image, image_path: str, job: dict, renditions: list, sink,
+                        scale: float = 1.0, timings: dict = None, fields: dict = None):
+        """按单个导出任务合成水印，并输出所有规格
+        
+        Args:
+            source: 已解码的原图
+            image_path: 原图路径
+            job: 导出任务
+            renditions: 按尺寸降序排列的输出规格列表
+            sink: 输出目标（目录或归档）
+            scale: 已解码图片与原图的比例
+            timings: 各阶段耗时的累加字典（可选）
+            fields: 该图片的字段值（可选），用于水印文字中的字段
+        """
+        img = source
+        
+        # 应用水印
+        start = time.perf_counter()
+        if job['watermark']:
+            img = self.apply_watermark(img, job['watermark'], scale, fields)
+            self._record_stage(timings, 'watermark', start)
+        
+        # 逐级缩小：每个规格都从上一个（更大的）规格缩放得到
+        current = img
+        for rendition in renditions:
+            target_size = self._fit_size(current.size, rendition['max_edge'])
+            if target_size != current.size:
+                start = time.perf_counter()
+                current = current.resize(target_size, Image.Resampling.LANCZOS)
+                self._record_stage(timings, 'resize', start)
+            
+            rel_path = self._output_rel_path(job, rendition, image_path)
+            if sink.is_done(rel_path):
+                continue
+            self._save_image(current, sink, rel_path, rendition['format'],
+                             rendition['quality'], rendition['profile'], image_path)
+    
+    def _save_image(self, img: Image.Image, sink, rel_path: str, output_format: str,
+                    quality: int, profile: str = DEFAULT_ENCODER_PROFILE, source: str = ''):
+        """按指定格式编码并保存图片
+        
+        Args:
+            img: 要保存的图片
+            sink: 输出目标（目录或归档）
+            rel_path: 相对于导出根目录的输出路径
+            output_format: 输出格式 ('JPEG'、'PNG' 或 'WEBP')
+            quality: JPEG/WebP质量
+            profile: 编码器档位名称
+            source: 原图路径
+        """
+        img = self._prepare_for_format(img, output_format)
+        sink.save(rel_path, img, output_format, self._build_save_params(output_format, quality, profile), source)
+    
+    def watermark_bytes(self, data: bytes, watermark_settings: dict, output_format: str = 'JPEG',
+                        quality: int = 85, profile: str = DEFAULT_ENCODER_PROFILE,
+                        filename: str = '', index: int = 1) -> bytes:
+        """为内存中的图片数据添加水印并编码
+        
+        水印文字中的字段与导出时一样替换：EXIF字段从这张图片读取，CSV按filename匹配。
+        
+        Args:
+            data: 原图文件内容
+            watermark_settings: 水印设置
+            output_format: 输出格式
+            quality: JPEG/WebP质量
+            profile: 编码器档位名称
+            filename: 原图文件名，用于 {filename}、{stem} 字段和CSV匹配
+            index: {index} 字段的值
+            
+        Returns:
+            bytes: 编码后的图片数据
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            # 按EXIF方向转正后再合成水印
+            result = apply_transform(img, plan_transform(img.size, read_orientation(img)), img.size)
+            if watermark_settings:
+                fields = None
+                if watermark_settings.get('type') == '文本水印':
+                    resolver = FieldResolver([watermark_settings.get('text', '')],
+                                             watermark_settings.get('field_csv'), [filename], index)
+                    fields = resolver.fields(filename, img) if resolver else None
+                result = self.apply_watermark(result, watermark_settings, fields=fields)
+            result = self._prepare_for_format(result, output_format)
+            buffer = io.BytesIO()
+            result.save(buffer, output_format, **self._build_save_params(output_format, quality, profile))
+        return buffer.getvalue()
+    
+    def _prepare_for_format(self, img: Image.Image, output_format: str) -> Image.Image:
+        """转换为输出格式支持的颜色模式"""
+        # JPEG不支持透明通道，转换为RGB模式
+        if output_format == 'JPEG' and img.mode != 'RGB':
+            return img.convert('RGB')
+        if output_format == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+            return img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        return img
+    
+    def _build_save_params(self, output_format: str, quality: int, profile: str) -> dict:
+        """生成编码参数
+        
+        Args:
+            output_format: 输出格式
+            quality: JPEG/WebP质量
+            profile: 编码器档位名称
+            
+        Returns:
+            dict: 传给Image.save的参数
+        """
+        profile_params = ENCODER_PROFILES.get(profile, ENCODER_PROFILES[DEFAULT_ENCODER_PROFILE])
+        save_params = dict(profile_params.get(output_format, {}))
+        if output_format in ('JPEG', 'WEBP'):
+            save_params['quality'] = quality
+        return save_params
+    
+    def benchmark_encoders(self, image: Image.Image, formats: list = None, profiles: list = None,
+                           quality: int = 85, repeat: int = 3) -> list:
+        """测量各编码档位的编码耗时和输出体积
+        
+        Args:
+            image: 用于测试的图片
+            formats: 要测试的格式列表，默认测试全部格式
+            profiles: 要测试的档位列表，默认测试全部档位
+            quality: JPEG/WebP质量
+            repeat: 每个组合重复编码的次数，取最短耗时
+            
+        Returns:
+            list: 测试结果，每项包含format、profile、seconds和bytes
+        """
+        results = []
+        for output_format in formats or list(OUTPUT_EXTENSIONS):
+            prepared = self._prepare_for_format(image, output_format)
+            for profile in profiles or list(ENCODER_PROFILES):
+                save_params = self._build_save_params(output_format, quality, profile)
+                best_time = None
+                size = 0
+                for _ in range(max(1, repeat)):
+                    buffer = io.BytesIO()
+                    start = time.perf_counter()
+                    prepared.save(buffer, output_format, **save_params)
+                    elapsed = time.perf_counter() - start
+                    size = buffer.tell()
+                    if best_time is None or elapsed < best_time:
+                        best_time = elapsed
+                results.append({
+                    'format': output_format,
+                    'profile': profile,
+                    'seconds': best_time,
+                    'bytes': size
+                })
+        return results
     
     def is_supported_format(self, file_path: str) -> bool:
         """检查文件是否为支持的图片格式
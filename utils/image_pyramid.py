@@ -0,0 +1,224 @@
+from PIL import Image
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+import math
+import queue
+import threading
+from utils.export_transform import read_orientation, oriented_size, ORIENTATION_TRANSPOSE
+
+# 金字塔最小层的最长边像素
+MIN_LEVEL_EDGE = 256
+
+# 默认的金字塔内存上限
+DEFAULT_PYRAMID_MEMORY = 512 * 1024 * 1024
+
+class ImagePyramid:
+    """图片的多分辨率金字塔（mip-map），用于预览的缩放和平移
+
+    各层都按EXIF方向转正，与导出结果一致。
+    第k层的尺寸为原图的1/2^k。各层在后台线程中逐级生成：先按当前视图需要的层
+    缩小解码（JPEG使用draft），尽快显示；再完整解码一次生成更清晰的层，
+    每层都由上一层缩小一半得到。超出内存上限时按最近使用顺序淘汰层（最小层常驻），
+    被淘汰的层再次需要时从更大的可用层缩小或重新解码生成。
+    关闭后后台线程不再开始新的解码。
+    """
+
+    def __init__(self, image_path: str, on_level_ready: Callable[[], None] = None,
+                 memory_cap: int = DEFAULT_PYRAMID_MEMORY, view_size: Tuple[int, int] = None):
+        """初始化金字塔，只读取文件头，像素在后台解码
+
+        Args:
+            image_path: 图片路径
+            on_level_ready: 有新层生成时的回调（在后台线程中调用）
+            memory_cap: 所有层占用内存的上限字节数
+            view_size: 显示区域的尺寸 (width, height)，先生成适应该区域所需的层；为空时先完整解码
+        """
+        self.image_path = image_path
+        self.on_level_ready = on_level_ready
+        self.memory_cap = memory_cap
+
+        with Image.open(image_path) as img:
+            self.raw_size = img.size
+            self.orientation = read_orientation(img)
+            self.format = img.format
+        # 转正后的尺寸
+        self.size = oriented_size(self.raw_size, self.orientation)
+
+        longest = max(self.size)
+        self.max_level = max(0, int(math.ceil(math.log2(longest / MIN_LEVEL_EDGE)))) if longest > MIN_LEVEL_EDGE else 0
+
+        # 适应显示区域所需的层，最先生成
+        if view_size:
+            self.first_level = self.level_for_scale(min(view_size[0] / self.size[0],
+                                                        view_size[1] / self.size[1]))
+        else:
+            self.first_level = 0
+
+        self._levels = OrderedDict()  # 层号 -> PIL Image，按最近使用排序
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._requested = set()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name='ImagePyramid', daemon=True)
+        self._thread.start()
+        # 先生成整个金字塔（显示所需的层优先）
+        self._requests.put(None)
+
+    def close(self):
+        """停止后台线程并释放所有层"""
+        self._closed = True
+        self._requests.put(-1)
+        with self._lock:
+            self._levels.clear()
+
+    def level_for_scale(self, scale: float) -> int:
+        """获取显示比例对应的层号：不小于显示尺寸的最小层
+
+        Args:
+            scale: 显示像素与原图像素之比
+
+        Returns:
+            int: 层号
+        """
+        if scale >= 1:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1 / scale))))
+
+    def get(self, scale: float) -> Optional[Tuple[int, Image.Image]]:
+        """获取用于绘制的层
+
+        优先返回目标层；目标层尚未生成时返回最接近的可用层（优先更清晰的层），
+        并在后台生成目标层。
+
+        Args:
+            scale: 显示像素与原图像素之比
+
+        Returns:
+            (层号, PIL Image)，还没有任何可用层时返回None
+        """
+        target = self.level_for_scale(scale)
+        with self._lock:
+            if target in self._levels:
+                self._levels.move_to_end(target)
+                return target, self._levels[target]
+            available = list(self._levels)
+
+        self._request(target)
+        if not available:
+            return None
+
+        # 优先使用更清晰（层号更小）的层中最接近的一层
+        finer = [level for level in available if level < target]
+        level = max(finer) if finer else min(available)
+        with self._lock:
+            image = self._levels.get(level)
+        return (level, image) if image is not None else None
+
+    def _request(self, level: int):
+        """请求后台生成某一层"""
+        with self._lock:
+            if level in self._requested:
+                return
+            self._requested.add(level)
+        self._requests.put(level)
+
+    def _run(self):
+        """后台线程：处理层生成请求"""
+        while not self._closed:
+            level = self._requests.get()
+            if self._closed or level == -1:
+                return
+            try:
+                if level is None:
+                    self._build_all()
+                else:
+                    with self._lock:
+                        exists = level in self._levels
+                    if not exists:
+                        image = self._build_level(level)
+                        if image is not None:
+                            self._store(level, image)
+            except Exception as e:
+                print(f"生成预览金字塔失败 {self.image_path}: {e}")
+            finally:
+                if level is not None:
+                    with self._lock:
+                        self._requested.discard(level)
+
+    def _build_all(self):
+        """生成所有层：先缩小解码出显示所需的层及更小的层，再完整解码一次生成更清晰的层"""
+        first = self.first_level
+        self._build_chain(first, self.max_level)
+        if first > 0:
+            self._build_chain(0, first - 1)
+
+    def _build_chain(self, start: int, stop: int):
+        """解码第start层，再逐级缩小生成到第stop层"""
+        if self._closed:
+            return
+        current = self._decode(start)
+        self._store(start, current)
+        for level in range(start + 1, stop + 1):
+            if self._closed:
+                return
+            current = current.reduce(2)
+            self._store(level, current)
+
+    def _build_level(self, level: int) -> Image.Image:
+        """重新生成被淘汰的层：从更大的可用层缩小，没有时重新解码"""
+        with self._lock:
+            finer = [l for l in self._levels if l < level]
+            source_level = max(finer) if finer else None
+            source = self._levels.get(source_level) if source_level is not None else None
+
+        if source is None:
+            if self._closed:
+                return None
+            return self._decode(level)
+        return source.reduce(2 ** (level - source_level))
+
+    def _decode(self, level: int) -> Image.Image:
+        """解码原图到指定层的尺寸并转正，JPEG利用draft在解码时直接缩小"""
+        factor = 2 ** level
+        with Image.open(self.image_path) as img:
+            if level and img.format == 'JPEG':
+                img.draft('RGB', (max(1, self.raw_size[0] // factor), max(1, self.raw_size[1] // factor)))
+            img.load()
+            mode = 'RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB'
+            decoded = img.convert(mode) if img.mode != mode else img.copy()
+
+        # draft只能按1/2、1/4、1/8缩小，剩余的比例用reduce补齐
+        remaining = max(1, round(decoded.width * factor / self.raw_size[0]))
+        if remaining > 1:
+            decoded = decoded.reduce(remaining)
+
+        # 缩小后再转置，开销与层的大小成正比
+        transpose = ORIENTATION_TRANSPOSE.get(self.orientation)
+        if transpose is not None:
+            decoded = decoded.transpose(transpose)
+        return decoded
+
+    def _store(self, level: int, image: Image.Image):
+        """保存一层，超出内存上限时淘汰最久未使用的层"""
+        with self._lock:
+            if self._closed:
+                return
+            self._levels[level] = image
+            self._levels.move_to_end(level)
+
+            total = sum(self._image_bytes(img) for img in self._levels.values())
+            for candidate in list(self._levels):
+                if total <= self.memory_cap:
+                    break
+                # 刚生成的层和最小层不淘汰
+                if candidate in (level, self.max_level):
+                    continue
+                total -= self._image_bytes(self._levels.pop(candidate))
+
+        if self.on_level_ready:
+            self.on_level_ready()
+
+    def _image_bytes(self, image: Image.Image) -> int:
+        """估算一层占用的内存"""
+        return image.width * image.height * len(image.getbands())
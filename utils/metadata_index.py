@@ -0,0 +1,250 @@
+import operator
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# 每条记录保存的字段（除路径外），按顺序存为元组以节省内存
+RECORD_FIELDS = ('width', 'height', 'mode', 'format', 'orientation',
+                 'file_size', 'mtime_ns', 'captured', 'camera')
+
+# 取值种类少、需要按值筛选的字段，额外维护 值 -> 路径集合
+VALUE_INDEXED_FIELDS = ('format', 'camera')
+
+# 重复出现的字符串字段，驻留后多条记录共用同一个对象
+_INTERNED_FIELDS = ('mode', 'format', 'camera')
+
+_FIELD_POSITIONS = {field: i for i, field in enumerate(RECORD_FIELDS)}
+
+def _pixels(row: tuple) -> int:
+    return (row[_FIELD_POSITIONS['width']] or 0) * (row[_FIELD_POSITIONS['height']] or 0)
+
+def _date(row: tuple) -> int:
+    # 没有拍摄时间时使用文件修改时间
+    return row[_FIELD_POSITIONS['captured']] or (row[_FIELD_POSITIONS['mtime_ns']] or 0) // 1_000_000_000
+
+# 由多个字段计算的排序键：pixels（像素数）、date（拍摄时间，没有时为修改时间）
+DERIVED_SORT_KEYS = {'pixels': _pixels, 'date': _date}
+
+class MetadataIndex:
+    """图片元数据索引，按路径保存只读取文件头得到的信息，在一个会话内复用
+
+    每张图片只保存一个元组，字符串字段驻留共用；记录中带有文件修改时间，
+    get()时按(路径, 修改时间)校验。排序和筛选只使用已保存的记录，不访问文件。
+    captured为None表示记录来自不含拍摄信息的来源（如旧版会话），尚未读取EXIF。
+    """
+
+    def __init__(self):
+        self._records = {}  # 路径 -> 按RECORD_FIELDS排列的元组
+        self._values = {field: {} for field in VALUE_INDEXED_FIELDS}  # 字段 -> 值 -> 路径集合
+        self._orders = {}  # (字段, 是否降序) -> 排序后的路径，记录变化时清空
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """获取图片的元数据记录
+
+        Args:
+            path: 图片路径
+
+        Returns:
+            Dict: 元数据记录，不存在或文件已修改时返回None
+        """
+        with self._lock:
+            row = self._records.get(path)
+        if row is None:
+            return None
+
+        # 文件被修改过则视为失效
+        try:
+            if os.stat(path).st_mtime_ns != row[_FIELD_POSITIONS['mtime_ns']]:
+                return None
+        except OSError:
+            return None
+        return self._to_record(path, row)
+
+    def put(self, record: Dict[str, Any]):
+        """保存一条元数据记录
+
+        Args:
+            record: 元数据记录，必须包含path字段
+        """
+        path = record['path']
+        values = []
+        for field in RECORD_FIELDS:
+            value = record.get(field)
+            if field in _INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            values.append(value)
+        row = tuple(values)
+
+        with self._lock:
+            self._unindex(path)
+            self._records[path] = row
+            self._orders.clear()
+            for field in VALUE_INDEXED_FIELDS:
+                self._values[field].setdefault(row[_FIELD_POSITIONS[field]], set()).add(path)
+
+    def remove(self, path: str):
+        """移除图片的元数据记录"""
+        with self._lock:
+            self._unindex(path)
+            self._records.pop(path, None)
+            self._orders.clear()
+
+    def _unindex(self, path: str):
+        """从按值索引中移除路径（调用方持有锁）"""
+        row = self._records.get(path)
+        if row is None:
+            return
+        for field in VALUE_INDEXED_FIELDS:
+            value = row[_FIELD_POSITIONS[field]]
+            paths = self._values[field].get(value)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._values[field][value]
+
+    def records(self, paths: List[str] = None) -> List[Dict[str, Any]]:
+        """获取元数据记录列表
+
+        Args:
+            paths: 要获取的路径列表，为空时返回全部记录
+
+        Returns:
+            List: 元数据记录列表，跳过没有记录的路径
+        """
+        with self._lock:
+            if paths is None:
+                rows = list(self._records.items())
+            else:
+                rows = [(p, self._records[p]) for p in paths if p in self._records]
+        return [self._to_record(path, row) for path, row in rows]
+
+    def sort_paths(self, paths: List[str], field: str, reverse: bool = False) -> List[str]:
+        """按记录中的字段排序路径，不访问文件
+
+        每个字段的全局排序结果缓存到索引下一次变化为止，之后的排序只需按缓存的顺序挑出路径。
+
+        Args:
+            paths: 要排序的路径列表
+            field: RECORD_FIELDS中的字段（如captured）或DERIVED_SORT_KEYS中的排序键
+            reverse: 是否降序
+
+        Returns:
+            List: 排序后的路径；没有记录或该字段没有值的路径排在最后，保持原有顺序
+        """
+        order = self._sorted_order(field, reverse)
+        wanted = set(paths)
+        known = [p for p in order if p in wanted]
+        if len(known) == len(wanted):
+            return known
+        known_set = set(known)
+        return known + [p for p in paths if p not in known_set]
+
+    def _sorted_order(self, field: str, reverse: bool) -> List[str]:
+        """索引中该字段有值的全部路径按字段排序的结果（缓存）"""
+        with self._lock:
+            order = self._orders.get((field, reverse))
+            if order is not None:
+                return order
+            if field in DERIVED_SORT_KEYS:
+                key = DERIVED_SORT_KEYS[field]
+            else:
+                key = operator.itemgetter(_FIELD_POSITIONS[field])
+            paths = list(self._records)
+            keys = list(map(key, self._records.values()))
+            # 0、空字符串和None表示没有该信息（如没有拍摄时间）
+            known = [i for i, k in enumerate(keys) if k]
+            known.sort(key=keys.__getitem__, reverse=reverse)
+            order = list(map(paths.__getitem__, known))
+            self._orders[(field, reverse)] = order
+            return order
+
+    def lookup(self, paths: List[str], field: str) -> Dict[str, Any]:
+        """批量获取字段值，不校验修改时间、不访问文件
+
+        Args:
+            paths: 路径列表
+            field: RECORD_FIELDS中的字段
+
+        Returns:
+            Dict: 路径 -> 字段值，跳过没有记录的路径
+        """
+        position = _FIELD_POSITIONS[field]
+        records = self._records
+        with self._lock:
+            return {p: records[p][position] for p in paths if p in records}
+
+    def filter_paths(self, paths: List[str], **criteria) -> List[str]:
+        """按字段值筛选路径，保持原有顺序，不访问文件
+
+        Args:
+            paths: 要筛选的路径列表
+            **criteria: 字段=值，如 camera='Canon EOS R5'，多个条件同时满足
+
+        Returns:
+            List: 符合条件的路径
+        """
+        matched = None
+        with self._lock:
+            for field, value in criteria.items():
+                if field in self._values:
+                    candidates = self._values[field].get(value, set())
+                else:
+                    position = _FIELD_POSITIONS[field]
+                    candidates = {p for p, row in self._records.items() if row[position] == value}
+                matched = set(candidates) if matched is None else matched & candidates
+        if matched is None:
+            return list(paths)
+        return [p for p in paths if p in matched]
+
+    def find_paths(self, field: str, predicate: Callable[[Any], bool]) -> Set[str]:
+        """查找字段值满足条件的所有路径，只对每个不同的值判断一次
+
+        Args:
+            field: VALUE_INDEXED_FIELDS中的字段
+            predicate: 对字段值的判断函数，如 lambda v: 'canon' in v.lower()
+
+        Returns:
+            Set: 符合条件的路径集合
+        """
+        found = set()
+        with self._lock:
+            for value, paths in self._values[field].items():
+                if value is not None and predicate(value):
+                    found |= paths
+        return found
+
+    def values(self, field: str, paths: List[str] = None) -> Counter:
+        """统计字段的各个取值及图片数量，用于列出可筛选的相机、格式等
+
+        Args:
+            field: RECORD_FIELDS中的字段
+            paths: 只统计这些路径，为空时统计全部记录
+
+        Returns:
+            Counter: 值 -> 图片数量
+        """
+        with self._lock:
+            if paths is None and field in self._values:
+                return Counter({value: len(ps) for value, ps in self._values[field].items()})
+            position = _FIELD_POSITIONS[field]
+            if paths is None:
+                return Counter(row[position] for row in self._records.values())
+            return Counter(self._records[p][position] for p in paths if p in self._records)
+
+    def _to_record(self, path: str, row: tuple) -> Dict[str, Any]:
+        """把保存的元组还原为记录"""
+        record = dict(zip(RECORD_FIELDS, row))
+        record['path'] = path
+        record['error'] = None
+        return record
+
+    def __contains__(self, path: str) -> bool:
+        with self._lock:
+            return path in self._records
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
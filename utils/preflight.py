@@ -0,0 +1,178 @@
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+from utils.metadata_index import MetadataIndex
+from utils.watermark_fields import read_exif_fields
+import calendar
+import os
+import time
+
+# 每百万像素的估算导出耗时（秒，单线程，含解码、合成和编码）
+SECONDS_PER_MEGAPIXEL = 0.06
+
+# 不同颜色模式每像素的字节数
+MODE_BYTES = {
+    '1': 1, 'L': 1, 'P': 1, 'LA': 2, 'I;16': 2,
+    'RGB': 3, 'YCbCr': 3, 'LAB': 3, 'HSV': 3,
+    'RGBA': 4, 'CMYK': 4, 'I': 4, 'F': 4
+}
+
+# EXIF中方向信息的标签
+EXIF_ORIENTATION_TAG = 0x0112
+
+def capture_timestamp(exif_datetime: str) -> int:
+    """将 "YYYY-MM-DD HH:MM:SS"（或只有日期）形式的拍摄时间转换为可排序的秒数
+    
+    EXIF时间不带时区，按原样当作UTC换算，只用于排序和比较。
+    
+    Returns:
+        int: 秒数，没有拍摄时间或格式不正确时返回0
+    """
+    for pattern, length in (('%Y-%m-%d %H:%M:%S', 19), ('%Y-%m-%d', 10)):
+        try:
+            return calendar.timegm(time.strptime(exif_datetime[:length], pattern))
+        except (ValueError, OverflowError):
+            continue
+    return 0
+
+def read_header(path: str) -> Dict[str, Any]:
+    """只读取文件头获取图片信息，不解码像素
+    
+    Args:
+        path: 图片路径
+        
+    Returns:
+        Dict: 包含尺寸、颜色模式、格式、EXIF方向、文件大小、拍摄时间（captured，秒数，没有时为0）
+        和相机（camera）的记录，读取失败时error字段为错误信息
+    """
+    record = {
+        'path': path,
+        'width': 0,
+        'height': 0,
+        'mode': '',
+        'format': '',
+        'orientation': 1,
+        'file_size': 0,
+        'mtime_ns': 0,
+        'captured': 0,
+        'camera': '',
+        'error': None
+    }
+    
+    try:
+        stat = os.stat(path)
+        record['file_size'] = stat.st_size
+        record['mtime_ns'] = stat.st_mtime_ns
+        
+        # Image.open只解析文件头，像素在load时才会解码
+        with Image.open(path) as img:
+            record['width'], record['height'] = img.size
+            record['mode'] = img.mode
+            record['format'] = img.format or ''
+            # PNG的eXIf块尚未读到时getexif()会解码整张图片，文件头阶段只使用已解析到的EXIF
+            if img.format != 'PNG' or 'exif' in img.info:
+                try:
+                    record['orientation'] = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+                except Exception:
+                    record['orientation'] = 1
+            # 拍摄时间和相机来自EXIF或XMP，同样只读取文件头
+            exif_fields = read_exif_fields(img)
+            record['captured'] = capture_timestamp(exif_fields['exif_datetime'])
+            record['camera'] = exif_fields['camera']
+    except Exception as e:
+        record['error'] = str(e) or e.__class__.__name__
+        
+    return record
+
+def estimate_working_set(width: int, height: int, mode: str, tiled: bool = False) -> int:
+    """估算导出一张图片时的内存占用
+    
+    解码后的原图加上水印合成时的两份RGBA数据；平铺水印还需要一张与图片同尺寸的RGBA图层。
+    
+    Args:
+        width: 图片宽度
+        height: 图片高度
+        mode: 颜色模式
+        tiled: 水印是否为平铺模式
+        
+    Returns:
+        int: 估算的字节数
+    """
+    pixels = width * height
+    if tiled:
+        return pixels * (MODE_BYTES.get(mode, 4) + 4 + 4 + 4)
+    return pixels * (MODE_BYTES.get(mode, 4) + 4 + 4)
+
+class PreflightScanner:
+    """导出前的预检扫描器，并行读取所有图片的文件头并汇总批次信息"""
+    
+    def __init__(self, index: MetadataIndex = None, max_workers: int = None):
+        """初始化扫描器
+        
+        Args:
+            index: 会话内的元数据索引，已有的有效记录不会重复读取
+            max_workers: 并行读取的线程数，默认根据CPU数量决定
+        """
+        self.index = index if index is not None else MetadataIndex()
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        
+    def scan(self, paths: List[str], complete: bool = False) -> List[Dict[str, Any]]:
+        """扫描图片文件头，结果写入元数据索引
+        
+        Args:
+            paths: 图片路径列表
+            complete: 为True时缺少拍摄时间和相机信息的记录（如旧版会话恢复的记录）也重新读取
+            
+        Returns:
+            List: 与paths顺序一致的元数据记录列表
+        """
+        records = {}
+        missing = []
+        for path in paths:
+            record = self.index.get(path)
+            if record is None or (complete and record['captured'] is None):
+                missing.append(path)
+            else:
+                records[path] = record
+                
+        if missing:
+            # 文件头读取以IO为主，使用线程池并行
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for record in executor.map(read_header, missing):
+                    records[record['path']] = record
+                    if record['error'] is None:
+                        self.index.put(record)
+                        
+        return [records[path] for path in paths]
+        
+    def summarize(self, records: List[Dict[str, Any]], workers: int = 1, tiled: bool = False,
+                  reserved_bytes: int = 0) -> Dict[str, Any]:
+        """汇总批次信息
+        
+        Args:
+            records: 元数据记录列表
+            workers: 导出时的并行数量
+            tiled: 水印是否为平铺模式（每张图片多一张同尺寸的图层）
+            reserved_bytes: 导出期间常驻的内存（如渲染器的图层缓存），计入峰值内存
+            
+        Returns:
+            Dict: 包含图片数量、总像素、预估耗时、预估峰值内存和问题文件列表
+        """
+        valid = [r for r in records if r['error'] is None]
+        total_pixels = sum(r['width'] * r['height'] for r in valid)
+        working_sets = sorted(
+            (estimate_working_set(r['width'], r['height'], r['mode'], tiled) for r in valid),
+            reverse=True
+        )
+        workers = max(1, workers)
+        
+        return {
+            'count': len(records),
+            'valid_count': len(valid),
+            'total_megapixels': total_pixels / 1_000_000,
+            'total_file_size': sum(r['file_size'] for r in valid),
+            'estimated_seconds': total_pixels / 1_000_000 * SECONDS_PER_MEGAPIXEL / workers,
+            # 最坏情况：最大的几张图片同时处理
+            'peak_memory_bytes': sum(working_sets[:workers]) + reserved_bytes,
+            'errors': [(r['path'], r['error']) for r in records if r['error'] is not None]
+        }
@@ -0,0 +1,174 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from utils.file_mode import replacement_mode
+
+# 会话文件扩展名
+SESSION_EXTENSION = '.pwsession'
+
+# 会话文件格式版本，表结构变化时递增
+SESSION_VERSION = 3
+
+# 可以读取的旧版本：版本1没有拍摄时间和相机两列，版本2没有读取错误一列
+SUPPORTED_VERSIONS = (1, 2, 3)
+
+# 保存到会话中的文件头字段及缺失时的默认值（与preflight.read_header的记录一致）
+HEADER_DEFAULTS = {
+    'width': 0, 'height': 0, 'mode': '', 'format': '',
+    'orientation': 1, 'file_size': 0, 'mtime_ns': 0
+}
+HEADER_FIELDS = tuple(HEADER_DEFAULTS)
+
+# 从EXIF/XMP读取的字段，NULL表示尚未读取（打开会话后在后台补齐）
+EXIF_FIELDS = ('captured', 'camera')
+
+_SCHEMA = '''
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE images (
+    position INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    format TEXT NOT NULL,
+    orientation INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    captured INTEGER,
+    camera TEXT,
+    thumbnail TEXT,
+    error TEXT
+);
+'''
+
+class SessionStore:
+    """会话文件读写
+
+    会话文件是一个SQLite数据库，按列表顺序保存图片路径、文件头信息（尺寸、格式、方向、
+    文件大小、修改时间、拍摄时间和相机）、列表缩略图在缩略图磁盘缓存中的位置，
+    以及文件头读取失败时的错误信息。
+    打开会话时只读这一个文件即可恢复列表，不需要访问原图。
+    """
+
+    def __init__(self, path: str):
+        """初始化会话文件
+
+        Args:
+            path: 会话文件路径
+        """
+        self.path = path
+
+    def save(self, records: List[Dict[str, Any]], watermark: Dict[str, Any] = None,
+             thumbnail_edge: int = None) -> bool:
+        """保存会话（原子写入）
+
+        Args:
+            records: 按列表顺序的图片记录，包含path、文件头字段、error（读取失败时的错误信息）
+                     和可选的thumbnail（缩略图缓存文件路径）
+            watermark: 水印设置，为None时不保存
+            thumbnail_edge: 缩略图最长边像素
+
+        Returns:
+            bool: 保存是否成功
+        """
+        rows = []
+        for position, record in enumerate(records):
+            rows.append((
+                position,
+                record['path'],
+                *(record.get(field) or default for field, default in HEADER_DEFAULTS.items()),
+                *(record.get(field) for field in EXIF_FIELDS),
+                record.get('thumbnail'),
+                record.get('error')
+            ))
+        meta = {
+            'version': str(SESSION_VERSION),
+            'saved_at': str(time.time()),
+            'thumbnail_edge': str(thumbnail_edge or 0)
+        }
+        if watermark is not None:
+            meta['watermark'] = json.dumps(watermark, ensure_ascii=False)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+            os.close(fd)
+            try:
+                conn = sqlite3.connect(tmp_path)
+                try:
+                    conn.executescript(_SCHEMA)
+                    with conn:
+                        conn.executemany('INSERT INTO meta VALUES (?, ?)', meta.items())
+                        conn.executemany(f'INSERT INTO images VALUES ({", ".join("?" * 13)})', rows)
+                finally:
+                    conn.close()
+                # mkstemp创建的文件为0600，覆盖前改为原会话文件的权限
+                os.chmod(tmp_path, replacement_mode(self.path))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                # 清理残留的临时文件
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            return True
+        except Exception as e:
+            print(f"保存会话失败: {e}")
+            return False
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """读取会话
+
+        Returns:
+            Dict: 包含images（按列表顺序的图片记录）、watermark（水印设置，可能为None）
+                  和thumbnail_edge，文件不存在、损坏或版本不支持时返回None。
+                  保存时文件头读取失败的记录error不为空（旧版会话中这类记录的修改时间为0）
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            uri = Path(os.path.abspath(self.path)).as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True)
+            try:
+                meta = dict(conn.execute('SELECT key, value FROM meta'))
+                version = int(meta.get('version', 0))
+                if version not in SUPPORTED_VERSIONS:
+                    print(f"不支持的会话文件版本: {meta.get('version')}")
+                    return None
+                fields = HEADER_FIELDS + (EXIF_FIELDS if version >= 2 else ()) + ('thumbnail',)
+                if version >= 3:
+                    fields += ('error',)
+                rows = conn.execute(
+                    f'SELECT path, {", ".join(fields)} FROM images ORDER BY position'
+                ).fetchall()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"读取会话失败: {e}")
+            return None
+
+        images = []
+        for row in rows:
+            record = dict.fromkeys(EXIF_FIELDS + ('error',))
+            record.update(zip(fields, row[1:]))
+            record['path'] = row[0]
+            if not record['mtime_ns'] and record['error'] is None:
+                # 旧版会话把读取失败的记录保存为默认值
+                record['error'] = '保存会话时未能读取文件头'
+            images.append(record)
+
+        watermark = meta.get('watermark')
+        return {
+            'images': images,
+            'watermark': json.loads(watermark) if watermark else None,
+            'thumbnail_edge': int(meta.get('thumbnail_edge', 0))
+        }
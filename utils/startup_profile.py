@@ -0,0 +1,131 @@
+import sys
+import threading
+import time
+
+class _TimedLoader:
+    """包装模块加载器，记录执行模块代码的耗时"""
+
+    def __init__(self, loader, profiler: 'StartupProfiler'):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._begin()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._end(module.__name__, start)
+
+    def __getattr__(self, name):
+        # 其他属性（如资源读取）交给原加载器
+        return getattr(self._loader, name)
+
+class _ImportTimingFinder:
+    """放在sys.meta_path最前面，为找到的模块包装计时加载器"""
+
+    def __init__(self, profiler: 'StartupProfiler'):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, self._profiler)
+            return spec
+        return None
+
+class StartupProfiler:
+    """启动耗时统计
+
+    安装后记录每个模块的导入耗时（自身耗时不含其导入的子模块，类似 python -X importtime），
+    并记录启动各阶段的时间点，如创建窗口和首次绘制。
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = []  # (模块名, 自身秒数, 累计秒数)
+        self.marks = []  # (阶段名, 距启动的秒数)
+        self._finder = None
+        self._local = threading.local()
+
+    def install(self):
+        """开始记录模块导入耗时"""
+        if self._finder is None:
+            self._finder = _ImportTimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        """停止记录模块导入耗时"""
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def mark(self, name: str):
+        """记录一个启动阶段完成的时间点"""
+        self.marks.append((name, time.perf_counter() - self.start))
+
+    def _begin(self):
+        """开始执行一个模块，子模块的耗时累加到栈顶"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+
+    def _end(self, name: str, start: float):
+        """模块执行完成，记录自身耗时和累计耗时"""
+        elapsed = time.perf_counter() - start
+        stack = self._local.stack
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.imports.append((name, elapsed - children, elapsed))
+
+    def report(self, top: int = 20) -> str:
+        """生成启动耗时报告
+
+        Args:
+            top: 列出自身耗时最多的模块数量
+
+        Returns:
+            str: 报告文本
+        """
+        lines = ['启动耗时:']
+        for name, seconds in self.marks:
+            lines.append(f'  {seconds * 1000:9.1f} ms  {name}')
+
+        if self.imports:
+            total = sum(self_time for _, self_time, _ in self.imports)
+            lines.append(f'模块导入: 共 {len(self.imports)} 个，合计 {total * 1000:.1f} ms，自身耗时最多的模块:')
+            lines.append(f'  {"自身":>9}  {"累计":>9}  模块')
+            for name, self_time, cumulative in sorted(self.imports, key=lambda item: item[1], reverse=True)[:top]:
+                lines.append(f'  {self_time * 1000:7.1f} ms  {cumulative * 1000:7.1f} ms  {name}')
+        return '\n'.join(lines)
+
+def watch_first_paint(widget, callback):
+    """窗口第一次绘制时调用回调
+
+    Args:
+        widget: 要监视的窗口
+        callback: 首次绘制时调用的函数，无参数
+    """
+    from PyQt6.QtCore import QObject, QEvent, QTimer
+
+    class FirstPaintFilter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint:
+                widget.removeEventFilter(self)
+                # 等本轮绘制（包括子控件）完成后再回调
+                QTimer.singleShot(0, callback)
+            return False
+
+    paint_filter = FirstPaintFilter(widget)
+    widget.installEventFilter(paint_filter)
+    return paint_filter
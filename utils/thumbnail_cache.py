@@ -0,0 +1,308 @@
+from PIL import Image, PngImagePlugin
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import os
+import queue
+import threading
+import time
+from utils.export_transform import read_orientation, oriented_size, ORIENTATION_TRANSPOSE
+
+# 缩略图默认最长边像素
+DEFAULT_THUMBNAIL_EDGE = 256
+
+# 内存中缓存的缩略图数量上限
+DEFAULT_MEMORY_ITEMS = 2000
+
+# 磁盘缓存格式版本，缩略图生成方式变化时递增使旧缓存失效
+CACHE_VERSION = 2
+
+# 磁盘缓存的总字节数上限
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+# 超出上限时清理到上限的这一比例，避免每次写入都触发清理
+DISK_TRIM_RATIO = 0.8
+
+class ThumbnailCache:
+    """低分辨率解码缓存
+
+    缩略图按(路径, 修改时间, 最长边)缓存在内存中，并保存到磁盘缓存目录，
+    再次需要时不必重新解码原图。JPEG使用draft模式在解码时直接缩小。
+    磁盘写入由一个后台线程依次完成，不阻塞调用方；磁盘缓存按总字节数限制大小，
+    超出时按修改时间（读取时会更新）淘汰最久未使用的文件。
+    """
+
+    def __init__(self, cache_dir: str = None, max_items: int = DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes: int = DEFAULT_DISK_BYTES):
+        """初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录，默认为 ~/.photo_watermark/thumbnails
+            max_items: 内存中缓存的缩略图数量上限
+            max_disk_bytes: 磁盘缓存的总字节数上限
+        """
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".photo_watermark", "thumbnails")
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = None  # 磁盘缓存的总字节数，第一次写入时统计
+        self._write_queue = queue.Queue()
+        self._writer = None  # 第一次写入时启动
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, image_path: str, max_edge: int = DEFAULT_THUMBNAIL_EDGE) -> Optional[Tuple[Image.Image, tuple]]:
+        """获取缩略图
+
+        Args:
+            image_path: 原图路径
+            max_edge: 缩略图最长边像素
+
+        Returns:
+            (缩略图, 原图尺寸)，读取失败时返回None
+        """
+        try:
+            mtime_ns = os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+
+        key = (image_path, mtime_ns, max_edge)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item
+
+        item = self._load_from_disk(key)
+        if item is None:
+            item = self._decode(image_path, max_edge)
+            if item is None:
+                return None
+            self._schedule_save(key, item)
+
+        self._remember(key, item)
+        return item
+
+    def peek(self, image_path: str, mtime_ns: int, max_edge: int = DEFAULT_THUMBNAIL_EDGE,
+             disk_path: str = None) -> Optional[Tuple[Image.Image, tuple]]:
+        """只从缓存读取缩略图，不访问原图（也不读取原图的修改时间）
+
+        Args:
+            image_path: 原图路径
+            mtime_ns: 已知的原图修改时间
+            max_edge: 缩略图最长边像素
+            disk_path: 已知的磁盘缓存文件路径，默认按键计算
+
+        Returns:
+            (缩略图, 原图尺寸)，缓存中没有时返回None
+        """
+        key = (image_path, mtime_ns, max_edge)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item
+
+        item = self._load_from_disk(key, disk_path)
+        if item is None:
+            return None
+        self._remember(key, item)
+        return item
+
+    def _remember(self, key: tuple, item: Tuple[Image.Image, tuple]):
+        """放入内存缓存，超出上限时淘汰最久未使用的缩略图"""
+        with self._lock:
+            self._items[key] = item
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def disk_path(self, key: tuple) -> str:
+        """获取缩略图在磁盘缓存中的路径"""
+        image_path, mtime_ns, max_edge = key
+        digest = hashlib.sha1(f'{CACHE_VERSION}|{image_path}|{mtime_ns}|{max_edge}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f'{digest}.png')
+
+    def _decode(self, image_path: str, max_edge: int) -> Optional[Tuple[Image.Image, tuple]]:
+        """解码原图并缩小，按EXIF方向转正，原图尺寸也使用转正后的尺寸"""
+        try:
+            with Image.open(image_path) as img:
+                orientation = read_orientation(img)
+                original_size = oriented_size(img.size, orientation)
+                # JPEG在解码时直接按比例缩小
+                img.draft('RGB', (max_edge, max_edge))
+                img.thumbnail((max_edge, max_edge))
+                mode = 'RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB'
+                thumbnail = img.convert(mode)
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            if transpose is not None:
+                thumbnail = thumbnail.transpose(transpose)
+            return thumbnail, original_size
+        except Exception as e:
+            print(f"生成缩略图失败 {image_path}: {e}")
+            return None
+
+    def _load_from_disk(self, key: tuple, path: str = None) -> Optional[Tuple[Image.Image, tuple]]:
+        """从磁盘缓存读取缩略图，原图尺寸保存在PNG文本块中"""
+        path = path or self.disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with Image.open(path) as img:
+                img.load()
+                width = int(img.info['original_width'])
+                height = int(img.info['original_height'])
+                item = img.copy(), (width, height)
+        except Exception:
+            return None
+        try:
+            # 更新修改时间，淘汰时按最久未使用的顺序
+            os.utime(path)
+        except OSError:
+            pass
+        return item
+
+    def _schedule_save(self, key: tuple, item: Tuple[Image.Image, tuple]):
+        """把缩略图交给后台线程写入磁盘缓存"""
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='thumbnail-cache-writer',
+                                                daemon=True)
+                self._writer.start()
+        self._write_queue.put((key, item))
+
+    def _write_loop(self):
+        """后台写入线程：依次保存缩略图并检查磁盘缓存大小"""
+        while True:
+            key, item = self._write_queue.get()
+            try:
+                if not os.path.exists(self.disk_path(key)):
+                    self._account(self._save_to_disk(key, item))
+            except Exception as e:
+                print(f"保存缩略图缓存失败: {e}")
+            finally:
+                self._write_queue.task_done()
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待所有排队的磁盘写入完成（如保存会话前，保证记录的缓存文件已存在）
+        
+        Args:
+            timeout: 最多等待的秒数，为None时一直等到写完
+            
+        Returns:
+            bool: 是否已全部写完
+        """
+        if self._writer is None:
+            return True
+        if timeout is None:
+            self._write_queue.join()
+            return True
+        deadline = time.monotonic() + timeout
+        with self._write_queue.all_tasks_done:
+            while self._write_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._write_queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _account(self, size: int):
+        """记录新写入的字节数，超出上限时淘汰最久未使用的文件"""
+        if not size:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                # 第一次写入时统计已有的缓存（已包含刚写入的文件）
+                self._disk_bytes = sum(entry[1] for entry in self._disk_entries())
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            entries = sorted(self._disk_entries())
+            total = sum(entry[1] for entry in entries)
+            target = int(self.max_disk_bytes * DISK_TRIM_RATIO)
+            for _, entry_size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= entry_size
+                except OSError:
+                    continue
+            self._disk_bytes = total
+
+    def _disk_entries(self) -> list:
+        """列出磁盘缓存文件：[(修改时间, 字节数, 路径)]"""
+        entries = []
+        try:
+            subdirs = list(os.scandir(self.cache_dir))
+        except OSError:
+            return entries
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            try:
+                for entry in os.scandir(subdir.path):
+                    if entry.name.endswith('.png'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def disk_usage(self) -> int:
+        """磁盘缓存当前占用的字节数"""
+        return sum(entry[1] for entry in self._disk_entries())
+
+    def clear(self) -> int:
+        """清空内存和磁盘缓存
+
+        Returns:
+            int: 释放的磁盘字节数
+        """
+        self.flush()
+        with self._lock:
+            self._items.clear()
+        freed = 0
+        with self._disk_lock:
+            for _, size, path in self._disk_entries():
+                try:
+                    os.remove(path)
+                    freed += size
+                except OSError:
+                    continue
+            self._disk_bytes = 0
+        return freed
+
+    def _save_to_disk(self, key: tuple, item: Tuple[Image.Image, tuple]) -> int:
+        """保存缩略图到磁盘缓存
+
+        Returns:
+            int: 写入的字节数，失败时返回0
+        """
+        thumbnail, (width, height) = item
+        path = self.disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            info = PngImagePlugin.PngInfo()
+            info.add_text('original_width', str(width))
+            info.add_text('original_height', str(height))
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            thumbnail.save(tmp_path, 'PNG', pnginfo=info, compress_level=1)
+            os.replace(tmp_path, path)
+            return os.path.getsize(path)
+        except Exception as e:
+            print(f"保存缩略图缓存失败: {e}")
+            return 0
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_shared_thumbnail_cache() -> ThumbnailCache:
+    """获取全局共用的缩略图缓存"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ThumbnailCache()
+        return _shared_cache
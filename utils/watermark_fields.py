@@ -0,0 +1,247 @@
+from PIL import Image
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+import csv
+import os
+import re
+import string
+
+# 水印文字中的字段，如 {filename}、{index:04d}
+FIELD_PATTERN = re.compile(r'\{(\w+)(?:![rsa])?(?::[^{}]*)?\}')
+
+# 需要读取EXIF的字段
+EXIF_FIELDS = {'exif_date', 'exif_time', 'exif_datetime', 'camera', 'make', 'model', 'gps', 'gps_lat', 'gps_lon'}
+
+# CSV中用于匹配图片的列名，都不存在时使用第一列
+CSV_KEY_COLUMNS = ('filename', '文件名', 'file', 'path')
+
+# EXIF标签
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+EXIF_DATETIME = 0x0132
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+GPS_IFD = 0x8825
+
+# TIFF中保存XMP的标签
+XMP_TIFF_TAG = 700
+
+# XMP中表示拍摄时间的属性，按优先顺序
+XMP_DATE_NAMES = ('exif:DateTimeOriginal', 'xmp:CreateDate', 'photoshop:DateCreated')
+
+def field_names(text: str) -> Set[str]:
+    """获取文字中引用的字段名"""
+    return set(FIELD_PATTERN.findall(text or ''))
+
+def has_fields(text: str) -> bool:
+    """文字中是否包含字段"""
+    return bool(FIELD_PATTERN.search(text or ''))
+
+class _FieldFormatter(string.Formatter):
+    """替换字段的格式化器：缺少的字段替换为空，不允许访问属性或下标"""
+
+    def get_field(self, field_name, args, kwargs):
+        return kwargs.get(field_name, ''), field_name
+
+    def format_field(self, value, format_spec):
+        try:
+            return super().format_field(value, format_spec)
+        except (ValueError, TypeError):
+            # 格式与值的类型不符（如CSV中的文字配上 :04d）时按原样输出
+            return str(value)
+
+_formatter = _FieldFormatter()
+
+def resolve_text(template: str, fields: Dict[str, Any]) -> str:
+    """用字段值替换文字中的字段，格式有误时返回原文字
+
+    Args:
+        template: 含字段的文字，如 "© {photographer} {exif_date} #{index}"
+        fields: 字段值
+
+    Returns:
+        str: 替换后的文字
+    """
+    try:
+        return _formatter.vformat(template, (), fields)
+    except (ValueError, IndexError, KeyError):
+        return template
+
+def read_exif_fields(img: Image.Image) -> Dict[str, Any]:
+    """读取拍摄时间、相机和GPS字段，EXIF中没有拍摄时间或相机时使用XMP，缺少的信息为空字符串
+
+    Args:
+        img: 已打开的图片（不需要加载像素）
+
+    Returns:
+        Dict: exif_date、exif_time、exif_datetime、camera、make、model、gps、gps_lat和gps_lon
+    """
+    fields = {name: '' for name in EXIF_FIELDS}
+    taken = make = model = ''
+    gps_ifd = {}
+    # PNG的eXIf块尚未读到时getexif()会解码整张图片
+    if img.format != 'PNG' or 'exif' in img.info:
+        try:
+            exif = img.getexif()
+            exif_ifd = exif.get_ifd(EXIF_IFD)
+            gps_ifd = exif.get_ifd(GPS_IFD)
+            taken = _clean(exif_ifd.get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME))
+            make = _clean(exif.get(EXIF_MAKE))
+            model = _clean(exif.get(EXIF_MODEL))
+        except Exception:
+            pass
+
+    if not (taken and (make or model)):
+        xmp = read_xmp(img)
+        if xmp:
+            # XMP时间为ISO格式 "YYYY-MM-DDTHH:MM:SS+08:00"，统一为EXIF格式
+            taken = taken or _xmp_value(xmp, XMP_DATE_NAMES)[:19].replace('-', ':').replace('T', ' ')
+            make = make or _xmp_value(xmp, ('tiff:Make',))
+            model = model or _xmp_value(xmp, ('tiff:Model',))
+
+    if taken:
+        # EXIF时间格式为 "YYYY:MM:DD HH:MM:SS"
+        date, _, time_part = taken.partition(' ')
+        fields['exif_date'] = date.replace(':', '-')
+        fields['exif_time'] = time_part
+        fields['exif_datetime'] = f"{fields['exif_date']} {time_part}".strip()
+
+    fields['make'] = make
+    fields['model'] = model
+    # 型号中通常已包含厂商名
+    fields['camera'] = model if make and model.lower().startswith(make.lower()) else f'{make} {model}'.strip()
+
+    lat = _gps_degrees(gps_ifd.get(2), gps_ifd.get(1))
+    lon = _gps_degrees(gps_ifd.get(4), gps_ifd.get(3))
+    if lat is not None and lon is not None:
+        fields['gps_lat'] = f'{lat:.6f}'
+        fields['gps_lon'] = f'{lon:.6f}'
+        fields['gps'] = f'{lat:.6f}, {lon:.6f}'
+    return fields
+
+def read_xmp(img: Image.Image) -> str:
+    """获取文件头中的XMP文本（JPEG的APP1段、PNG的iTXt块或TIFF标签），没有时返回空字符串"""
+    xmp = img.info.get('xmp') or img.info.get('XML:com.adobe.xmp')
+    if not xmp and hasattr(img, 'tag_v2'):
+        xmp = img.tag_v2.get(XMP_TIFF_TAG)
+    if isinstance(xmp, bytes):
+        xmp = xmp.decode('utf-8', 'ignore')
+    return xmp if isinstance(xmp, str) else ''
+
+def _xmp_value(xmp: str, names: Iterable[str]) -> str:
+    """按顺序查找XMP属性（name="..."）或元素（<name>...</name>）的值，不使用XML解析器"""
+    for name in names:
+        match = re.search(rf'{re.escape(name)}\s*=\s*"([^"]*)"|<{re.escape(name)}>([^<]*)</', xmp)
+        if match:
+            value = (match.group(1) or match.group(2) or '').strip()
+            if value:
+                return value
+    return ''
+
+def _clean(value) -> str:
+    """去掉EXIF字符串末尾的空字符和空格"""
+    return str(value or '').strip('\x00 ')
+
+def _gps_degrees(value, ref) -> Optional[float]:
+    """将EXIF中的(度, 分, 秒)转换为带符号的十进制度数"""
+    try:
+        degrees, minutes, seconds = (float(v) for v in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = degrees + minutes / 60 + seconds / 3600
+    if str(ref).strip('\x00 ').upper() in ('S', 'W'):
+        result = -result
+    return result
+
+def load_csv_fields(csv_path: str) -> Dict[str, Dict[str, str]]:
+    """读取自定义字段的CSV文件
+
+    第一行为列名，每行对应一张图片；按filename（或文件名、file、path）列匹配图片，
+    这些列都不存在时使用第一列。可以填写文件名、不带扩展名的文件名或完整路径。
+
+    Args:
+        csv_path: CSV文件路径
+
+    Returns:
+        Dict: 匹配键（小写）-> 该行的字段值，读取失败时返回空字典
+    """
+    rows = {}
+    try:
+        with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            columns = reader.fieldnames or []
+            if not columns:
+                return rows
+            key_column = next((c for c in CSV_KEY_COLUMNS if c in columns), columns[0])
+            for row in reader:
+                key = (row.get(key_column) or '').strip()
+                if key:
+                    rows[os.path.normcase(key).casefold()] = {k: v for k, v in row.items() if k}
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        print(f"读取字段CSV失败 {csv_path}: {e}")
+    return rows
+
+class FieldResolver:
+    """按图片生成水印文字中各字段的值
+
+    内置字段：filename（文件名）、stem（不含扩展名的文件名）、index（在本批中的序号，从1开始），
+    以及EXIF_FIELDS中的拍摄时间、相机和GPS字段；CSV文件的每一列也可以作为字段使用。
+    只读取文字中实际引用到的信息。
+    """
+
+    def __init__(self, texts: Iterable[str], csv_path: str = None, image_paths: Iterable[str] = (),
+                 start_index: int = 1):
+        """初始化字段解析器
+
+        Args:
+            texts: 要替换字段的水印文字
+            csv_path: 自定义字段的CSV文件路径（可选）
+            image_paths: 本批图片路径，用于计算index
+            start_index: 第一张图片的序号，分多批导出时接着上一批编号
+        """
+        self.start_index = start_index
+        self.names = set()
+        for text in texts:
+            self.names |= field_names(text)
+        self.needs_exif = bool(self.names & EXIF_FIELDS)
+        self.csv_rows = load_csv_fields(csv_path) if csv_path and self.names else {}
+        self.index = {}
+        self.add_paths(image_paths)
+
+    def add_paths(self, image_paths: Iterable[str]):
+        """把图片追加到本批末尾，序号接着已有的图片编号"""
+        for path in image_paths:
+            self.index.setdefault(path, self.start_index + len(self.index))
+
+    def __bool__(self) -> bool:
+        return bool(self.names)
+
+    def fields(self, image_path: str, img: Image.Image = None) -> Dict[str, Any]:
+        """获取一张图片的字段值
+
+        Args:
+            image_path: 图片路径
+            img: 已打开的图片，用于读取EXIF；为None时需要EXIF的字段会重新打开文件头读取
+
+        Returns:
+            Dict: 字段名 -> 值
+        """
+        path = Path(image_path)
+        fields = {'filename': path.name, 'stem': path.stem, 'index': self.index.get(image_path, self.start_index)}
+        if self.needs_exif:
+            if img is not None:
+                fields.update(read_exif_fields(img))
+            else:
+                try:
+                    with Image.open(image_path) as opened:
+                        fields.update(read_exif_fields(opened))
+                except Exception:
+                    fields.update({name: '' for name in EXIF_FIELDS})
+        # CSV中的同名列优先于内置字段
+        if self.csv_rows:
+            for key in (image_path, path.name, path.stem):
+                row = self.csv_rows.get(os.path.normcase(key).casefold())
+                if row is not None:
+                    fields.update(row)
+                    break
+        return fields
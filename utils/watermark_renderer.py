@@ -0,0 +1,508 @@
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from collections import OrderedDict
+import math
+import os
+import threading
+from utils.glyph_atlas import GlyphAtlas
+from utils.watermark_fields import has_fields, resolve_text
+
+# 预设位置的边距（原图像素）
+POSITION_PADDING = 50
+
+# 九宫格预设位置，值为(水平, 垂直)方向：0靠左/上，1居中，2靠右/下
+PRESET_POSITIONS = {
+    '左上角': (0, 0), '上中': (1, 0), '右上角': (2, 0),
+    '左中': (0, 1), '中心': (1, 1), '右中': (2, 1),
+    '左下角': (0, 2), '下中': (1, 2), '右下角': (2, 2)
+}
+
+# 文字效果的默认参数（原图像素），设置中缺少的字段使用这些值
+DEFAULT_EFFECTS = {
+    'shadow': {'enabled': False, 'offset_x': 3, 'offset_y': 3, 'blur': 3, 'color': '#000000', 'opacity': 60},
+    'outline': {'enabled': False, 'width': 2, 'color': '#000000'},
+    'glow': {'enabled': False, 'radius': 6, 'color': '#000000', 'opacity': 80}
+}
+
+# 高斯模糊向外扩散的范围（模糊半径的倍数），贴图按此留出边距
+BLUR_EXTENT = 3
+
+# 平铺图层缓存的默认总字节数上限（RGBA每像素4字节）
+OVERLAY_CACHE_BYTES = 64 * 1024 * 1024
+
+def parse_color(color) -> tuple:
+    """将 '#RRGGBB' 或颜色元组转换为RGB元组"""
+    if isinstance(color, str):
+        return tuple(int(color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4))
+    return tuple(color[:3])
+
+class WatermarkRenderer:
+    """水印渲染器，负责生成水印贴图、计算位置和平铺水印图层，并缓存渲染结果
+
+    预览、缩略图和导出都通过同一个实例按各自的比例渲染，位置按原图坐标乘以比例计算，
+    因此预览看到的效果与导出结果一致，字体和水印图片的解码缓存也在它们之间共用。
+    """
+
+    def __init__(self, max_sprites: int = 64, max_overlay_bytes: int = OVERLAY_CACHE_BYTES,
+                 max_sources: int = 4, max_atlases: int = 16):
+        """初始化渲染器
+
+        Args:
+            max_sprites: 最多缓存的水印贴图数量
+            max_overlay_bytes: 平铺图层缓存的总字节数上限；单个图层超过上限的四分之一
+                （如导出尺寸的图层）不缓存，合成完即释放
+            max_sources: 最多缓存的已解码水印图片数量，各种比例的贴图都由它缩放得到
+            max_atlases: 最多缓存的字形缓存数量（每种字体和字号一个）
+        """
+        self.max_sprites = max_sprites
+        self.max_overlay_bytes = max_overlay_bytes
+        self.max_sources = max_sources
+        self.max_atlases = max_atlases
+        self._fonts = {}
+        self._atlases = OrderedDict()
+        self._sources = OrderedDict()
+        self._sprites = OrderedDict()
+        self._overlays = OrderedDict()
+        self._overlay_bytes = 0
+        self._lock = threading.RLock()
+
+    def load_font(self, family: str, size: int, bold: bool = False, italic: bool = False):
+        """加载字体，结果按(字体, 字号)缓存
+
+        Args:
+            family: 字体名称
+            size: 字号（像素）
+            bold: 是否粗体
+            italic: 是否斜体
+
+        Returns:
+            PIL字体对象
+        """
+        size = max(1, int(size))
+        key = (family, size, bold, italic)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is None:
+                font = self._find_font(family, size)
+                self._fonts[key] = font
+            return font
+
+    def glyph_atlas(self, family: str, size: int, bold: bool = False, italic: bool = False) -> GlyphAtlas:
+        """获取字体的字形缓存，结果按(字体, 字号)缓存"""
+        size = max(1, int(size))
+        key = (family, size, bold, italic)
+        with self._lock:
+            atlas = self._atlases.get(key)
+            if atlas is None:
+                atlas = GlyphAtlas(self.load_font(family, size, bold, italic))
+                self._atlases[key] = atlas
+                while len(self._atlases) > self.max_atlases:
+                    self._atlases.popitem(last=False)
+            else:
+                self._atlases.move_to_end(key)
+            return atlas
+
+    def resolve_fields(self, settings: dict, fields: dict) -> dict:
+        """把水印文字中的字段替换为某张图片的值
+
+        替换后的设置标记glyph_layout，文字改由字形缓存拼接：每张图片的文字都不同，
+        贴图缓存无法复用，但字形可以。
+
+        Args:
+            settings: 水印设置
+            fields: 该图片的字段值，为None时不替换
+
+        Returns:
+            dict: 替换后的设置，不含字段时返回原设置
+        """
+        text = settings.get('text', '')
+        if fields is None or settings.get('type') != '文本水印' or not has_fields(text):
+            return settings
+        return dict(settings, text=resolve_text(text, fields), glyph_layout=True)
+
+    def _find_font(self, family: str, size: int):
+        """查找字体文件，找不到时依次回退到微软雅黑和默认字体"""
+        candidates = []
+        windir = os.environ.get('WINDIR')
+        if windir:
+            # Windows系统字体目录
+            candidates.append(os.path.join(windir, 'Fonts', f'{family}.ttf'))
+            candidates.append(os.path.join(windir, 'Fonts', f'{family}.TTF'))
+        # 交给Pillow在系统字体目录中查找
+        candidates.append(f'{family}.ttf')
+        if windir:
+            candidates.append(os.path.join(windir, 'Fonts', 'msyh.ttc'))
+
+        for candidate in candidates:
+            try:
+                return ImageFont.truetype(candidate, size)
+            except OSError:
+                continue
+
+        print(f"找不到字体 {family}，使用默认字体替代")
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            return ImageFont.load_default()
+
+    def render_sprite(self, settings: dict, scale: float = 1.0):
+        """渲染旋转后的水印贴图
+
+        Args:
+            settings: 水印设置
+            scale: 缩放比例，预览时为显示比例，导出时为1
+
+        Returns:
+            RGBA格式的PIL Image对象，没有可绘制内容时返回None
+        """
+        key = self._sprite_key(settings, scale)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                return sprite
+
+        if settings.get('type') == '文本水印':
+            sprite = self._render_text(settings, scale)
+        else:
+            sprite = self._render_image(settings, scale)
+
+        if sprite is not None:
+            # 与预览中QPainter的顺时针旋转方向保持一致
+            rotation = settings.get('rotation', 0)
+            if rotation:
+                sprite = sprite.rotate(-rotation, resample=Image.Resampling.BICUBIC, expand=True)
+            # 效果在旋转之后计算，阴影方向不随文字旋转
+            effects = self._effect_params(settings, scale)
+            if effects:
+                sprite = self._apply_effects(sprite, effects)
+
+        with self._lock:
+            self._sprites[key] = sprite
+            while len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def _render_text(self, settings: dict, scale: float):
+        """渲染未旋转的文本贴图"""
+        text = settings.get('text', '')
+        if not text:
+            return None
+
+        font_settings = settings.get('font', {})
+        font_args = (
+            font_settings.get('family', 'Arial'),
+            max(1, font_settings.get('size', 40)) * scale,
+            font_settings.get('bold', False),
+            font_settings.get('italic', False)
+        )
+
+        # 获取颜色设置
+        color = parse_color(settings.get('color', (0, 0, 0)))
+        opacity = int(255 * settings.get('opacity', 100) / 100)
+
+        if settings.get('glyph_layout'):
+            # 可变文字：用缓存的字形拼接，不重新光栅化整行文字
+            mask = self.glyph_atlas(*font_args).render(text)
+            if mask is None:
+                return None
+            sprite = Image.new('RGBA', mask.size, color + (0,))
+            sprite.putalpha(mask.point(lambda a: a * opacity // 255))
+            return sprite
+
+        font = self.load_font(*font_args)
+        left, top, right, bottom = ImageDraw.Draw(Image.new('L', (1, 1))).textbbox((0, 0), text, font=font)
+        sprite = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(sprite).text((-left, -top), text, font=font, fill=color + (opacity,))
+        return sprite
+
+    def _effect_params(self, settings: dict, scale: float) -> dict:
+        """按比例换算已启用的文字效果参数，没有启用任何效果时返回空字典"""
+        if settings.get('type') != '文本水印':
+            return {}
+        effects = settings.get('effects') or {}
+        params = {}
+        for name, defaults in DEFAULT_EFFECTS.items():
+            effect = dict(defaults, **(effects.get(name) or {}))
+            if not effect['enabled']:
+                continue
+            if name == 'shadow':
+                params[name] = {
+                    'offset': (round(effect['offset_x'] * scale), round(effect['offset_y'] * scale)),
+                    'blur': effect['blur'] * scale,
+                    'color': parse_color(effect['color']),
+                    'opacity': effect['opacity']
+                }
+            elif name == 'outline':
+                # 缩小后不足半像素的描边在导出结果中也看不出来，直接省略
+                width = round(effect['width'] * scale)
+                if width > 0:
+                    params[name] = {'width': width, 'color': parse_color(effect['color'])}
+            elif effect['radius'] * scale > 0:
+                params[name] = {
+                    'radius': effect['radius'] * scale,
+                    'color': parse_color(effect['color']),
+                    'opacity': effect['opacity']
+                }
+        return params
+
+    def _apply_effects(self, sprite, effects: dict):
+        """在贴图下方叠加外发光、阴影和描边
+
+        模糊和扩张都只作用于贴图的透明度通道，与原图大小无关；结果随贴图一起缓存，
+        批量导出时每种比例只计算一次。贴图四周对称地留出边距，文字中心位置不变。
+
+        Args:
+            sprite: 已旋转的RGBA贴图
+            effects: _effect_params返回的效果参数
+
+        Returns:
+            加上效果后的RGBA贴图
+        """
+        margin = 0
+        if 'shadow' in effects:
+            dx, dy = effects['shadow']['offset']
+            margin = max(margin, math.ceil(effects['shadow']['blur'] * BLUR_EXTENT) + max(abs(dx), abs(dy)))
+        if 'outline' in effects:
+            margin = max(margin, effects['outline']['width'])
+        if 'glow' in effects:
+            margin = max(margin, math.ceil(effects['glow']['radius'] * BLUR_EXTENT))
+
+        size = (sprite.width + 2 * margin, sprite.height + 2 * margin)
+        mask = Image.new('L', size, 0)
+        mask.paste(sprite.getchannel('A'), (margin, margin))
+        result = Image.new('RGBA', size, (0, 0, 0, 0))
+
+        def add_layer(alpha, color, offset=(0, 0)):
+            layer = Image.new('RGBA', size, color + (0,))
+            if offset != (0, 0):
+                shifted = Image.new('L', size, 0)
+                shifted.paste(alpha, offset)
+                alpha = shifted
+            layer.putalpha(alpha)
+            result.alpha_composite(layer)
+
+        if 'glow' in effects:
+            glow = effects['glow']
+            # 模糊会削弱边缘，加倍后再按不透明度缩放，使光晕贴近文字处足够明显
+            gain = 2 * glow['opacity'] / 100
+            alpha = mask.filter(ImageFilter.GaussianBlur(glow['radius'])).point(lambda a: min(255, int(a * gain)))
+            add_layer(alpha, glow['color'])
+        if 'shadow' in effects:
+            shadow = effects['shadow']
+            alpha = mask.filter(ImageFilter.GaussianBlur(shadow['blur'])) if shadow['blur'] > 0 else mask
+            alpha = alpha.point(lambda a: a * shadow['opacity'] // 100)
+            add_layer(alpha, shadow['color'], shadow['offset'])
+        if 'outline' in effects:
+            # 多次3x3最大值滤波，比一次大尺寸滤波快得多
+            alpha = mask
+            for _ in range(effects['outline']['width']):
+                alpha = alpha.filter(ImageFilter.MaxFilter(3))
+            add_layer(alpha, effects['outline']['color'])
+
+        result.alpha_composite(sprite, dest=(margin, margin))
+        return result
+
+    def _render_image(self, settings: dict, scale: float):
+        """渲染未旋转的图片贴图"""
+        sprite = self._load_source(settings.get('image_path'))
+        if sprite is None:
+            return None
+
+        # 调整大小
+        ratio = settings.get('scale', 100) / 100 * scale
+        new_size = (max(1, int(sprite.width * ratio)), max(1, int(sprite.height * ratio)))
+        if new_size != sprite.size:
+            sprite = sprite.resize(new_size, Image.Resampling.LANCZOS)
+        else:
+            # 缓存中的水印图片不能被修改
+            sprite = sprite.copy()
+
+        # 应用透明度
+        opacity = settings.get('opacity', 100)
+        if opacity < 100:
+            alpha = sprite.getchannel('A').point(lambda a: a * opacity // 100)
+            sprite.putalpha(alpha)
+        return sprite
+
+    def _load_source(self, image_path: str):
+        """解码水印图片，结果按(路径, 修改时间)缓存"""
+        if not image_path:
+            return None
+        try:
+            key = (image_path, os.path.getmtime(image_path))
+        except OSError:
+            return None
+
+        with self._lock:
+            source = self._sources.get(key)
+            if source is not None:
+                self._sources.move_to_end(key)
+                return source
+
+        try:
+            with Image.open(image_path) as watermark_img:
+                source = watermark_img.convert('RGBA')
+        except Exception as e:
+            print(f"加载水印图片失败 {image_path}: {e}")
+            return None
+
+        with self._lock:
+            self._sources[key] = source
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return source
+
+    def build_tiled_overlay(self, size: tuple, settings: dict, scale: float = 1.0):
+        """生成覆盖整张图片的平铺水印图层
+
+        贴图只渲染一次，先复制成一行，再逐行粘贴铺满，不会为每个实例重新绘制文字。
+
+        Args:
+            size: 图层尺寸 (width, height)
+            settings: 水印设置，tile字段包含spacing_x、spacing_y、offset_x、offset_y和stagger
+            scale: 缩放比例，间距和偏移会按该比例缩放
+
+        Returns:
+            RGBA格式的PIL Image对象，没有可绘制内容时返回None
+        """
+        tile = settings.get('tile', {})
+        key = (tuple(size), self._sprite_key(settings, scale),
+               tile.get('spacing_x', 100), tile.get('spacing_y', 100),
+               tile.get('offset_x', 0), tile.get('offset_y', 0), tile.get('stagger', True))
+        with self._lock:
+            overlay = self._overlays.get(key)
+            if overlay is not None:
+                self._overlays.move_to_end(key)
+                return overlay
+
+        sprite = self.render_sprite(settings, scale)
+        if sprite is None:
+            return None
+
+        width, height = size
+        cell_w = max(1, sprite.width + int(tile.get('spacing_x', 100) * scale))
+        cell_h = max(1, sprite.height + int(tile.get('spacing_y', 100) * scale))
+        offset_x = int(tile.get('offset_x', 0) * scale)
+        offset_y = int(tile.get('offset_y', 0) * scale)
+        stagger = cell_w // 2 if tile.get('stagger', True) else 0
+
+        # 单元格：贴图居中放置
+        cell = Image.new('RGBA', (cell_w, cell_h), (0, 0, 0, 0))
+        cell.paste(sprite, ((cell_w - sprite.width) // 2, (cell_h - sprite.height) // 2))
+
+        # 一行：比图层宽两个单元格，便于水平偏移
+        strip = Image.new('RGBA', (width + 2 * cell_w, cell_h), (0, 0, 0, 0))
+        for x in range(0, strip.width, cell_w):
+            strip.paste(cell, (x, 0))
+
+        overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        row = 0
+        for y in range(offset_y % cell_h - cell_h, height, cell_h):
+            shift = (offset_x + (stagger if row % 2 else 0)) % cell_w - cell_w
+            overlay.paste(strip, (shift, y))
+            row += 1
+
+        # 只缓存预览、缩略图等较小的图层，导出尺寸的图层每张图片都可能不同，不占用常驻内存
+        overlay_bytes = width * height * 4
+        if overlay_bytes > self.max_overlay_bytes // 4:
+            return overlay
+        with self._lock:
+            if key not in self._overlays:
+                self._overlays[key] = overlay
+                self._overlay_bytes += overlay_bytes
+            while self._overlay_bytes > self.max_overlay_bytes:
+                _, evicted = self._overlays.popitem(last=False)
+                self._overlay_bytes -= evicted.width * evicted.height * 4
+        return overlay
+
+    def placement(self, settings: dict, size: tuple, scale: float = 1.0) -> tuple:
+        """计算水印中心在目标图片中的位置
+
+        Args:
+            settings: 水印设置；自定义位置使用custom_rel_x、custom_rel_y（相对图片尺寸的比例）
+            size: 目标图片尺寸
+            scale: 目标图片与原图的比例，边距按该比例缩放
+
+        Returns:
+            (x, y) 水印中心坐标
+        """
+        width, height = size
+        if settings.get('position_custom') and 'custom_rel_x' in settings:
+            return (settings['custom_rel_x'] * width, settings.get('custom_rel_y', 0.5) * height)
+
+        padding = POSITION_PADDING * scale
+        col, row = PRESET_POSITIONS.get(settings.get('position', '中心'), (1, 1))
+        x = (padding, width / 2, width - padding)[col]
+        y = (padding, height / 2, height - padding)[row]
+        return (x, y)
+
+    def composite(self, image, settings: dict, scale: float = 1.0, fields: dict = None):
+        """将水印合成到图片上
+
+        Args:
+            image: PIL Image对象
+            settings: 水印设置
+            scale: 图片与原图的比例，缩略图或缩小输出时水印按比例缩小
+            fields: 该图片的字段值（可选），用于替换水印文字中的 {filename} 等字段
+
+        Returns:
+            合成后的RGBA图片（新对象，不修改传入的图片）
+        """
+        settings = self.resolve_fields(settings, fields)
+        base = image.convert('RGBA') if image.mode != 'RGBA' else image.copy()
+
+        if self.is_tiled(settings):
+            overlay = self.build_tiled_overlay(base.size, settings, scale)
+            if overlay is not None:
+                base.alpha_composite(overlay)
+            return base
+
+        sprite = self.render_sprite(settings, scale)
+        if sprite is None:
+            return base
+
+        center_x, center_y = self.placement(settings, base.size, scale)
+        left = int(round(center_x - sprite.width / 2))
+        top = int(round(center_y - sprite.height / 2))
+
+        # 只合成贴图与图片相交的部分
+        src_left, src_top = max(0, -left), max(0, -top)
+        dst_left, dst_top = max(0, left), max(0, top)
+        src_right = min(sprite.width, base.width - left)
+        src_bottom = min(sprite.height, base.height - top)
+        if src_right > src_left and src_bottom > src_top:
+            base.alpha_composite(sprite, dest=(dst_left, dst_top),
+                                 source=(src_left, src_top, src_right, src_bottom))
+        return base
+
+    def is_tiled(self, settings: dict) -> bool:
+        """检查水印设置是否为平铺模式"""
+        return bool(settings.get('tile', {}).get('enabled'))
+
+    def _sprite_key(self, settings: dict, scale: float) -> tuple:
+        """生成水印贴图的缓存键"""
+        font = settings.get('font', {})
+        image_path = settings.get('image_path') or ''
+        try:
+            image_mtime = os.path.getmtime(image_path) if image_path else 0
+        except OSError:
+            image_mtime = 0
+        return (
+            settings.get('type'), settings.get('text', ''),
+            font.get('family'), font.get('size'), font.get('bold'), font.get('italic'),
+            str(settings.get('color')), settings.get('opacity', 100), settings.get('rotation', 0),
+            image_path, image_mtime, settings.get('scale', 100), round(scale, 4), settings.get('glyph_layout', False),
+            repr(sorted(self._effect_params(settings, scale).items()))
+        )
+
+
+_shared_renderer = None
+_shared_lock = threading.Lock()
+
+def get_shared_renderer() -> WatermarkRenderer:
+    """获取预览和导出共用的渲染器实例"""
+    global _shared_renderer
+    with _shared_lock:
+        if _shared_renderer is None:
+            _shared_renderer = WatermarkRenderer()
+        return _shared_renderer
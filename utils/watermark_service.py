@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from collections import deque
+from PIL import UnidentifiedImageError
+from typing import Dict, Any, Optional
+from utils.image_processor import ImageProcessor, OUTPUT_EXTENSIONS
+from utils.config_manager import ConfigManager
+import json
+import os
+import threading
+import time
+
+# 输出格式对应的Content-Type
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp'
+}
+
+# 单个请求允许的最大图片大小
+MAX_REQUEST_BYTES = 200 * 1024 * 1024
+
+class LatencyRecorder:
+    """记录最近请求的耗时并计算分位数"""
+    
+    def __init__(self, max_samples: int = 1000):
+        self._samples = deque(maxlen=max_samples)
+        self._count = 0
+        self._lock = threading.Lock()
+        
+    def record(self, seconds: float):
+        """记录一次请求耗时"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+            
+    def summary(self) -> Dict[str, Any]:
+        """计算耗时统计
+        
+        Returns:
+            Dict: 请求总数以及最近样本的平均值和p50/p90/p99（毫秒）
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {'count': count, 'samples': 0}
+        
+        def percentile(p):
+            index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+            return samples[index] * 1000
+        
+        return {
+            'count': count,
+            'samples': len(samples),
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'p50_ms': percentile(50),
+            'p90_ms': percentile(90),
+            'p99_ms': percentile(99)
+        }
+
+class WatermarkService:
+    """本地HTTP水印服务
+    
+    接收图片和模板名称，返回添加水印后的图片。模板、字体和水印贴图在启动时预先加载，
+    由常驻的线程池处理请求，每个请求只需解码、合成和编码。
+    
+    接口：
+        POST /watermark?template=名称&format=JPEG&quality=85&filename=IMG_0001.jpg&index=1
+             请求体为图片数据；filename和index可选，用于水印文字中的 {filename}、{index} 等字段
+        GET  /templates  已加载的模板列表
+        GET  /stats      请求耗时统计
+    """
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, workers: int = None,
+                 processor: ImageProcessor = None, config_manager: ConfigManager = None):
+        """初始化服务
+        
+        Args:
+            host: 监听地址，默认只监听本机
+            port: 监听端口
+            workers: 处理图片的线程数，默认为CPU数量
+            processor: 图片处理器，默认新建一个
+            config_manager: 配置管理器，默认新建一个
+        """
+        self.host = host
+        self.port = port
+        self.processor = processor or ImageProcessor()
+        self.config_manager = config_manager or ConfigManager()
+        self.pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                       thread_name_prefix='WatermarkWorker')
+        self.latency = LatencyRecorder()
+        self.templates = {}
+        self._templates_lock = threading.Lock()
+        self.server = None
+        
+    def warm_up(self):
+        """预先加载所有模板，并渲染水印贴图以加载字体"""
+        templates = {}
+        for info in self.config_manager.get_template_list():
+            settings = self.config_manager.load_template(info['name'])
+            if settings is not None:
+                templates[info['name']] = settings
+                
+        with self._templates_lock:
+            self.templates = templates
+            
+        for name, settings in templates.items():
+            try:
+                self.processor.renderer.render_sprite(settings)
+            except Exception as e:
+                print(f"预加载模板 {name} 失败: {e}")
+                
+    def get_template(self, name: str) -> Optional[Dict[str, Any]]:
+        """获取模板设置，未预加载的模板会在首次使用时加载并常驻"""
+        with self._templates_lock:
+            settings = self.templates.get(name)
+        if settings is None:
+            settings = self.config_manager.load_template(name)
+            if settings is not None:
+                with self._templates_lock:
+                    self.templates[name] = settings
+        return settings
+        
+    def process(self, data: bytes, settings: Dict[str, Any], output_format: str, quality: int,
+                filename: str = '', index: int = 1) -> bytes:
+        """在线程池中用模板设置处理一张图片并等待结果"""
+        future = self.pool.submit(self.processor.watermark_bytes, data, settings, output_format, quality,
+                                  filename=filename, index=index)
+        return future.result()
+        
+    def serve_forever(self):
+        """预热后开始处理请求，直到shutdown被调用"""
+        self.warm_up()
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.server.daemon_threads = True
+        print(f"水印服务已启动: http://{self.host}:{self.server.server_port}，已加载 {len(self.templates)} 个模板")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.pool.shutdown(wait=True)
+            
+    def shutdown(self):
+        """停止服务"""
+        if self.server:
+            self.server.shutdown()
+            
+    def _make_handler(self):
+        """创建绑定到当前服务的请求处理类"""
+        service = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == '/stats':
+                    self._send_json(200, service.latency.summary())
+                elif path == '/templates':
+                    with service._templates_lock:
+                        self._send_json(200, sorted(service.templates))
+                else:
+                    self._send_json(404, {'error': 'not found'})
+                    
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != '/watermark':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                    
+                query = parse_qs(url.query)
+                template = query.get('template', [''])[0]
+                output_format = query.get('format', ['JPEG'])[0].upper()
+                if output_format not in OUTPUT_EXTENSIONS:
+                    self._send_json(400, {'error': f'unsupported format: {output_format}'})
+                    return
+                filename = os.path.basename(query.get('filename', [''])[0])
+                try:
+                    quality = int(query.get('quality', ['85'])[0])
+                    index = int(query.get('index', ['1'])[0])
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    self._send_json(400, {'error': 'invalid quality, index or Content-Length'})
+                    return
+                if length <= 0 or length > MAX_REQUEST_BYTES:
+                    self._send_json(400, {'error': 'invalid request body size'})
+                    return
+                    
+                data = self.rfile.read(length)
+                settings = service.get_template(template)
+                if settings is None:
+                    self._send_json(404, {'error': f'template not found: {template}'})
+                    return
+                    
+                start = time.perf_counter()
+                try:
+                    result = service.process(data, settings, output_format, quality, filename, index)
+                except UnidentifiedImageError as e:
+                    self._send_json(400, {'error': f'invalid image: {e}'})
+                    return
+                except Exception as e:
+                    print(f"处理水印请求失败（模板 {template}）: {e}")
+                    self._send_json(500, {'error': str(e)})
+                    return
+                service.latency.record(time.perf_counter() - start)
+                
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPES[output_format])
+                self.send_header('Content-Length', str(len(result)))
+                self.end_headers()
+                self.wfile.write(result)
+                
+            def _send_json(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                
+            def log_message(self, format, *args):
+                # 不逐条打印请求日志
+                pass
+                
+        return Handler